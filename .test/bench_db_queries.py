@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+CodeWright 数据库查询基准测试脚本
+
+在临时目录中执行数据库迁移并批量生成数据（默认 100 个用户、1万个项目、10万个文件），
+统计项目列表、项目文件列表、导出文件查询、用户文件列表（首页及页码/游标翻到末页）、导出历史、
+存储引用计数和系统统计的查询延迟。
+使用 --without-indexes 删除热点索引后再测，用于对比索引效果。
+
+用法：
+    python .test/bench_db_queries.py --files 100000 --projects 10000 --rounds 50
+    python .test/bench_db_queries.py --without-indexes
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+class DbQueryBenchmark:
+    def __init__(self, user_count: int, project_count: int, file_count: int):
+        self.user_count = user_count
+        self.project_count = project_count
+        self.file_count = file_count
+
+        # 在临时目录中运行，避免污染真实的数据库
+        self.work_root = Path(tempfile.mkdtemp(prefix="codewright_db_bench_"))
+        work_dir = self.work_root / "backend"
+        work_dir.mkdir()
+        os.chdir(work_dir)
+        os.environ["DATABASE_URL"] = f"sqlite:///{self.work_root / 'bench.db'}"
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    def seed(self):
+        """执行迁移并批量写入测试数据"""
+        from sqlalchemy import insert
+        from app.database import engine
+        from app.migrations import run_migrations
+        from app.models import User, Project, ProjectItem, UploadedFile, ExportHistory
+        from app.models.system_counter import rebuild_counters
+
+        run_migrations(engine)
+        start = time.perf_counter()
+        base_time = datetime.now() - timedelta(days=30)
+
+        users = [
+            {"id": user_id, "username": f"bench_{user_id}", "password_hash": "-", "role": "user", "is_active": True}
+            for user_id in range(1, self.user_count + 1)
+        ]
+        files = [
+            {
+                "id": file_id,
+                "original_filename": f"file_{file_id}.py",
+                "storage_path": f"../upload/blobs/{file_id:064x}",
+                "file_size": 1024 + file_id % 4096,
+                "file_type": "text/x-python",
+                "content_hash": f"{file_id:064x}",
+                "uploader_id": (file_id - 1) % self.user_count + 1,
+                "created_at": base_time + timedelta(seconds=file_id)
+            }
+            for file_id in range(1, self.file_count + 1)
+        ]
+        projects = [
+            {
+                "id": project_id,
+                "project_name": f"项目 {project_id}",
+                "project_type": "code",
+                "owner_id": (project_id - 1) % self.user_count + 1,
+                "created_at": base_time + timedelta(seconds=project_id * 10)
+            }
+            for project_id in range(1, self.project_count + 1)
+        ]
+
+        # 每个项目引用其所有者的一段文件
+        files_per_project = max(1, self.file_count // self.project_count)
+        items = []
+        for project in projects:
+            for position in range(files_per_project):
+                file_id = (project["id"] - 1) * files_per_project + position + 1
+                if file_id > self.file_count:
+                    break
+                items.append({
+                    "project_id": project["id"],
+                    "file_id": file_id,
+                    "include_in_export": True,
+                    "order_index": (position + 1) * 1024
+                })
+
+        histories = [
+            {
+                "project_id": project["id"],
+                "exporter": "code",
+                "status": "success" if index % 5 else "failed",
+                "duration_ms": 100 + index,
+                "created_at": project["created_at"] + timedelta(hours=index)
+            }
+            for project in projects
+            for index in range(2)
+        ]
+
+        with engine.begin() as conn:
+            conn.execute(insert(User), users)
+            conn.execute(insert(UploadedFile), files)
+            conn.execute(insert(Project), projects)
+            conn.execute(insert(ProjectItem), items)
+            conn.execute(insert(ExportHistory), histories)
+            # 批量插入不经过ORM，计数器需要重建
+            rebuild_counters(conn)
+
+        print(
+            f"✅ 已生成 {self.user_count} 个用户、{self.project_count} 个项目、"
+            f"{self.file_count} 个文件、{len(items)} 个项目文件"
+            f"（{time.perf_counter() - start:.1f} s）"
+        )
+
+    def drop_hot_path_indexes(self):
+        """删除热点索引，用于对比"""
+        from sqlalchemy import text
+        from app.database import engine
+        from app.migrations.v0003_hot_path_indexes import HOT_PATH_INDEXES
+
+        with engine.begin() as conn:
+            for _, index_name in HOT_PATH_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+            conn.execute(text("ANALYZE"))
+        print("⚠️  已删除热点索引")
+
+    def scenarios(self):
+        """返回 (名称, 查询函数) 列表，查询函数接收数据库会话和随机数生成器"""
+        from app.models import ExportHistory, Project
+        from app.services.admin_service import AdminService
+        from app.utils.pagination import TOTAL_NONE
+        from app.services.file_service import FileService
+        from app.services.project_service import ProjectService
+
+        def owner_of(project_id):
+            return (project_id - 1) % self.user_count + 1
+
+        def random_project(rng):
+            return rng.randint(1, self.project_count)
+
+        def project_list(db, rng):
+            user_id = rng.randint(1, self.user_count)
+            return ProjectService(db).get_user_projects(user_id, page=1, page_size=10)
+
+        def project_files(db, rng):
+            project_id = random_project(rng)
+            return ProjectService(db).get_project_files(project_id, owner_of(project_id))
+
+        def export_items(db, rng):
+            project_id = random_project(rng)
+            return ProjectService(db).get_export_items(project_id, owner_of(project_id))
+
+        async def user_files(db, rng):
+            user_id = rng.randint(1, self.user_count)
+            return await FileService(db).get_user_files(user_id)
+
+        # 每个用户的文件列表末页（页码与对应游标）
+        files_per_user = self.file_count // self.user_count
+        last_page = max(1, (files_per_user + 19) // 20)
+        last_page_cursors = self.last_page_cursors(last_page)
+
+        async def user_files_last_page(db, rng):
+            user_id = rng.randint(1, self.user_count)
+            return await FileService(db).get_user_files(user_id, page=last_page, total_mode=TOTAL_NONE)
+
+        async def user_files_last_cursor(db, rng):
+            user_id = rng.randint(1, self.user_count)
+            return await FileService(db).get_user_files(
+                user_id, cursor=last_page_cursors[user_id], total_mode=TOTAL_NONE
+            )
+
+        async def export_histories(db, rng):
+            user_id = rng.randint(1, self.user_count)
+            return db.query(ExportHistory).join(ExportHistory.project).filter(
+                Project.owner_id == user_id
+            ).order_by(ExportHistory.created_at.desc()).limit(50).all()
+
+        async def reference_count(db, rng):
+            file_id = rng.randint(1, self.file_count)
+            return FileService(db).count_references(f"../upload/blobs/{file_id:064x}")
+
+        async def system_stats(db, rng):
+            # 绕过快照，直接统计
+            return AdminService(db)._compute_stats()
+
+        return [
+            ("项目列表", project_list),
+            ("项目文件列表", project_files),
+            ("导出文件查询", export_items),
+            ("用户文件列表", user_files),
+            (f"用户文件第{last_page}页（页码）", user_files_last_page),
+            (f"用户文件第{last_page}页（游标）", user_files_last_cursor),
+            ("导出历史", export_histories),
+            ("存储引用计数", reference_count),
+            ("系统统计", system_stats),
+        ]
+
+    def last_page_cursors(self, last_page: int) -> dict:
+        """按页码翻到末页前一页时返回的游标（每个用户一个）"""
+        from app.database import SessionLocal
+        from app.services.file_service import FileService
+
+        cursors = {}
+        db = SessionLocal()
+        try:
+            for user_id in range(1, self.user_count + 1):
+                page = asyncio.run(FileService(db).get_user_files(user_id, page=last_page - 1, total_mode="none"))
+                cursors[user_id] = page["next_cursor"]
+        finally:
+            db.close()
+        return cursors
+
+    def measure(self, scenario, rounds: int):
+        """执行查询并返回每次耗时（毫秒）"""
+        from app.database import SessionLocal
+
+        rng = random.Random(42)
+        timings = []
+        for _ in range(rounds):
+            db = SessionLocal()
+            try:
+                start = time.perf_counter()
+                asyncio.run(scenario(db, rng))
+                timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                db.close()
+        return sorted(timings)
+
+    def run(self, rounds: int, without_indexes: bool):
+        """运行基准测试"""
+        print("🚀 开始数据库查询基准测试")
+        print("=" * 50)
+        self.seed()
+        if without_indexes:
+            self.drop_hot_path_indexes()
+
+        for name, scenario in self.scenarios():
+            timings = self.measure(scenario, rounds)
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(
+                f"📊 {name}: 平均 {sum(timings) / len(timings):.2f} ms, "
+                f"P95 {p95:.2f} ms"
+            )
+
+        print("=" * 50)
+        print(f"🗂  临时目录: {self.work_root}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据库查询基准测试")
+    parser.add_argument("--users", type=int, default=100, help="用户数量")
+    parser.add_argument("--projects", type=int, default=10000, help="项目数量")
+    parser.add_argument("--files", type=int, default=100000, help="文件数量")
+    parser.add_argument("--rounds", type=int, default=50, help="每个查询的重复次数")
+    parser.add_argument("--without-indexes", action="store_true", help="删除热点索引后再测")
+    args = parser.parse_args()
+
+    benchmark = DbQueryBenchmark(args.users, args.projects, args.files)
+    benchmark.run(args.rounds, args.without_indexes)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+CodeWright 文件读取基准测试脚本
+
+生成UTF-8与GBK两个代码文件，经 FileService 写入临时目录中的内容寻址存储
+（上传时检测编码并生成 sidecar 行偏移索引），比较：
+- 整文件读取：旧方式（先按UTF-8读取，失败后按GBK整体重读）与按已知编码的内存映射读取；
+- 行区间读取：整文件读取后按行切分，与按行偏移索引读取字节范围。
+用 tracemalloc 统计峰值内存。
+
+用法：
+    python .test/bench_file_reads.py --lines 200000 --rounds 5
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+SAMPLE_LINE = "    value_{index} = compute('参数{index}')  # 中文注释 {index}\n"
+
+
+def legacy_read(storage_path: str):
+    """旧实现：UTF-8读取失败后按GBK整体重读"""
+    try:
+        with open(storage_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except UnicodeDecodeError:
+        with open(storage_path, 'r', encoding='gbk') as f:
+            return f.read()
+
+
+class FileReadBenchmark:
+    def __init__(self, line_count: int, rounds: int):
+        self.line_count = line_count
+        self.rounds = rounds
+
+        # 在临时目录中运行，避免污染真实的上传目录
+        self.work_root = Path(tempfile.mkdtemp(prefix="codewright_read_bench_"))
+        work_dir = self.work_root / "backend"
+        work_dir.mkdir()
+        os.chdir(work_dir)
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    def measure(self, label: str, read):
+        """多次执行读取，输出平均耗时和峰值内存"""
+        read()  # 预热（页缓存、sidecar）
+        tracemalloc.start()
+        start = time.perf_counter()
+        for _ in range(self.rounds):
+            read()
+        elapsed = (time.perf_counter() - start) / self.rounds
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"📊 {label}: 平均 {elapsed * 1000:.1f} ms, 峰值内存 {peak / 1024 / 1024:.1f} MB")
+
+    def run(self):
+        """运行基准测试"""
+        from app.services.file_service import FileService
+        from app.utils.line_index import line_index_cache
+
+        print("🚀 开始文件读取基准测试")
+        print("=" * 50)
+        file_service = FileService(db=None)
+        text = "".join(SAMPLE_LINE.format(index=index) for index in range(self.line_count))
+        middle = self.line_count // 2
+
+        for encoding in ("utf-8", "gbk"):
+            content = text.encode(encoding)
+            start = time.perf_counter()
+            storage_path, _, file_hash, detected = file_service.copy_to_storage(
+                io.BytesIO(content), f"bench_{encoding}.py", len(content)
+            )
+            upload_ms = (time.perf_counter() - start) * 1000
+            print(f"✅ {encoding} 文件 {len(content) / 1024 / 1024:.1f} MB，检测为 {detected}，"
+                  f"写入存储（含检测与索引）{upload_ms:.0f} ms")
+
+            record = SimpleNamespace(storage_path=str(storage_path), content_hash=file_hash, encoding=detected)
+            line_index = line_index_cache.get(file_hash, str(storage_path))
+
+            self.measure(f"{encoding} 整文件 旧方式", lambda: legacy_read(record.storage_path))
+            self.measure(f"{encoding} 整文件 内存映射", lambda: file_service._read_record(record))
+            self.measure(
+                f"{encoding} 中部200行 整文件切分",
+                lambda: legacy_read(record.storage_path).splitlines(keepends=True)[middle:middle + 200]
+            )
+            self.measure(
+                f"{encoding} 中部200行 行偏移索引",
+                lambda: file_service.read_record_lines(record, line_index, middle + 1, middle + 200)
+            )
+
+        print("=" * 50)
+        print(f"🗂  临时目录: {self.work_root}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="文件读取基准测试")
+    parser.add_argument("--lines", type=int, default=200000, help="文件行数")
+    parser.add_argument("--rounds", type=int, default=5, help="每项重复次数")
+    args = parser.parse_args()
+
+    benchmark = FileReadBenchmark(args.lines, args.rounds)
+    benchmark.run()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+CodeWright HTML导出内存基准测试脚本
+
+在临时目录中初始化独立的SQLite数据库，生成指定数量的代码文件并加入同一项目，
+用 tracemalloc 统计 ExportService 逐段写入HTML与整篇拼接后写入两种方式的峰值内存和耗时。
+为只统计文档本身占用的内存，测试时关闭高亮结果与导出片段的内存缓存（仍使用磁盘缓存）。
+
+用法：
+    python .test/bench_html_export.py --files 200 --lines 600
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+SAMPLE_CODE = '''def calculate_{index}_{line}(a, b):
+    """计算两个数的和"""
+    return a + b  # {index}-{line}
+'''
+
+
+class HtmlExportBenchmark:
+    def __init__(self, file_count: int, lines_per_file: int):
+        self.file_count = file_count
+        self.lines_per_file = lines_per_file
+
+        # 在临时目录中运行，避免污染真实的数据库与上传目录
+        self.work_root = Path(tempfile.mkdtemp(prefix="codewright_html_bench_"))
+        work_dir = self.work_root / "backend"
+        work_dir.mkdir()
+        for name in ("upload", "exports"):
+            (self.work_root / name).mkdir()
+        os.chdir(work_dir)
+        os.environ["DATABASE_URL"] = f"sqlite:///{self.work_root / 'bench.db'}"
+        os.environ["HIGHLIGHT_CACHE_DIR"] = str(self.work_root / "cache" / "highlight")
+        os.environ["FRAGMENT_CACHE_DIR"] = str(self.work_root / "cache" / "fragments")
+        os.environ["HIGHLIGHT_CACHE_MEMORY_ITEMS"] = "0"
+        os.environ["FRAGMENT_CACHE_MEMORY_ITEMS"] = "0"
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    def seed(self):
+        """生成测试用户、项目和文件"""
+        from app.database import engine, SessionLocal
+        from app.migrations import run_migrations
+        from app.models import User, Project, ProjectItem, UploadedFile
+        from app.services.highlight_service import seed_default_mappings
+
+        run_migrations(engine)
+        upload_dir = Path("../upload")
+
+        db = SessionLocal()
+        seed_default_mappings(db)
+        user = User(username="bench", password_hash="-", role="user")
+        db.add(user)
+        db.flush()
+
+        project = Project(project_name="基准测试项目", project_type="code", owner_id=user.id)
+        db.add(project)
+        db.flush()
+
+        for index in range(self.file_count):
+            content = "".join(
+                SAMPLE_CODE.format(index=index, line=line)
+                for line in range(self.lines_per_file // 3)
+            )
+            path = upload_dir / f"bench_{index}.py"
+            path.write_text(content, encoding="utf-8")
+
+            uploaded_file = UploadedFile(
+                original_filename=f"bench_{index}.py",
+                storage_path=str(path),
+                file_size=len(content.encode("utf-8")),
+                file_type="text/x-python",
+                uploader_id=user.id
+            )
+            db.add(uploaded_file)
+            db.flush()
+            db.add(ProjectItem(
+                project_id=project.id,
+                file_id=uploaded_file.id,
+                order_index=(index + 1) * 1024
+            ))
+
+        db.commit()
+        self.user_id = user.id
+        self.project_id = project.id
+        db.close()
+        print(f"✅ 已生成 {self.file_count} 个文件（每个约 {self.lines_per_file} 行）")
+
+    async def export_streaming(self, db) -> Path:
+        """逐段写入（当前实现）"""
+        from app.services.export_service import ExportService
+
+        result = await ExportService(db).export_project_to_pdf(self.project_id, self.user_id)
+        return Path(result["file_path"])
+
+    async def export_buffered(self, db) -> Path:
+        """整篇拼接后一次写入（对比用）"""
+        from app.services.export_service import ExportService
+
+        export_service = ExportService(db)
+        project = await export_service.project_service.get_project_by_id(self.project_id, self.user_id)
+        items = await export_service.project_service.get_export_items(self.project_id, self.user_id)
+        html_content = "".join([chunk async for chunk in export_service._iter_html_chunks(project, items)])
+        html_path = export_service.export_dir / f"buffered_{self.project_id}.html"
+        with open(html_path, "w", encoding="utf-8") as f:
+            f.write(html_content)
+        return html_path
+
+    def measure(self, export) -> tuple:
+        """执行一次导出，返回 (峰值内存字节, 耗时秒, 输出文件大小)"""
+        from app.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            tracemalloc.start()
+            start = time.perf_counter()
+            html_path = asyncio.run(export(db))
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return peak, elapsed, html_path.stat().st_size
+        finally:
+            db.close()
+
+    def run(self):
+        """运行基准测试"""
+        print("🚀 开始 HTML 导出内存基准测试")
+        print("=" * 50)
+        self.seed()
+
+        # 预热：生成片段磁盘缓存，两种方式都从缓存读取片段
+        self.measure(self.export_streaming)
+
+        for label, export in (("逐段写入", self.export_streaming), ("整篇拼接", self.export_buffered)):
+            peak, elapsed, size = self.measure(export)
+            print(
+                f"📊 {label}: 峰值内存 {peak / 1024 / 1024:.1f} MB, "
+                f"耗时 {elapsed * 1000:.0f} ms, 文档大小 {size / 1024 / 1024:.1f} MB"
+            )
+
+        print("=" * 50)
+        print(f"🗂  临时目录: {self.work_root}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTML导出内存基准测试")
+    parser.add_argument("--files", type=int, default=200, help="文件数量")
+    parser.add_argument("--lines", type=int, default=600, help="每个文件的行数")
+    args = parser.parse_args()
+
+    benchmark = HtmlExportBenchmark(args.files, args.lines)
+    benchmark.run()
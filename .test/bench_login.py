@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+CodeWright 登录吞吐基准测试脚本
+
+在临时目录中初始化独立的SQLite数据库并创建测试用户，直接调用 ASGI 应用并发发起登录请求，
+统计登录吞吐与延迟；同时持续探测 /health，统计登录高峰期间事件循环的响应延迟。
+使用 --inline-hash 在事件循环中直接计算bcrypt，用于对比。
+
+用法：
+    python .test/bench_login.py --users 50 --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+async def asgi_request(app, method: str, path: str, payload=None):
+    """直接调用 ASGI 应用，返回 (状态码, 响应体)"""
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = 0
+    chunks = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+class LoginBenchmark:
+    def __init__(self, user_count: int):
+        self.user_count = user_count
+
+        # 在临时目录中运行，避免污染真实的数据库与上传目录
+        self.work_root = Path(tempfile.mkdtemp(prefix="codewright_login_bench_"))
+        work_dir = self.work_root / "backend"
+        work_dir.mkdir()
+        for name in ("upload", "exports", "templates"):
+            (self.work_root / name).mkdir()
+        os.chdir(work_dir)
+        os.environ["DATABASE_URL"] = f"sqlite:///{self.work_root / 'bench.db'}"
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    def seed(self):
+        """执行迁移并创建测试用户（共用同一个密码哈希）"""
+        from sqlalchemy import insert
+        from app.database import engine
+        from app.migrations import run_migrations
+        from app.models import User
+        from app.services.password_hasher import pwd_context
+
+        run_migrations(engine)
+        password_hash = pwd_context.hash("bench-password")
+        with engine.begin() as conn:
+            conn.execute(insert(User), [
+                {"username": f"bench_{index}", "password_hash": password_hash, "role": "user", "is_active": True}
+                for index in range(self.user_count)
+            ])
+        print(f"✅ 已创建 {self.user_count} 个测试用户")
+
+    async def burst(self, login_count: int, concurrency: int):
+        """并发登录，同时探测健康检查接口的响应延迟"""
+        import main
+
+        login_timings = []
+        probe_timings = []
+        failures = 0
+        done = asyncio.Event()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def login(index: int):
+            nonlocal failures
+            async with semaphore:
+                start = time.perf_counter()
+                _, body = await asgi_request(main.app, "POST", "/api/v1/auth/token", {
+                    "username": f"bench_{index % self.user_count}",
+                    "password": "bench-password"
+                })
+                login_timings.append(time.perf_counter() - start)
+                if json.loads(body).get("code") != 0:
+                    failures += 1
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await asgi_request(main.app, "GET", "/health")
+                probe_timings.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(index) for index in range(login_count)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+        return elapsed, sorted(login_timings), sorted(probe_timings), failures
+
+    def run(self, login_count: int, concurrency: int, inline_hash: bool):
+        """运行基准测试"""
+        print("🚀 开始登录吞吐基准测试")
+        print("=" * 50)
+        self.seed()
+
+        if inline_hash:
+            from app.services.password_hasher import PasswordHasher
+
+            async def run_inline(hasher, func, *args):
+                return func(*args)
+
+            PasswordHasher._run = run_inline
+            print("⚠️  bcrypt 在事件循环中直接计算")
+
+        elapsed, logins, probes, failures = asyncio.run(self.burst(login_count, concurrency))
+
+        def percentile(values, ratio):
+            return values[min(len(values) - 1, int(len(values) * ratio))] * 1000
+
+        print(f"📊 登录: {login_count} 次, 失败 {failures} 次, 耗时 {elapsed:.2f} s, 吞吐 {login_count / elapsed:.1f} 次/秒")
+        print(f"📊 登录延迟: P50 {percentile(logins, 0.5):.0f} ms, P95 {percentile(logins, 0.95):.0f} ms")
+        print(
+            f"📊 健康检查延迟（{len(probes)} 次）: P50 {percentile(probes, 0.5):.1f} ms, "
+            f"P95 {percentile(probes, 0.95):.1f} ms, 最大 {probes[-1] * 1000:.1f} ms"
+        )
+        print("=" * 50)
+        print(f"🗂  临时目录: {self.work_root}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="登录吞吐基准测试")
+    parser.add_argument("--users", type=int, default=50, help="测试用户数量")
+    parser.add_argument("--logins", type=int, default=200, help="登录请求数量")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发登录数")
+    parser.add_argument("--inline-hash", action="store_true", help="在事件循环中直接计算bcrypt（对比用）")
+    args = parser.parse_args()
+
+    benchmark = LoginBenchmark(args.users)
+    benchmark.run(args.logins, args.concurrency, args.inline_hash)
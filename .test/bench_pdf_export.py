@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+CodeWright PDF导出基准测试脚本
+
+在临时目录中初始化独立的SQLite数据库，生成指定数量的代码文件并加入同一项目，
+统计 PdfService 生成导出HTML（以及可选的PDF渲染）的耗时。
+--highlight-workers 指定高亮进程数（0 表示在线程中逐个渲染），用于对比并行高亮的效果。
+
+用法：
+    python .test/bench_pdf_export.py --files 100 --lines 200 --rounds 3
+    python .test/bench_pdf_export.py --files 300 --highlight-workers 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+SAMPLE_CODE = '''def calculate_{index}_{line}(a, b):
+    """计算两个数的和"""
+    return a + b  # {index}-{line}
+'''
+
+
+class PdfExportBenchmark:
+    def __init__(self, file_count: int, lines_per_file: int, highlight_workers: Optional[int] = None):
+        self.file_count = file_count
+        self.lines_per_file = lines_per_file
+
+        # 在临时目录中运行，避免污染真实的数据库与上传目录
+        self.work_root = Path(tempfile.mkdtemp(prefix="codewright_bench_"))
+        work_dir = self.work_root / "backend"
+        work_dir.mkdir()
+        os.chdir(work_dir)
+        os.environ["DATABASE_URL"] = f"sqlite:///{self.work_root / 'bench.db'}"
+        os.environ["HIGHLIGHT_CACHE_DIR"] = str(self.work_root / "cache")
+        os.environ["FRAGMENT_CACHE_DIR"] = str(self.work_root / "cache" / "fragments")
+        if highlight_workers is not None:
+            os.environ["HIGHLIGHT_WORKERS"] = str(highlight_workers)
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    def seed(self):
+        """生成测试用户、项目和文件"""
+        from app.database import Base, engine, SessionLocal
+        from app.models import User, Project, ProjectItem, UploadedFile
+        from app.services.highlight_service import seed_default_mappings
+
+        Base.metadata.create_all(bind=engine)
+        upload_dir = Path("../upload")
+        upload_dir.mkdir(exist_ok=True)
+
+        db = SessionLocal()
+        seed_default_mappings(db)
+        user = User(username="bench", password_hash="-", role="user")
+        db.add(user)
+        db.flush()
+
+        project = Project(project_name="基准测试项目", project_type="code", owner_id=user.id)
+        db.add(project)
+        db.flush()
+
+        for index in range(self.file_count):
+            content = "".join(
+                SAMPLE_CODE.format(index=index, line=line)
+                for line in range(self.lines_per_file // 3)
+            )
+            path = upload_dir / f"bench_{index}.py"
+            path.write_text(content, encoding="utf-8")
+
+            uploaded_file = UploadedFile(
+                original_filename=f"bench_{index}.py",
+                storage_path=str(path),
+                file_size=len(content.encode("utf-8")),
+                file_type="text/x-python",
+                uploader_id=user.id
+            )
+            db.add(uploaded_file)
+            db.flush()
+            db.add(ProjectItem(
+                project_id=project.id,
+                file_id=uploaded_file.id,
+                order_index=index + 1
+            ))
+
+        db.commit()
+        self.user_id = user.id
+        self.project_id = project.id
+        db.close()
+        print(f"✅ 已生成 {self.file_count} 个文件（每个约 {self.lines_per_file} 行）")
+
+    async def run_once(self, render_pdf: bool, cold: bool) -> float:
+        """执行一次导出并返回耗时（秒）"""
+        from app.database import SessionLocal
+        from app.models import Project, ProjectItem
+        from app.services.pdf_service import PdfService
+        from app.utils.highlight_cache import highlight_cache, fragment_cache
+
+        if cold:
+            highlight_cache.clear()
+            fragment_cache.clear()
+
+        db = SessionLocal()
+        try:
+            pdf_service = PdfService(db)
+            start = time.perf_counter()
+            if render_pdf:
+                await pdf_service.export_project_to_pdf(self.project_id, self.user_id)
+            else:
+                project = db.query(Project).filter(Project.id == self.project_id).first()
+                items = db.query(ProjectItem).filter(
+                    ProjectItem.project_id == self.project_id
+                ).order_by(ProjectItem.order_index).all()
+                await pdf_service._generate_html_content(project, items, {})
+            return time.perf_counter() - start
+        finally:
+            db.close()
+
+    def run(self, rounds: int, render_pdf: bool):
+        """运行基准测试"""
+        from app.services.highlight_renderer import highlight_pool
+        from app.services.highlight_service import HIGHLIGHT_FORMATTER_OPTIONS
+
+        print("🚀 开始 PDF 导出基准测试")
+        print("=" * 50)
+        self.seed()
+        highlight_pool.start(formatter_options=HIGHLIGHT_FORMATTER_OPTIONS)
+        print(f"⚙️  高亮进程数: {highlight_pool.workers}")
+
+        for label, cold in (("冷缓存", True), ("热缓存", False)):
+            timings = [
+                asyncio.run(self.run_once(render_pdf, cold))
+                for _ in range(rounds)
+            ]
+            print(
+                f"📊 {label}: 最快 {min(timings) * 1000:.1f} ms, "
+                f"平均 {sum(timings) / len(timings) * 1000:.1f} ms"
+            )
+
+        highlight_pool.shutdown()
+        print("=" * 50)
+        print(f"🗂  临时目录: {self.work_root}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF导出基准测试")
+    parser.add_argument("--files", type=int, default=100, help="文件数量")
+    parser.add_argument("--lines", type=int, default=200, help="每个文件的行数")
+    parser.add_argument("--rounds", type=int, default=3, help="每种场景的重复次数")
+    parser.add_argument("--render-pdf", action="store_true", help="包含WeasyPrint渲染")
+    parser.add_argument("--highlight-workers", type=int, default=None, help="高亮进程数（默认读取环境变量）")
+    args = parser.parse_args()
+
+    benchmark = PdfExportBenchmark(args.files, args.lines, args.highlight_workers)
+    benchmark.run(args.rounds, args.render_pdf)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+CodeWright 分页预览基准测试脚本
+
+在临时目录中初始化独立的SQLite数据库，生成一个大代码文件，比较：
+- 整文件预览（highlight_code）：耗时与响应数据大小；
+- 分页预览（highlight_window）：文件开头、中部（首次与再次访问）、末尾各一个行区间的耗时。
+为只统计高亮本身，测试时关闭高亮结果缓存。
+
+用法：
+    python .test/bench_preview.py --lines 300000 --window 500
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+SAMPLE_CODE = '''def calculate_{index}(a, b):
+    """计算两个数的和
+    （多行文档字符串）
+    """
+    return a + b  # {index}
+'''
+
+
+class PreviewBenchmark:
+    def __init__(self, line_count: int, window: int):
+        self.line_count = line_count
+        self.window = window
+
+        # 在临时目录中运行，避免污染真实的数据库与上传目录
+        self.work_root = Path(tempfile.mkdtemp(prefix="codewright_preview_bench_"))
+        work_dir = self.work_root / "backend"
+        work_dir.mkdir()
+        (self.work_root / "upload").mkdir()
+        os.chdir(work_dir)
+        os.environ["DATABASE_URL"] = f"sqlite:///{self.work_root / 'bench.db'}"
+        os.environ["HIGHLIGHT_CACHE_DIR"] = str(self.work_root / "cache" / "highlight")
+        os.environ["HIGHLIGHT_CACHE_MEMORY_ITEMS"] = "0"
+        os.environ["HIGHLIGHT_CACHE_DISK_MB"] = "0"
+        os.environ["HIGHLIGHT_WORKERS"] = "0"
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    def seed(self):
+        """生成测试用户和大文件"""
+        from app.database import engine, SessionLocal
+        from app.migrations import run_migrations
+        from app.models import User, UploadedFile
+        from app.services.highlight_service import seed_default_mappings
+
+        run_migrations(engine)
+
+        content = "".join(
+            SAMPLE_CODE.format(index=index)
+            for index in range(self.line_count // 5)
+        ).encode("utf-8")
+        path = Path("../upload") / "generated.py"
+        path.write_bytes(content)
+
+        db = SessionLocal()
+        seed_default_mappings(db)
+        user = User(username="bench", password_hash="-", role="user")
+        db.add(user)
+        db.flush()
+
+        uploaded_file = UploadedFile(
+            original_filename="generated.py",
+            storage_path=str(path),
+            file_size=len(content),
+            file_type="text/x-python",
+            content_hash=hashlib.sha256(content).hexdigest(),
+            uploader_id=user.id
+        )
+        db.add(uploaded_file)
+        db.commit()
+        self.user_id = user.id
+        self.file_id = uploaded_file.id
+        db.close()
+        print(f"✅ 已生成 {self.line_count} 行的文件（{len(content) / 1024 / 1024:.1f} MB）")
+
+    def measure(self, label: str, call):
+        """执行一次预览，输出耗时和响应大小"""
+        from app.database import SessionLocal
+        from app.services.highlight_service import HighlightService
+
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            result = asyncio.run(call(HighlightService(db)))
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+
+        size = len(json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"))
+        exact = "" if "exact" not in result else f", 精确着色 {'是' if result['exact'] else '否'}"
+        print(f"📊 {label}: 耗时 {elapsed * 1000:.0f} ms, 响应 {size / 1024:.0f} KB{exact}")
+
+    def wait_for_checkpoints(self):
+        """等待后台推进检查点完成"""
+        from app.services.window_highlighter import window_highlighter
+
+        start = time.perf_counter()
+        while any(table.walking for table in window_highlighter._tables.values()):
+            time.sleep(0.05)
+        print(f"⏳ 后台推进检查点等待 {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def run(self):
+        """运行基准测试"""
+        print("🚀 开始分页预览基准测试")
+        print("=" * 50)
+        self.seed()
+
+        window = self.window
+        middle = self.line_count // 2
+        last = max(1, self.line_count - window + 1)
+        scenarios = [
+            ("分页 开头", 1),
+            ("分页 中部（首次）", middle),
+            ("分页 中部（再次）", middle),
+            ("分页 中部下一页", middle + window),
+            ("分页 末尾（首次）", last),
+            ("分页 末尾（再次）", last),
+        ]
+        for label, start_line in scenarios:
+            if "再次" in label:
+                self.wait_for_checkpoints()
+            self.measure(label, lambda service, start_line=start_line: service.highlight_window(
+                self.file_id, self.user_id, start_line, start_line + window - 1
+            ))
+
+        self.measure("整文件预览", lambda service: service.highlight_code(self.file_id, self.user_id))
+
+        from app.services.window_highlighter import window_highlighter
+        print(f"🔎 检查点统计: {window_highlighter.get_stats()}")
+        print("=" * 50)
+        print(f"🗂  临时目录: {self.work_root}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分页预览基准测试")
+    parser.add_argument("--lines", type=int, default=300000, help="文件行数")
+    parser.add_argument("--window", type=int, default=500, help="每页行数")
+    args = parser.parse_args()
+
+    benchmark = PreviewBenchmark(args.lines, args.window)
+    benchmark.run()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+CodeWright 分页预览正确性回归检查脚本
+
+生成含跨行结构的代码文件（Java 超长块注释、Python 多行字符串、C 块注释、JS 模板字符串），
+对随机行区间调用 WindowHighlighter.render，与从文件开头分析整个文件后截取同一区间的高亮结果比较。
+标记为精确（exact）的区间必须与整文件结果一致，否则脚本以非零状态退出。
+检查点间隔和单次推进行数取较小值，使检查覆盖请求内推进和后台推进两条路径。
+
+用法：
+    python .test/check_preview_windows.py --windows 40
+"""
+import argparse
+import copy
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# (语言, 重复单元, 重复次数)
+SAMPLES = [
+    ('java', '/*\n' + ''.join(' * 超长块注释第 %d 行 int x = 1;\n' % line for line in range(40)) + ' */\n'
+             'class C{i} {{\n    String s = "x";\n}}\n', 300),
+    ('python', 'def f{i}(x):\n    """doc\n    string {i}\n    """\n    s = \'\'\'a\nb\'\'\'\n    return x  # c\n', 4000),
+    ('c', '/* block\n * comment {i}\n */\nint f{i}(void) {{\n  return "s\\\n t";\n}}\n', 4000),
+    ('javascript', 'var a{i} = `tmpl\nline ${{x}}\n`;\n/* c\n*/\nfunction g(){{ return 1; }}\n', 3000),
+]
+
+FORMATTER_OPTIONS = {'linenos': True, 'cssclass': 'highlight'}
+
+
+class PreviewWindowCheck:
+    def __init__(self, windows: int, seed: int):
+        self.windows = windows
+        self.random = random.Random(seed)
+        self.work_root = Path(tempfile.mkdtemp(prefix="codewright_preview_check_"))
+        sys.path.insert(0, str(BACKEND_DIR))
+
+    def expected_html(self, full_tokens, text: str, starts, start_line: int, end_line: int) -> str:
+        """从整文件 token 中截取行区间并格式化"""
+        from app.services.highlight_renderer import highlighter_registry
+
+        window_start = starts[start_line - 1]
+        window_end = starts[end_line] if end_line < len(starts) else len(text)
+        tokens = []
+        for index, token_type, value in full_tokens:
+            token_end = index + len(value)
+            if token_end <= window_start or index >= window_end:
+                continue
+            tokens.append((token_type, value[max(index, window_start) - index:min(token_end, window_end) - index]))
+
+        formatter = copy.copy(highlighter_registry.get_formatter(FORMATTER_OPTIONS))
+        formatter.linenostart = start_line
+        output = io.StringIO()
+        formatter.format(tokens, output)
+        return output.getvalue()
+
+    def check_language(self, language: str, unit: str, count: int) -> int:
+        """检查一种语言，返回与整文件结果不一致的精确区间数"""
+        from app.services.highlight_renderer import highlighter_registry
+        from app.services.window_highlighter import WindowHighlighter
+        from app.utils.line_index import LineIndex
+
+        text = "".join(unit.format(i=index) for index in range(count))
+        path = self.work_root / f"sample_{language}"
+        path.write_bytes(text.encode("utf-8"))
+        line_index = LineIndex.build(str(path))
+
+        starts = [0]
+        for line in text.split('\n')[:-1]:
+            starts.append(starts[-1] + len(line) + 1)
+        full_tokens = list(highlighter_registry.get_lexer(language).get_tokens_unprocessed(text))
+
+        def read_lines(first: int, last: int) -> str:
+            start, end = line_index.byte_range(first, last)
+            with open(path, 'rb') as f:
+                f.seek(start)
+                return f.read(end - start).decode("utf-8")
+
+        highlighter = WindowHighlighter(interval=200, resync_max_lines=3000)
+        total = line_index.line_count
+        ranges = [(1, 15), (total - 10, total)]
+        for _ in range(self.windows):
+            start_line = self.random.randint(1, total)
+            ranges.append((start_line, min(start_line + self.random.randint(0, 300), total)))
+
+        mismatched = 0
+        started = time.perf_counter()
+        for start_line, end_line in ranges:
+            window = highlighter.render(
+                language, language, line_index, read_lines, start_line, end_line, FORMATTER_OPTIONS
+            )
+            if not window['exact']:
+                # 等待后台推进检查点，再次请求应为精确结果
+                while any(table.walking for table in highlighter._tables.values()):
+                    time.sleep(0.01)
+                window = highlighter.render(
+                    language, language, line_index, read_lines, start_line, end_line, FORMATTER_OPTIONS
+                )
+            expected = self.expected_html(full_tokens, text, starts, start_line, end_line)
+            if window['exact'] and window['highlighted_html'] != expected:
+                mismatched += 1
+                print(f"❌ {language} 第 {start_line}-{end_line} 行与整文件结果不一致")
+
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"{'✅' if not mismatched else '❌'} {language}: {total} 行, {len(ranges)} 个区间, "
+              f"不一致 {mismatched}, 耗时 {elapsed:.0f} ms, 统计 {highlighter.get_stats()}")
+        return mismatched
+
+    def run(self) -> int:
+        print("🚀 开始分页预览正确性检查")
+        print("=" * 50)
+        mismatched = sum(self.check_language(*sample) for sample in SAMPLES)
+        print("=" * 50)
+        return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分页预览正确性回归检查")
+    parser.add_argument("--windows", type=int, default=40, help="每种语言检查的随机区间数")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    args = parser.parse_args()
+
+    os.environ.setdefault("HIGHLIGHT_WORKERS", "0")
+    sys.exit(PreviewWindowCheck(args.windows, args.seed).run())
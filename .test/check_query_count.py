@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+CodeWright 查询次数回归检查脚本
+
+在临时目录中初始化独立的SQLite数据库，分别生成小项目和大项目，
+统计项目文件列表与导出路径（含后台导出任务）执行的SQL语句数。语句数应与项目文件数量无关
+（后台导出任务写入进度的 UPDATE 随进度变化次数而定，不计入），
+出现随文件数增长的查询（N+1）时脚本以非零状态退出。
+
+用法：
+    python .test/check_query_count.py --small 5 --large 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+class QueryCountCheck:
+    def __init__(self):
+        # 在临时目录中运行，避免污染真实的数据库与上传目录
+        self.work_root = Path(tempfile.mkdtemp(prefix="codewright_queries_"))
+        work_dir = self.work_root / "backend"
+        work_dir.mkdir()
+        os.chdir(work_dir)
+        os.environ["DATABASE_URL"] = f"sqlite:///{self.work_root / 'queries.db'}"
+        os.environ["HIGHLIGHT_CACHE_DIR"] = str(self.work_root / "cache" / "highlight")
+        os.environ["FRAGMENT_CACHE_DIR"] = str(self.work_root / "cache" / "fragments")
+        sys.path.insert(0, str(BACKEND_DIR))
+
+        from sqlalchemy import event
+        from app.database import Base, engine, SessionLocal
+        from app.services.highlight_service import seed_default_mappings, language_index
+
+        Base.metadata.create_all(bind=engine)
+        Path("../upload").mkdir(exist_ok=True)
+        Path("../exports").mkdir(exist_ok=True)
+
+        db = SessionLocal()
+        seed_default_mappings(db)
+        # 预先加载语言映射索引，使其单次加载不计入首个场景
+        language_index.get(db)
+        db.close()
+
+        self.statements = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, *args):
+        if statement.startswith("UPDATE export_jobs"):
+            return
+        self.statements += 1
+
+    def seed_project(self, file_count: int):
+        """生成一个包含 file_count 个文件的项目，返回 (用户ID, 项目ID)"""
+        from app.database import SessionLocal
+        from app.models import User, Project, ProjectItem, UploadedFile
+        from app.utils.highlight_cache import content_hash
+
+        db = SessionLocal()
+        user = User(username=f"queries_{file_count}", password_hash="-", role="user")
+        db.add(user)
+        db.flush()
+
+        project = Project(project_name=f"查询检查项目-{file_count}", project_type="code", owner_id=user.id)
+        db.add(project)
+        db.flush()
+
+        for index in range(file_count):
+            content = f"def func_{file_count}_{index}():\n    return {index}\n"
+            path = Path("../upload") / f"queries_{file_count}_{index}.py"
+            path.write_text(content, encoding="utf-8")
+
+            uploaded_file = UploadedFile(
+                original_filename=path.name,
+                storage_path=str(path),
+                file_size=len(content.encode("utf-8")),
+                file_type="text/x-python",
+                content_hash=content_hash(content.encode("utf-8")),
+                uploader_id=user.id
+            )
+            db.add(uploaded_file)
+            db.flush()
+            db.add(ProjectItem(
+                project_id=project.id,
+                file_id=uploaded_file.id,
+                order_index=index + 1
+            ))
+
+        db.commit()
+        ids = (user.id, project.id)
+        db.close()
+        return ids
+
+    def measure(self, user_id: int, project_id: int) -> dict:
+        """统计各路径执行的SQL语句数"""
+        from app.database import SessionLocal
+        from app.services.project_service import ProjectService
+        from app.services.export_service import ExportService
+        from app.services.pdf_service import PdfService
+        from app.services.export_job_service import run_pdf_export_job
+        from app.models.export_job import ExportJob
+
+        class HtmlOnlyPdfService(PdfService):
+            async def _html_to_pdf(self, html_content, options=None):
+                return html_content.encode("utf-8")
+
+        async def export_job(db):
+            """后台导出任务：与进程内队列一样在工作线程中运行"""
+            job = ExportJob(project_id=project_id, job_id=uuid.uuid4().hex, status="queued", progress=0)
+            db.add(job)
+            db.commit()
+            self.statements = 0
+            original = PdfService._html_to_pdf
+            PdfService._html_to_pdf = HtmlOnlyPdfService._html_to_pdf
+            try:
+                await asyncio.to_thread(run_pdf_export_job, job.job_id, user_id)
+            finally:
+                PdfService._html_to_pdf = original
+            db.refresh(job)
+            return job.status == "success"
+
+        scenarios = {
+            "项目文件列表": lambda db: ProjectService(db).get_project_files(project_id, user_id),
+            "HTML导出": lambda db: ExportService(db).export_project_to_pdf(project_id, user_id),
+            "PDF导出": lambda db: HtmlOnlyPdfService(db).export_project_to_pdf(project_id, user_id),
+            "后台导出任务": export_job,
+        }
+
+        counts = {}
+        for name, scenario in scenarios.items():
+            db = SessionLocal()
+            try:
+                self.statements = 0
+                result = asyncio.run(scenario(db))
+                assert result, f"{name} 未返回结果"
+                counts[name] = self.statements
+            finally:
+                db.close()
+        return counts
+
+    def run(self, small: int, large: int) -> bool:
+        """运行检查"""
+        print("🚀 开始查询次数回归检查")
+        print("=" * 50)
+
+        small_counts = self.measure(*self.seed_project(small))
+        large_counts = self.measure(*self.seed_project(large))
+
+        passed = True
+        for name in small_counts:
+            ok = small_counts[name] == large_counts[name]
+            passed = passed and ok
+            print(
+                f"{'✅' if ok else '❌'} {name}: "
+                f"{small} 个文件 {small_counts[name]} 条语句, "
+                f"{large} 个文件 {large_counts[name]} 条语句"
+            )
+
+        print("=" * 50)
+        print("🎉 查询次数与文件数量无关" if passed else "⚠️  检测到随文件数量增长的查询")
+        return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查询次数回归检查")
+    parser.add_argument("--small", type=int, default=5, help="小项目文件数量")
+    parser.add_argument("--large", type=int, default=200, help="大项目文件数量")
+    args = parser.parse_args()
+
+    check = QueryCountCheck()
+    sys.exit(0 if check.run(args.small, args.large) else 1)
@@ -1,19 +1,94 @@
 """
 数据库配置和连接管理
 """
-from sqlalchemy import create_engine
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from typing import Dict, Any, Awaitable, Callable, TypeVar
+import asyncio
+import functools
 import os
 
 # 数据库URL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./codewright.db")
 
+# SQLite 连接参数（每个连接建立时通过 PRAGMA 设置）
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+SQLITE_CACHE_SIZE_MB = int(os.getenv("SQLITE_CACHE_SIZE_MB", "64"))
+
+# 连接池配置
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # 秒
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 秒
+
+# 数据库线程池：同步 Session 的查询在此执行，不阻塞事件循环
+DB_THREADPOOL_WORKERS = int(os.getenv("DB_THREADPOOL_WORKERS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
+T = TypeVar("T")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    """判断是否为内存SQLite数据库"""
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """连接建立时设置SQLite参数"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+        # 负数表示以KB为单位
+        cursor.execute(f"PRAGMA cache_size={-SQLITE_CACHE_SIZE_MB * 1024}")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL) -> Engine:
+    """按数据库类型创建引擎
+    
+    SQLite：开启WAL、synchronous=NORMAL、忙等待超时以及mmap/页缓存参数，
+    文件库使用连接池，内存库共享单个连接；其他数据库使用常规连接池并在取出连接前检测。
+    """
+    if url.startswith("sqlite"):
+        connect_args = {
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000
+        }
+        if _is_memory_sqlite(url):
+            db_engine = create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+        else:
+            db_engine = create_engine(
+                url,
+                connect_args=connect_args,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT
+            )
+        event.listen(db_engine, "connect", _apply_sqlite_pragmas)
+        return db_engine
+
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+
+
 # 创建数据库引擎
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+engine = create_db_engine()
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -28,3 +103,48 @@ def get_db():
         yield db
     finally:
         db.close()
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_THREADPOOL_WORKERS, thread_name_prefix="db")
+
+
+async def run_in_db_thread(func: Callable[..., T], *args, **kwargs) -> T:
+    """在数据库线程池中执行同步的数据库访问"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+
+def offload_db(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """将同步的服务方法包装为在数据库线程池中执行的协程
+    
+    调用方仍然 await 服务方法；同一请求内对 Session 的调用依次 await，不会并发使用同一个会话。
+    服务内部的同步代码需要调用其他数据库方法时，应调用未包装的同步实现。
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db_thread(func, *args, **kwargs)
+    return wrapper
+
+
+def get_database_settings() -> Dict[str, Any]:
+    """获取数据库实际生效的配置"""
+    settings = {
+        "dialect": engine.dialect.name,
+        "pool": type(engine.pool).__name__
+    }
+    if not isinstance(engine.pool, StaticPool):
+        settings["pool_size"] = DB_POOL_SIZE
+        settings["max_overflow"] = DB_MAX_OVERFLOW
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size"):
+                settings[pragma] = conn.execute(text(f"PRAGMA {pragma}")).scalar()
+    return settings
+
+
+def report_database_settings():
+    """启动时输出数据库配置"""
+    try:
+        settings = get_database_settings()
+        print("数据库配置: " + ", ".join(f"{key}={value}" for key, value in settings.items()))
+    except Exception as e:
+        print(f"读取数据库配置失败: {str(e)}")
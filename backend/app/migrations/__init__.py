@@ -0,0 +1,78 @@
+"""
+数据库迁移
+
+按版本号顺序执行本包下的 vNNNN_*.py 模块，每个模块提供 upgrade(conn)；
+已执行的版本记录在 schema_migrations 表中，启动时只执行尚未执行的版本。
+
+基线迁移按当前模型建表，新库上后续迁移涉及的列和索引可能已经存在，
+因此迁移应使用 add_column / create_index 等可重复执行的辅助函数。
+
+手动执行：
+    python -m app.migrations
+"""
+import importlib
+import pkgutil
+from typing import List
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import func
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", String(50), primary_key=True),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now())
+)
+
+
+def _discover() -> List[str]:
+    """按版本号排序的迁移模块名"""
+    return sorted(
+        module.name for module in pkgutil.iter_modules(__path__)
+        if module.name.startswith("v") and module.name[1:5].isdigit()
+    )
+
+
+def add_column(conn: Connection, table: Table, column_name: str):
+    """为已有表补充模型中的列（已存在时跳过）"""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    if column_name in existing:
+        return
+    column = table.c[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def create_index(conn: Connection, table: Table, index_name: str):
+    """创建模型中声明的索引（已存在时跳过）"""
+    index = next((index for index in table.indexes if index.name == index_name), None)
+    if index is None:
+        raise ValueError(f"模型中未声明索引: {index_name}")
+    index.create(conn, checkfirst=True)
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """执行尚未执行的迁移，返回本次执行的版本列表"""
+    migration_metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        applied = {row.version for row in conn.execute(schema_migrations.select())}
+
+    executed = []
+    for name in _discover():
+        version = name[1:5]
+        if version in applied:
+            continue
+
+        module = importlib.import_module(f"{__name__}.{name}")
+        # 每个迁移与其版本记录在同一事务中提交
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(version=version))
+        executed.append(name)
+
+    return executed
+
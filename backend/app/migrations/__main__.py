@@ -0,0 +1,8 @@
+"""
+手动执行数据库迁移：python -m app.migrations
+"""
+from app.database import engine
+from app.migrations import run_migrations
+
+executed = run_migrations(engine)
+print("已执行数据库迁移: " + (", ".join(executed) if executed else "无"))
@@ -0,0 +1,11 @@
+"""
+基线：按模型创建缺失的表
+"""
+from sqlalchemy.engine import Connection
+
+from app.database import Base
+import app.models  # noqa: F401  注册全部模型
+
+
+def upgrade(conn: Connection):
+    Base.metadata.create_all(bind=conn)
@@ -0,0 +1,13 @@
+"""
+上传文件记录增加内容哈希列（内容寻址存储与片段缓存使用）
+"""
+from sqlalchemy.engine import Connection
+
+from app.migrations import add_column, create_index
+from app.models.file import UploadedFile
+
+
+def upgrade(conn: Connection):
+    table = UploadedFile.__table__
+    add_column(conn, table, "content_hash")
+    create_index(conn, table, "ix_uploaded_files_content_hash")
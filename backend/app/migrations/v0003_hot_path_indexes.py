@@ -0,0 +1,29 @@
+"""
+为高频查询的外键与过滤列添加索引，复合索引与查询的过滤+排序方式一致
+"""
+from sqlalchemy.engine import Connection
+
+from app.migrations import create_index
+from app.models import ExportHistory, ExportJob, HighlightMapping, Project, ProjectItem, UploadedFile
+
+HOT_PATH_INDEXES = [
+    # 项目文件列表/导出：按项目过滤、按顺序排序
+    (ProjectItem, "ix_project_items_project_order"),
+    # 文件删除与引用检查
+    (ProjectItem, "ix_project_items_file_id"),
+    # 用户文件列表：按上传者过滤、按上传时间排序
+    (UploadedFile, "ix_uploaded_files_uploader_created"),
+    # 存储对象引用计数
+    (UploadedFile, "ix_uploaded_files_storage_path"),
+    # 用户项目列表
+    (Project, "ix_projects_owner_created"),
+    # 导出历史：按项目过滤、按时间排序
+    (ExportHistory, "ix_export_histories_project_created"),
+    (HighlightMapping, "ix_highlight_mappings_suffix"),
+    (ExportJob, "ix_export_jobs_status"),
+]
+
+
+def upgrade(conn: Connection):
+    for model, index_name in HOT_PATH_INDEXES:
+        create_index(conn, model.__table__, index_name)
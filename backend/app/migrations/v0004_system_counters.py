@@ -0,0 +1,21 @@
+"""
+系统计数器表（管理后台统计）及最近活动统计使用的创建时间索引，并按现有数据回填计数器
+"""
+from sqlalchemy.engine import Connection
+
+from app.migrations import create_index
+from app.models import ExportHistory, Project, User
+from app.models.system_counter import SystemCounter, rebuild_counters
+
+RECENT_ACTIVITY_INDEXES = [
+    (User, "ix_users_created_at"),
+    (Project, "ix_projects_created_at"),
+    (ExportHistory, "ix_export_histories_created_at"),
+]
+
+
+def upgrade(conn: Connection):
+    SystemCounter.__table__.create(conn, checkfirst=True)
+    for model, index_name in RECENT_ACTIVITY_INDEXES:
+        create_index(conn, model.__table__, index_name)
+    rebuild_counters(conn)
@@ -0,0 +1,11 @@
+"""
+上传文件记录增加文本编码列（上传时检测；旧记录为空，读取时按 sidecar 行偏移索引中的编码）
+"""
+from sqlalchemy.engine import Connection
+
+from app.migrations import add_column
+from app.models.file import UploadedFile
+
+
+def upgrade(conn: Connection):
+    add_column(conn, UploadedFile.__table__, "encoding")
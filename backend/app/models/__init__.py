@@ -11,6 +11,7 @@ from .highlight_mapping import HighlightMapping
 from .export_history import ExportHistory
 from .export_job import ExportJob
 from .manual_section import ManualSection
+from .system_counter import SystemCounter
 
 __all__ = [
     "User",
@@ -23,5 +24,6 @@ __all__ = [
     "HighlightMapping",
     "ExportHistory",
     "ExportJob",
-    "ManualSection"
+    "ManualSection",
+    "SystemCounter"
 ]
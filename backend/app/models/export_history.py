@@ -1,7 +1,7 @@
 """
 导出历史模型
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -9,6 +9,9 @@ from app.database import Base
 class ExportHistory(Base):
     """导出历史记录表"""
     __tablename__ = "export_histories"
+    __table_args__ = (
+        Index("ix_export_histories_project_created", "project_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
@@ -16,7 +19,7 @@ class ExportHistory(Base):
     status = Column(String(20), nullable=False)  # success, failed
     duration_ms = Column(Integer)  # 导出耗时（毫秒）
     file_path = Column(String(500))  # 导出文件路径
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     # 关系
     project = relationship("Project", back_populates="export_histories")
@@ -13,7 +13,7 @@ class ExportJob(Base):
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
     job_id = Column(String(100), unique=True, nullable=False)  # 队列中的任务ID
-    status = Column(String(20), default="queued")  # queued, processing, success, failed
+    status = Column(String(20), default="queued", index=True)  # queued, processing, success, failed
     progress = Column(Integer, default=0)  # 0-100
     result_file_path = Column(String(500))
     error_message = Column(Text)
@@ -1,7 +1,7 @@
 """
 文件模型
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -9,12 +9,17 @@ from app.database import Base
 class UploadedFile(Base):
     """上传文件表"""
     __tablename__ = "uploaded_files"
+    __table_args__ = (
+        Index("ix_uploaded_files_uploader_created", "uploader_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     original_filename = Column(String(255), nullable=False)
-    storage_path = Column(String(500), nullable=False)
+    storage_path = Column(String(500), nullable=False, index=True)
     file_size = Column(BigInteger, nullable=False)  # 文件大小（字节）
     file_type = Column(String(100))  # MIME类型
+    content_hash = Column(String(64), index=True)  # 文件内容SHA-256
+    encoding = Column(String(20))  # 上传时检测的文本编码（utf-8、gbk 等，二进制文件为 binary）
     uploader_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
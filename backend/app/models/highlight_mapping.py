@@ -10,7 +10,7 @@ class HighlightMapping(Base):
     __tablename__ = "highlight_mappings"
     
     id = Column(Integer, primary_key=True, index=True)
-    suffix = Column(String(20), nullable=False)  # 例如 .py, .java
+    suffix = Column(String(20), nullable=False, index=True)  # 例如 .py, .java
     language = Column(String(50), nullable=False)  # Pygments/前端预览用的语言标识
     enabled = Column(Boolean, default=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,7 +1,7 @@
 """
 项目模型
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -9,13 +9,16 @@ from app.database import Base
 class Project(Base):
     """项目表"""
     __tablename__ = "projects"
+    __table_args__ = (
+        Index("ix_projects_owner_created", "owner_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_name = Column(String(100), nullable=False)
     project_type = Column(String(20), nullable=False)  # code, manual
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     config_json = Column(Text, default="{}")  # 项目配置JSON
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # 关系
@@ -31,10 +34,13 @@ class Project(Base):
 class ProjectItem(Base):
     """项目文件项表"""
     __tablename__ = "project_items"
+    __table_args__ = (
+        Index("ix_project_items_project_order", "project_id", "order_index"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
-    file_id = Column(Integer, ForeignKey("uploaded_files.id"), nullable=False)
+    file_id = Column(Integer, ForeignKey("uploaded_files.id"), nullable=False, index=True)
     display_name = Column(String(255))  # 显示名覆盖
     language_override = Column(String(50))  # 手动指定高亮语言
     include_in_export = Column(Boolean, default=True)
@@ -0,0 +1,157 @@
+"""
+系统计数器模型
+
+管理后台统计使用的计数器（用户数、项目数、文件总大小、导出次数等）。
+ORM 插入/删除/更新记录时在同一事务中增量维护，统计时直接读取，无需扫描业务表。
+"""
+from collections import defaultdict
+from typing import Dict
+
+from sqlalchemy import Column, String, BigInteger, event, inspect, update, bindparam, select, func, case
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from app.database import Base
+from .user import User
+from .project import Project
+from .file import UploadedFile
+from .export_history import ExportHistory
+
+# 累加列值（而不是计数）的标记
+SUM = object()
+
+# 模型 -> [(计数器名, 列名, 匹配值)]
+# 列名为 None 表示按记录计数；匹配值为 SUM 时累加列值；否则统计列值等于匹配值的记录数
+COUNTER_SPECS = {
+    User: [
+        ("users.total", None, None),
+        ("users.active", "is_active", True),
+        ("users.admin", "role", "admin"),
+    ],
+    Project: [
+        ("projects.total", None, None),
+        ("projects.code", "project_type", "code"),
+        ("projects.manual", "project_type", "manual"),
+    ],
+    UploadedFile: [
+        ("files.total", None, None),
+        ("files.total_size", "file_size", SUM),
+    ],
+    ExportHistory: [
+        ("exports.total", None, None),
+        ("exports.success", "status", "success"),
+        ("exports.failed", "status", "failed"),
+    ],
+}
+
+COUNTER_NAMES = [name for specs in COUNTER_SPECS.values() for name, _, _ in specs]
+
+_PENDING_KEY = "system_counter_deltas"
+
+
+class SystemCounter(Base):
+    """系统计数器表"""
+    __tablename__ = "system_counters"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SystemCounter(name='{self.name}', value={self.value})>"
+
+
+def _contribution(column_value, match) -> int:
+    """单条记录对计数器的贡献值"""
+    if match is SUM:
+        return column_value or 0
+    return 1 if column_value == match else 0
+
+
+def _add_deltas(target, sign: int, previous: bool = False):
+    """把记录的贡献值（sign 为 +1/-1）累加到所属会话的待提交增量中
+
+    previous 为 True 时使用本次刷新前的列值（用于更新时扣减旧值）。
+    """
+    session = Session.object_session(target)
+    if session is None:
+        return
+
+    state = inspect(target)
+    deltas = session.info.setdefault(_PENDING_KEY, defaultdict(int))
+    for name, column, match in COUNTER_SPECS[type(target)]:
+        if column is None:
+            deltas[name] += sign
+            continue
+
+        value = getattr(target, column)
+        if previous:
+            history = state.attrs[column].history
+            if history.deleted:
+                value = history.deleted[0]
+        deltas[name] += sign * _contribution(value, match)
+
+
+def _after_insert(mapper, connection, target):
+    _add_deltas(target, 1)
+
+
+def _before_delete(mapper, connection, target):
+    # 删除前读取列值，已过期的属性仍可从数据库加载
+    _add_deltas(target, -1, previous=True)
+
+
+def _after_update(mapper, connection, target):
+    _add_deltas(target, -1, previous=True)
+    _add_deltas(target, 1)
+
+
+def _apply_deltas(session: Session, flush_context):
+    """刷新结束后在同一事务中一次性写入计数器增量"""
+    deltas: Dict[str, int] = session.info.pop(_PENDING_KEY, None)
+    if not deltas:
+        return
+
+    changes = [{"counter_name": name, "delta": delta} for name, delta in deltas.items() if delta]
+    if not changes:
+        return
+
+    session.connection().execute(
+        update(SystemCounter.__table__)
+        .where(SystemCounter.__table__.c.name == bindparam("counter_name"))
+        .values(value=SystemCounter.__table__.c.value + bindparam("delta")),
+        changes
+    )
+
+
+def compute_counters(conn: Connection) -> Dict[str, int]:
+    """按业务表重新聚合计数器值，每张表一条条件聚合查询"""
+    values = {}
+    for model, specs in COUNTER_SPECS.items():
+        columns = []
+        for name, column, match in specs:
+            if column is None:
+                columns.append(func.count())
+            elif match is SUM:
+                columns.append(func.coalesce(func.sum(getattr(model, column)), 0))
+            else:
+                columns.append(func.coalesce(func.sum(case((getattr(model, column) == match, 1), else_=0)), 0))
+
+        row = conn.execute(select(*columns).select_from(model.__table__)).one()
+        values.update({name: int(value) for (name, _, _), value in zip(specs, row)})
+    return values
+
+
+def rebuild_counters(conn: Connection) -> Dict[str, int]:
+    """重建计数器（迁移回填或修正偏差时使用），返回重建后的值"""
+    values = compute_counters(conn)
+    table = SystemCounter.__table__
+    conn.execute(table.delete().where(table.c.name.in_(COUNTER_NAMES)))
+    conn.execute(table.insert(), [{"name": name, "value": value} for name, value in values.items()])
+    return values
+
+
+for _model in COUNTER_SPECS:
+    event.listen(_model, "after_insert", _after_insert)
+    event.listen(_model, "before_delete", _before_delete)
+    event.listen(_model, "after_update", _after_update)
+
+event.listen(Session, "after_flush", _apply_deltas)
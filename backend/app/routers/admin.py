@@ -5,10 +5,19 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from typing import Optional
 
-from app.database import get_db
+from app.database import get_db, run_in_db_thread
 from app.schemas.common import ResponseModel
 from app.services.auth_service import get_current_admin_user
 from app.services.admin_service import AdminService
+from app.services.file_service import FileService
+from app.utils.highlight_cache import highlight_cache, fragment_cache
+from app.services.pdf_renderer import pdf_render_pool
+from app.services.highlight_renderer import highlight_pool
+from app.services.language_detector import language_detector
+from app.services.window_highlighter import window_highlighter
+from app.utils.line_index import line_index_cache
+from app.services.password_hasher import password_hasher
+from app.utils.pagination import InvalidCursorError
 from app.models.user import User
 
 router = APIRouter()
@@ -18,19 +27,23 @@ async def get_users(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     search: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    total: str = Query("exact", pattern="^(exact|approx|none)$"),
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    """获取用户列表"""
+    """获取用户列表（传入 cursor 时按游标分页，忽略 page）"""
     try:
         admin_service = AdminService(db)
-        users = await admin_service.get_users(page, page_size, search)
+        users = await admin_service.get_users(page, page_size, search, cursor, total)
 
         return ResponseModel(
             code=0,
             message="获取成功",
             data=users
         )
+    except InvalidCursorError as e:
+        return ResponseModel(code=4002, message=str(e))
     except Exception as e:
         return ResponseModel(code=5001, message="获取用户列表失败")
 
@@ -73,3 +86,140 @@ async def get_system_stats(
         )
     except Exception as e:
         return ResponseModel(code=5001, message="获取统计信息失败")
+
+@router.post("/stats/recount", response_model=ResponseModel)
+async def recount_system_stats(
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """按业务表重建统计计数器"""
+    try:
+        admin_service = AdminService(db)
+        stats = await admin_service.recount_system_stats()
+
+        return ResponseModel(
+            code=0,
+            message="重建成功",
+            data=stats
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="重建统计计数器失败")
+
+@router.get("/cache/highlight", response_model=ResponseModel)
+async def get_highlight_cache_stats(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """获取代码高亮缓存统计"""
+    try:
+        return ResponseModel(
+            code=0,
+            message="获取成功",
+            data=highlight_cache.get_stats()
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="获取缓存统计失败")
+
+@router.get("/cache/fragments", response_model=ResponseModel)
+async def get_fragment_cache_stats(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """获取导出片段缓存统计"""
+    try:
+        return ResponseModel(
+            code=0,
+            message="获取成功",
+            data=fragment_cache.get_stats()
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="获取缓存统计失败")
+
+@router.get("/pdf/render-pool", response_model=ResponseModel)
+async def get_pdf_render_pool_stats(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """获取PDF渲染进程池统计（含队列深度）"""
+    try:
+        return ResponseModel(
+            code=0,
+            message="获取成功",
+            data=pdf_render_pool.get_stats()
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="获取渲染队列统计失败")
+
+@router.get("/highlight/pool", response_model=ResponseModel)
+async def get_highlight_pool_stats(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """获取代码高亮进程池统计"""
+    try:
+        return ResponseModel(
+            code=0,
+            message="获取成功",
+            data=highlight_pool.get_stats()
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="获取高亮进程池统计失败")
+
+@router.get("/highlight/detection", response_model=ResponseModel)
+async def get_language_detection_stats(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """获取语言检测统计（各检测方式的次数与结果缓存命中情况）"""
+    try:
+        return ResponseModel(
+            code=0,
+            message="获取成功",
+            data=language_detector.get_stats()
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="获取语言检测统计失败")
+
+@router.get("/highlight/preview", response_model=ResponseModel)
+async def get_preview_stats(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """获取分页预览统计（词法状态检查点与行偏移索引缓存）"""
+    try:
+        return ResponseModel(
+            code=0,
+            message="获取成功",
+            data={
+                **window_highlighter.get_stats(),
+                "line_index": line_index_cache.get_stats()
+            }
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="获取分页预览统计失败")
+
+@router.get("/auth/hash-pool", response_model=ResponseModel)
+async def get_password_hash_pool_stats(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """获取密码哈希线程池统计（含队列深度）"""
+    try:
+        return ResponseModel(
+            code=0,
+            message="获取成功",
+            data=password_hasher.get_stats()
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="获取密码哈希队列统计失败")
+
+@router.post("/storage/gc", response_model=ResponseModel)
+async def collect_storage_garbage(
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """清理未被引用的上传文件存储"""
+    try:
+        # 遍历存储目录和查询引用较慢，在数据库线程池中执行
+        result = await run_in_db_thread(FileService(db).collect_garbage)
+
+        return ResponseModel(
+            code=0,
+            message="清理完成",
+            data=result
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="清理存储失败")
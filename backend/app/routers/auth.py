@@ -7,6 +7,7 @@ from app.database import get_db
 from app.schemas.user import UserCreate, UserLogin, TokenResponse
 from app.schemas.common import ResponseModel
 from app.services.auth_service import AuthService
+from app.services.password_hasher import PasswordHashBusyError
 
 router = APIRouter()
 
@@ -23,6 +24,8 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     except ValueError as e:
         return ResponseModel(code=1001, message=str(e))
+    except PasswordHashBusyError as e:
+        return ResponseModel(code=5003, message=str(e))
     except Exception as e:
         return ResponseModel(code=5001, message="服务器内部错误")
 
@@ -39,5 +42,7 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
         )
     except ValueError as e:
         return ResponseModel(code=1002, message=str(e))
+    except PasswordHashBusyError as e:
+        return ResponseModel(code=5003, message=str(e))
     except Exception as e:
         return ResponseModel(code=5001, message="服务器内部错误")
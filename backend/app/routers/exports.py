@@ -2,7 +2,7 @@
 导出路由
 """
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 import os
 
@@ -10,8 +10,10 @@ from app.database import get_db
 from app.schemas.common import ResponseModel
 from app.services.auth_service import get_current_user
 from app.services.export_service import ExportService
+from app.services.export_job_service import ExportJobService
 from app.models.user import User
 from app.models.export_history import ExportHistory
+from app.models.project import Project
 
 router = APIRouter()
 
@@ -37,18 +39,40 @@ async def export_project_pdf(
     except Exception as e:
         return ResponseModel(code=5001, message=f"导出失败: {str(e)}")
 
+@router.get("/projects/{project_id}/html")
+async def stream_project_html(
+    project_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """流式导出项目HTML（边生成边发送，不落盘）"""
+    try:
+        export_service = ExportService(db)
+        chunks = await export_service.stream_project_html(project_id, current_user.id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="导出失败")
+
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="项目不存在或没有可导出的文件")
+
+    return StreamingResponse(
+        chunks,
+        media_type="text/html; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="project_{project_id}.html"'}
+    )
+
 @router.get("/history", response_model=ResponseModel)
-async def get_export_history(
+def get_export_history(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """获取导出历史"""
     try:
-        # 获取用户的导出历史
+        # 获取用户的导出历史（直接按连接的项目所有者过滤，可使用项目与导出历史上的索引）
         histories = db.query(ExportHistory).join(
             ExportHistory.project
         ).filter(
-            ExportHistory.project.has(owner_id=current_user.id)
+            Project.owner_id == current_user.id
         ).order_by(ExportHistory.created_at.desc()).limit(50).all()
 
         return ResponseModel(
@@ -73,7 +97,7 @@ async def get_export_history(
         return ResponseModel(code=5001, message="获取导出历史失败")
 
 @router.get("/download/{export_id}")
-async def download_export(
+def download_export(
     export_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -114,3 +138,51 @@ async def download_export(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="下载失败")
+
+@router.get("/jobs/{job_id}", response_model=ResponseModel)
+async def get_export_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """查询导出任务状态与进度"""
+    try:
+        export_job_service = ExportJobService(db)
+        job = await export_job_service.get_job(job_id, current_user.id)
+
+        if not job:
+            return ResponseModel(code=4001, message="导出任务不存在")
+
+        return ResponseModel(
+            code=0,
+            message="获取成功",
+            data=export_job_service.job_to_dict(job)
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="获取导出任务失败")
+
+@router.get("/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """下载导出任务结果"""
+    try:
+        job = await ExportJobService(db).get_job(job_id, current_user.id)
+
+        if not job or job.status != "success" or not job.result_file_path:
+            raise HTTPException(status_code=404, detail="文件不存在")
+
+        if not os.path.exists(job.result_file_path):
+            raise HTTPException(status_code=404, detail="文件已被删除")
+
+        return FileResponse(
+            path=job.result_file_path,
+            filename=os.path.basename(job.result_file_path),
+            media_type="application/pdf"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="下载失败")
@@ -1,7 +1,9 @@
 """
 文件路由
 """
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Query, Request, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import os
@@ -12,18 +14,17 @@ from pathlib import Path
 from app.database import get_db
 from app.schemas.common import ResponseModel
 from app.services.auth_service import get_current_user
-from app.services.file_service import FileService
+from app.services.file_service import (
+    FileService, FileTooLargeError, MAX_FILE_SIZE, is_allowed_file, UPLOAD_BATCH_MAX_FILES
+)
+from app.services.project_service import ProjectService
 from app.services.highlight_service import HighlightService
+from app.services.window_highlighter import PreviewRangeError
+from app.utils.pagination import InvalidCursorError
 from app.models.user import User
 
 router = APIRouter()
 
-# 允许的文件扩展名
-ALLOWED_EXTENSIONS = {'.py', '.java', '.js', '.ts', '.md', '.txt', '.c', '.cpp', '.h', '.hpp', '.css', '.html', '.xml', '.json', '.yml', '.yaml', '.sql', '.sh', '.bat', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'}
-
-# 最大文件大小 (10MB)
-MAX_FILE_SIZE = 10 * 1024 * 1024
-
 @router.post("/upload", response_model=ResponseModel)
 async def upload_file(
     file: UploadFile = File(...),
@@ -33,67 +34,98 @@ async def upload_file(
     """上传文件"""
     try:
         # 检查文件扩展名
-        file_ext = Path(file.filename).suffix.lower()
-        if file_ext not in ALLOWED_EXTENSIONS:
+        if not is_allowed_file(file.filename):
+            file_ext = Path(file.filename or "").suffix.lower()
             return ResponseModel(
                 code=4001,
                 message=f"不支持的文件类型: {file_ext}"
             )
 
-        # 检查文件大小
-        file_content = await file.read()
-        if len(file_content) > MAX_FILE_SIZE:
+        # 分块写入磁盘，超过大小限制时立即中止
+        file_service = FileService(db)
+        try:
+            uploaded_file = await file_service.save_upload_stream(
+                file, current_user.id, MAX_FILE_SIZE
+            )
+        except FileTooLargeError:
             return ResponseModel(
                 code=4002,
-                message="文件大小超过限制 (10MB)"
+                message=f"文件大小超过限制 ({MAX_FILE_SIZE // (1024 * 1024)}MB)"
             )
 
-        # 重置文件指针
-        await file.seek(0)
-
-        file_service = FileService(db)
-        uploaded_file = await file_service.save_uploaded_file(
-            file, current_user.id, file_content
-        )
-
         return ResponseModel(
             code=0,
             message="文件上传成功",
             data={
                 "file_id": uploaded_file.id,
                 "filename": uploaded_file.original_filename,
-                "file_size": uploaded_file.file_size
+                "file_size": uploaded_file.file_size,
+                "content_hash": uploaded_file.content_hash
             }
         )
     except Exception as e:
         return ResponseModel(code=5001, message=f"文件上传失败: {str(e)}")
 
+@router.post("/upload/batch", response_model=ResponseModel)
+async def upload_files_batch(
+    files: List[UploadFile] = File(...),
+    project_id: Optional[int] = Form(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量上传文件（可选直接加入项目）"""
+    try:
+        if len(files) > UPLOAD_BATCH_MAX_FILES:
+            return ResponseModel(
+                code=4003,
+                message=f"单次最多上传 {UPLOAD_BATCH_MAX_FILES} 个文件"
+            )
+
+        if project_id is not None:
+            project = await ProjectService(db).get_project_by_id(project_id, current_user.id)
+            if not project:
+                return ResponseModel(code=4001, message="项目不存在")
+
+        file_service = FileService(db)
+        results = await file_service.save_uploads_batch(
+            files, current_user.id, project_id, MAX_FILE_SIZE
+        )
+        succeeded = sum(1 for r in results if r["status"] == "success")
+
+        return ResponseModel(
+            code=0,
+            message=f"批量上传完成：成功 {succeeded} 个，失败 {len(results) - succeeded} 个",
+            data={
+                "project_id": project_id,
+                "succeeded": succeeded,
+                "failed": len(results) - succeeded,
+                "results": results
+            }
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message=f"批量上传失败: {str(e)}")
+
 @router.get("", response_model=ResponseModel)
 async def get_files(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    total: str = Query("exact", pattern="^(exact|approx|none)$"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取用户文件列表"""
+    """获取用户文件列表（传入 cursor 时按游标分页，忽略 page）"""
     try:
         file_service = FileService(db)
-        files = await file_service.get_user_files(current_user.id)
+        files = await file_service.get_user_files(current_user.id, page, page_size, cursor, total)
 
         return ResponseModel(
             code=0,
             message="获取成功",
-            data={
-                "files": [
-                    {
-                        "id": f.id,
-                        "original_filename": f.original_filename,
-                        "file_size": f.file_size,
-                        "file_type": f.file_type,
-                        "created_at": f.created_at
-                    }
-                    for f in files
-                ]
-            }
+            data=files
         )
+    except InvalidCursorError as e:
+        return ResponseModel(code=4002, message=str(e))
     except Exception as e:
         return ResponseModel(code=5001, message="获取文件列表失败")
 
@@ -122,15 +154,29 @@ async def delete_file(
 async def preview_file(
     file_id: int,
     language: Optional[str] = None,
+    start_line: Optional[int] = Query(None, ge=1, description="起始行（从1开始）"),
+    end_line: Optional[int] = Query(None, ge=1, description="结束行（含）"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """预览文件（带语法高亮）"""
+    """预览文件（带语法高亮）
+
+    指定 start_line 或 end_line 时只返回该行区间（单次最多 PREVIEW_MAX_LINES 行），
+    total_lines 为文件总行数；都不指定时返回整个文件。
+    """
     try:
         highlight_service = HighlightService(db)
-        result = await highlight_service.highlight_code(
-            file_id, current_user.id, language
-        )
+        if start_line is not None or end_line is not None:
+            try:
+                result = await highlight_service.highlight_window(
+                    file_id, current_user.id, start_line or 1, end_line, language
+                )
+            except PreviewRangeError as e:
+                return ResponseModel(code=4002, message=str(e))
+        else:
+            result = await highlight_service.highlight_code(
+                file_id, current_user.id, language
+            )
 
         if not result:
             return ResponseModel(code=4001, message="文件不存在或无法读取")
@@ -144,16 +190,24 @@ async def preview_file(
         return ResponseModel(code=5001, message="预览失败")
 
 @router.get("/highlight/css")
-async def get_highlight_css(db: Session = Depends(get_db)):
-    """获取代码高亮CSS样式"""
+async def get_highlight_css(request: Request, db: Session = Depends(get_db)):
+    """获取代码高亮CSS样式（带强ETag，客户端缓存仍有效时返回304）"""
     try:
         highlight_service = HighlightService(db)
-        css = highlight_service.get_highlight_css()
-
-        return ResponseModel(
-            code=0,
-            message="获取成功",
-            data={"css": css}
+        css, etag = highlight_service.get_highlight_css_entry()
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+
+        return JSONResponse(
+            content=jsonable_encoder(ResponseModel(
+                code=0,
+                message="获取成功",
+                data={"css": css}
+            )),
+            headers=headers
         )
     except Exception as e:
         return ResponseModel(code=5001, message="获取CSS失败")
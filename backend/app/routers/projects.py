@@ -1,14 +1,16 @@
 """
 项目路由
 """
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi import APIRouter, Depends, Query, Body, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Optional, List
 from app.database import get_db
 from app.schemas.project import ProjectCreate, ProjectUpdate
 from app.schemas.common import ResponseModel
 from app.services.auth_service import get_current_user
 from app.services.project_service import ProjectService
+from app.services.archive_service import ArchiveService, ArchiveLimitError
+from app.utils.pagination import InvalidCursorError
 from app.models.user import User
 
 router = APIRouter()
@@ -36,20 +38,24 @@ async def get_projects(
     project_type: Optional[str] = Query(None, pattern="^(code|manual)$"),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    total: str = Query("exact", pattern="^(exact|approx|none)$"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """获取项目列表"""
+    """获取项目列表（传入 cursor 时按游标分页，忽略 page）"""
     try:
         project_service = ProjectService(db)
         projects = await project_service.get_user_projects(
-            current_user.id, project_type, page, page_size
+            current_user.id, project_type, page, page_size, cursor, total
         )
         return ResponseModel(
             code=0,
             message="获取成功",
             data=projects
         )
+    except InvalidCursorError as e:
+        return ResponseModel(code=4002, message=str(e))
     except Exception as e:
         return ResponseModel(code=5001, message="服务器内部错误")
 
@@ -153,6 +159,33 @@ async def add_file_to_project(
     except Exception as e:
         return ResponseModel(code=5001, message="添加文件失败")
 
+@router.post("/{project_id}/import", response_model=ResponseModel)
+async def import_project_archive(
+    project_id: int,
+    archive: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """导入压缩包（.zip/.tar.gz）中的代码文件到项目"""
+    try:
+        archive_service = ArchiveService(db)
+        result = await archive_service.import_archive(project_id, current_user.id, archive)
+
+        if result is None:
+            return ResponseModel(code=4001, message="项目不存在")
+
+        return ResponseModel(
+            code=0,
+            message=f"导入完成：成功 {result['imported']} 个，跳过 {result['skipped']} 个",
+            data=result
+        )
+    except ArchiveLimitError as e:
+        return ResponseModel(code=4002, message=str(e))
+    except ValueError as e:
+        return ResponseModel(code=4003, message=str(e))
+    except Exception as e:
+        return ResponseModel(code=5001, message="导入压缩包失败")
+
 @router.get("/{project_id}/files", response_model=ResponseModel)
 async def get_project_files(
     project_id: int,
@@ -199,73 +232,120 @@ async def remove_file_from_project(
     except Exception as e:
         return ResponseModel(code=5001, message="移除文件失败")
 
-@router.put("/{project_id}/files/{file_id}", response_model=ResponseModel)
-async def update_project_file(
+@router.put("/{project_id}/files/reorder", response_model=ResponseModel)
+async def reorder_project_files(
     project_id: int,
-    file_id: int,
-    update_data: dict,
+    file_orders: List[dict] = Body(...),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """更新项目文件信息"""
+    """重新排序项目文件"""
     try:
         project_service = ProjectService(db)
-        success = await project_service.update_project_file(
-            project_id, file_id, current_user.id, update_data
+        success = await project_service.reorder_project_files(
+            project_id, file_orders, current_user.id
         )
 
         if not success:
+            return ResponseModel(code=4001, message="项目不存在或文件顺序无效")
+
+        return ResponseModel(
+            code=0,
+            message="文件顺序更新成功"
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="更新文件顺序失败")
+
+@router.put("/{project_id}/files/{file_id}/move", response_model=ResponseModel)
+async def move_project_file(
+    project_id: int,
+    file_id: int,
+    before_file_id: Optional[int] = Query(None, description="移动到该文件之前，为空时移动到末尾"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """移动项目文件（只更新被移动的文件）"""
+    try:
+        project_service = ProjectService(db)
+        order_index = await project_service.move_project_file(
+            project_id, file_id, current_user.id, before_file_id
+        )
+
+        if order_index is None:
             return ResponseModel(code=4001, message="项目或文件不存在")
 
         return ResponseModel(
             code=0,
-            message="文件信息更新成功"
+            message="文件顺序更新成功",
+            data={"file_id": file_id, "order_index": order_index}
         )
     except Exception as e:
-        return ResponseModel(code=5001, message="更新文件信息失败")
+        return ResponseModel(code=5001, message="更新文件顺序失败")
 
-@router.put("/{project_id}/files/reorder", response_model=ResponseModel)
-async def reorder_project_files(
+@router.put("/{project_id}/files/{file_id}", response_model=ResponseModel)
+async def update_project_file(
     project_id: int,
-    file_orders: list,
+    file_id: int,
+    update_data: dict,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """重新排序项目文件"""
+    """更新项目文件信息"""
     try:
         project_service = ProjectService(db)
-        success = await project_service.reorder_project_files(
-            project_id, file_orders, current_user.id
+        success = await project_service.update_project_file(
+            project_id, file_id, current_user.id, update_data
         )
 
         if not success:
-            return ResponseModel(code=4001, message="项目不存在或文件顺序无效")
+            return ResponseModel(code=4001, message="项目或文件不存在")
 
         return ResponseModel(
             code=0,
-            message="文件顺序更新成功"
+            message="文件信息更新成功"
         )
     except Exception as e:
-        return ResponseModel(code=5001, message="更新文件顺序失败")
+        return ResponseModel(code=5001, message="更新文件信息失败")
 
 @router.post("/{project_id}/export/pdf")
 async def export_project_pdf(
     project_id: int,
     export_options: dict = {},
+    async_mode: bool = Query(False),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """导出项目为PDF"""
+    """导出项目为PDF（async_mode=true 时加入导出队列并立即返回任务ID）"""
     try:
+        if async_mode:
+            from app.services.export_job_service import ExportJobService
+
+            export_job_service = ExportJobService(db)
+            job = await export_job_service.enqueue_pdf_export(
+                project_id, current_user.id, export_options
+            )
+            if not job:
+                return ResponseModel(code=4001, message="项目不存在")
+
+            return ResponseModel(
+                code=0,
+                message="导出任务已提交",
+                data=export_job_service.job_to_dict(job)
+            )
+
         from app.services.pdf_service import PdfService
+        from app.services.pdf_renderer import PdfRenderBusyError
         from fastapi.responses import Response
 
         pdf_service = PdfService(db)
-        pdf_bytes = await pdf_service.export_project_to_pdf(
-            project_id=project_id,
-            user_id=current_user.id,
-            options=export_options
-        )
+        try:
+            pdf_bytes = await pdf_service.export_project_to_pdf(
+                project_id=project_id,
+                user_id=current_user.id,
+                options=export_options
+            )
+        except PdfRenderBusyError:
+            return ResponseModel(code=5003, message="导出任务繁忙，请稍后重试或使用异步导出")
 
         if not pdf_bytes:
             return ResponseModel(code=4001, message="项目不存在或无文件可导出")
@@ -278,7 +358,9 @@ async def export_project_pdf(
             content=pdf_bytes,
             media_type="application/pdf",
             headers={
-                "Content-Disposition": f"attachment; filename*=UTF-8''{filename}"
+                "Content-Disposition": f"attachment; filename*=UTF-8''{filename}",
+                "X-Fragments-Reused": str(pdf_service.fragment_stats['reused']),
+                "X-Fragments-Rendered": str(pdf_service.fragment_stats['rendered'])
             }
         )
 
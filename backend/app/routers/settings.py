@@ -8,6 +8,7 @@ from app.database import get_db
 from app.schemas.common import ResponseModel
 from app.services.auth_service import get_current_admin_user
 from app.services.template_service import TemplateService
+from app.services.highlight_service import HighlightService
 from app.models.user import User
 
 router = APIRouter()
@@ -79,3 +80,68 @@ async def update_template_status(
         )
     except Exception as e:
         return ResponseModel(code=5001, message="更新模板状态失败")
+
+@router.get("/highlight-mappings", response_model=ResponseModel)
+async def get_highlight_mappings(
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """获取后缀-语言映射列表"""
+    try:
+        highlight_service = HighlightService(db)
+        mappings = await highlight_service.get_mappings()
+
+        return ResponseModel(
+            code=0,
+            message="获取成功",
+            data={"mappings": mappings}
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="获取映射列表失败")
+
+@router.put("/highlight-mappings", response_model=ResponseModel)
+async def save_highlight_mapping(
+    suffix: str,
+    language: str,
+    enabled: bool = True,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """新增或更新后缀-语言映射"""
+    try:
+        highlight_service = HighlightService(db)
+        mapping = await highlight_service.save_mapping(suffix, language, enabled)
+
+        return ResponseModel(
+            code=0,
+            message="保存成功",
+            data={
+                "id": mapping.id,
+                "suffix": mapping.suffix,
+                "language": mapping.language,
+                "enabled": mapping.enabled
+            }
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="保存映射失败")
+
+@router.delete("/highlight-mappings/{mapping_id}", response_model=ResponseModel)
+async def delete_highlight_mapping(
+    mapping_id: int,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """删除后缀-语言映射"""
+    try:
+        highlight_service = HighlightService(db)
+        success = await highlight_service.delete_mapping(mapping_id)
+
+        if not success:
+            return ResponseModel(code=4001, message="映射不存在")
+
+        return ResponseModel(
+            code=0,
+            message="删除成功"
+        )
+    except Exception as e:
+        return ResponseModel(code=5001, message="删除映射失败")
@@ -3,6 +3,7 @@
 """
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 class FileResponse(BaseModel):
     """文件响应模式"""
@@ -11,6 +12,7 @@ class FileResponse(BaseModel):
     storage_path: str
     file_size: int
     file_type: str
+    encoding: Optional[str] = None
     uploader_id: int
     created_at: datetime
     
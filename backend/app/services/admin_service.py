@@ -1,56 +1,102 @@
 """
 管理员服务
 """
+from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
+import os
+import threading
+import time
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, select
 
+from app.database import offload_db
 from app.models.user import User
 from app.models.project import Project
 from app.models.file import UploadedFile
 from app.models.export_history import ExportHistory
+from app.models.system_counter import SystemCounter, COUNTER_NAMES, rebuild_counters
+from app.services.auth_service import user_cache
+from app.utils.pagination import paginate, TOTAL_EXACT, TOTAL_NONE
+
+# 统计快照有效期（秒），0 表示不缓存
+STATS_SNAPSHOT_TTL = int(os.getenv("STATS_SNAPSHOT_TTL", "30"))
+
+class StatsSnapshot:
+    """系统统计的进程内快照
+    
+    计数器已随写入增量维护，快照只用于合并高频的仪表盘刷新；
+    最近7天的活动数在有效期内可能略有滞后。
+    """
+    
+    def __init__(self, ttl: int = STATS_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._stats: Optional[Dict[str, Any]] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+    
+    def get(self) -> Optional[Dict[str, Any]]:
+        """读取未过期的快照"""
+        with self._lock:
+            if self._stats is None or self._expires_at < time.monotonic():
+                return None
+            return self._stats
+    
+    def set(self, stats: Dict[str, Any]):
+        """保存快照"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._stats = stats
+            self._expires_at = time.monotonic() + self.ttl
+    
+    def invalidate(self):
+        """使快照失效"""
+        with self._lock:
+            self._stats = None
+
+# 进程级共享实例
+stats_snapshot = StatsSnapshot()
 
 class AdminService:
     def __init__(self, db: Session):
         self.db = db
     
-    async def get_users(
+    @offload_db
+    def get_users(
         self, 
         page: int = 1, 
         page_size: int = 10, 
-        search: Optional[str] = None
+        search: Optional[str] = None,
+        cursor: Optional[str] = None,
+        total_mode: str = TOTAL_EXACT
     ) -> Dict[str, Any]:
-        """获取用户列表"""
+        """获取用户列表（按注册时间倒序，支持游标分页）"""
         query = self.db.query(User)
         
+        known_total = None
         if search:
             query = query.filter(User.username.contains(search))
+        elif total_mode != TOTAL_NONE:
+            # 未搜索时总数即用户计数器
+            known_total = self.db.query(SystemCounter.value).filter(
+                SystemCounter.name == "users.total"
+            ).scalar()
         
-        # 计算总数
-        total = query.count()
-        
-        # 分页查询
-        offset = (page - 1) * page_size
-        users = query.offset(offset).limit(page_size).all()
-        
-        return {
-            "users": [
-                {
-                    "id": u.id,
-                    "username": u.username,
-                    "role": u.role,
-                    "is_active": u.is_active,
-                    "created_at": u.created_at
-                }
-                for u in users
-            ],
-            "total": total,
-            "page": page,
-            "page_size": page_size,
-            "total_pages": (total + page_size - 1) // page_size
-        }
+        result = paginate(query, User, page_size, cursor, page, total_mode, known_total)
+        result["users"] = [
+            {
+                "id": u.id,
+                "username": u.username,
+                "role": u.role,
+                "is_active": u.is_active,
+                "created_at": u.created_at
+            }
+            for u in result.pop("items")
+        ]
+        return result
     
-    async def update_user_status(self, user_id: int, is_active: bool) -> bool:
+    @offload_db
+    def update_user_status(self, user_id: int, is_active: bool) -> bool:
         """更新用户状态"""
         user = self.db.query(User).filter(User.id == user_id).first()
         if not user:
@@ -58,61 +104,61 @@ class AdminService:
         
         user.is_active = is_active
         self.db.commit()
+        user_cache.invalidate(user_id)
+        stats_snapshot.invalidate()
         
         return True
     
-    async def get_system_stats(self) -> Dict[str, Any]:
-        """获取系统统计信息"""
-        # 用户统计
-        total_users = self.db.query(User).count()
-        active_users = self.db.query(User).filter(User.is_active == True).count()
-        admin_users = self.db.query(User).filter(User.role == "admin").count()
-        
-        # 项目统计
-        total_projects = self.db.query(Project).count()
-        code_projects = self.db.query(Project).filter(Project.project_type == "code").count()
-        manual_projects = self.db.query(Project).filter(Project.project_type == "manual").count()
-        
-        # 文件统计
-        total_files = self.db.query(UploadedFile).count()
-        total_file_size = self.db.query(func.sum(UploadedFile.file_size)).scalar() or 0
-        
-        # 导出统计
-        total_exports = self.db.query(ExportHistory).count()
-        successful_exports = self.db.query(ExportHistory).filter(
-            ExportHistory.status == "success"
-        ).count()
-        failed_exports = self.db.query(ExportHistory).filter(
-            ExportHistory.status == "failed"
-        ).count()
+    @offload_db
+    def get_system_stats(self) -> Dict[str, Any]:
+        """获取系统统计信息（优先返回快照）"""
+        stats = stats_snapshot.get()
+        if stats is None:
+            stats = self._compute_stats()
+            stats_snapshot.set(stats)
+        return stats
+    
+    @offload_db
+    def recount_system_stats(self) -> Dict[str, Any]:
+        """按业务表重建计数器（修正偏差），返回最新统计"""
+        rebuild_counters(self.db.connection())
+        self.db.commit()
+        stats = self._compute_stats()
+        stats_snapshot.set(stats)
+        return stats
+    
+    def _compute_stats(self) -> Dict[str, Any]:
+        """读取计数器并统计最近活动，共两条查询"""
+        counters = dict(
+            self.db.query(SystemCounter.name, SystemCounter.value).filter(
+                SystemCounter.name.in_(COUNTER_NAMES)
+            ).all()
+        )
         
-        # 最近活动统计（最近7天）
-        from datetime import datetime, timedelta
+        # 最近活动统计（最近7天），走创建时间索引
         seven_days_ago = datetime.now() - timedelta(days=7)
+        recent_users, recent_projects, recent_exports = self.db.query(
+            self._count_since(User, seven_days_ago),
+            self._count_since(Project, seven_days_ago),
+            self._count_since(ExportHistory, seven_days_ago)
+        ).one()
         
-        recent_users = self.db.query(User).filter(
-            User.created_at >= seven_days_ago
-        ).count()
-        
-        recent_projects = self.db.query(Project).filter(
-            Project.created_at >= seven_days_ago
-        ).count()
-        
-        recent_exports = self.db.query(ExportHistory).filter(
-            ExportHistory.created_at >= seven_days_ago
-        ).count()
+        total_files = counters.get("files.total", 0)
+        total_file_size = counters.get("files.total_size", 0)
+        total_exports = counters.get("exports.total", 0)
+        successful_exports = counters.get("exports.success", 0)
         
         return {
             "users": {
-                "total": total_users,
-                "active": active_users,
-                "admin": admin_users,
+                "total": counters.get("users.total", 0),
+                "active": counters.get("users.active", 0),
+                "admin": counters.get("users.admin", 0),
                 "recent": recent_users
             },
             "projects": {
-                "total": total_projects,
-                "code": code_projects,
-                "manual": manual_projects,
+                "total": counters.get("projects.total", 0),
+                "code": counters.get("projects.code", 0),
+                "manual": counters.get("projects.manual", 0),
                 "recent": recent_projects
             },
             "files": {
@@ -123,8 +169,15 @@ class AdminService:
             "exports": {
                 "total": total_exports,
                 "successful": successful_exports,
-                "failed": failed_exports,
+                "failed": counters.get("exports.failed", 0),
                 "success_rate": (successful_exports / total_exports * 100) if total_exports > 0 else 0,
                 "recent": recent_exports
             }
         }
+    
+    @staticmethod
+    def _count_since(model, since: datetime):
+        """统计创建时间不早于 since 的记录数（标量子查询）"""
+        return select(func.count()).select_from(model).where(
+            model.created_at >= since
+        ).scalar_subquery()
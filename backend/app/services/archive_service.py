@@ -0,0 +1,326 @@
+"""
+压缩包导入服务
+
+接收 .zip / .tar.gz 压缩包，逐个成员流式读取并直接写入上传目录（不解压到临时目录），
+按扩展名与大小过滤、按内容去重，最后批量创建 UploadedFile 与按路径排序的 ProjectItem。
+"""
+import asyncio
+import hashlib
+import mimetypes
+import os
+import posixpath
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Optional, Dict, Any, List, BinaryIO, Iterator, Tuple, Callable
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from fastapi import UploadFile
+
+from app.database import run_in_db_thread
+from app.models.file import UploadedFile
+from app.models.project import Project, ProjectItem
+from app.services.project_service import ORDER_INDEX_GAP
+from app.services.file_service import (
+    FileService, FileTooLargeError, MAX_FILE_SIZE, is_allowed_file
+)
+
+# 压缩包导入限制
+ARCHIVE_MAX_TOTAL_SIZE = int(os.getenv("ARCHIVE_MAX_TOTAL_MB", "100")) * 1024 * 1024
+ARCHIVE_MAX_MEMBERS = int(os.getenv("ARCHIVE_MAX_MEMBERS", "2000"))
+
+# 支持的压缩包格式
+ARCHIVE_SUFFIXES = ('.zip', '.tar.gz', '.tgz', '.tar')
+
+
+class ArchiveLimitError(ValueError):
+    """压缩包超过导入限制"""
+
+
+def is_supported_archive(filename: str) -> bool:
+    """判断文件名是否为支持的压缩包格式"""
+    return (filename or '').lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _normalize_member_path(name: str) -> Optional[str]:
+    """规范化成员路径，忽略绝对路径、上级目录引用以及隐藏目录/系统文件"""
+    path = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+    if not path or path == '.' or path.startswith('../'):
+        return None
+    parts = path.split('/')
+    if any(part.startswith('.') or part == '__MACOSX' for part in parts):
+        return None
+    return path
+
+
+# 压缩包成员：(路径, 声明大小, CRC32（tar 为 None）, 打开成员内容的函数)
+ArchiveMember = Tuple[str, int, Optional[int], Callable[[], BinaryIO]]
+
+
+def _iter_zip_members(source: BinaryIO) -> Iterator[ArchiveMember]:
+    """遍历zip成员（按路径排序，成员可重复打开）"""
+    with zipfile.ZipFile(source) as archive:
+        infos = sorted(
+            (info for info in archive.infolist() if not info.is_dir()),
+            key=lambda info: info.filename
+        )
+        for info in infos:
+            yield info.filename, info.file_size, info.CRC, lambda info=info: archive.open(info)
+
+
+def _iter_tar_members(source: BinaryIO) -> Iterator[ArchiveMember]:
+    """以流模式遍历tar成员（不支持随机访问，顺序与归档内一致，成员只能读取一次）"""
+    with tarfile.open(fileobj=source, mode='r|*') as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            member = archive.extractfile(info)
+            if member is None:
+                continue
+            yield info.name, info.size, None, lambda member=member: member
+
+
+def _hash_member(member: BinaryIO, max_size: int) -> Tuple[str, int]:
+    """只计算成员内容的 SHA-256（不写入存储），返回 (哈希, 大小)；超过 max_size 时抛出 FileTooLargeError"""
+    hasher = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = member.read(1024 * 1024)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            raise FileTooLargeError("文件大小超过限制")
+        hasher.update(chunk)
+    return hasher.hexdigest(), size
+
+
+class ArchiveService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.file_service = FileService(db)
+
+    async def import_archive(
+        self,
+        project_id: int,
+        user_id: int,
+        archive: UploadFile
+    ) -> Optional[Dict[str, Any]]:
+        """导入压缩包到项目，项目不存在时返回None"""
+        project = await run_in_db_thread(self._get_owned_project, project_id, user_id)
+        if not project:
+            return None
+
+        if not is_supported_archive(archive.filename):
+            raise ValueError("仅支持 .zip、.tar.gz、.tgz、.tar 格式的压缩包")
+
+        await archive.seek(0)
+        accepted, skipped = await asyncio.to_thread(
+            self._scan_archive, archive.file, archive.filename
+        )
+
+        try:
+            imported = await run_in_db_thread(
+                self._create_records, project_id, user_id, accepted, skipped
+            )
+        except Exception:
+            await run_in_db_thread(self._discard, accepted)
+            raise
+
+        return {
+            "project_id": project_id,
+            "imported": len(imported),
+            "skipped": len(skipped),
+            "files": imported,
+            "skipped_files": skipped
+        }
+
+    def _get_owned_project(self, project_id: int, user_id: int) -> Optional[Project]:
+        """查询属于用户的项目（同步）"""
+        return self.db.query(Project).filter(
+            Project.id == project_id,
+            Project.owner_id == user_id
+        ).first()
+
+    def _scan_archive(
+        self,
+        source: BinaryIO,
+        filename: str
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """流式读取压缩包成员并写入上传目录"""
+        if filename.lower().endswith('.zip'):
+            members = _iter_zip_members(source)
+        else:
+            members = _iter_tar_members(source)
+
+        accepted: List[Dict[str, Any]] = []
+        skipped: List[Dict[str, Any]] = []
+        seen_hashes = set()
+        seen_checksums = set()
+        total_size = 0
+        member_count = 0
+        total_limit_error = ArchiveLimitError(
+            f"压缩包解压后总大小超过限制 ({ARCHIVE_MAX_TOTAL_SIZE // (1024 * 1024)}MB)"
+        )
+
+        try:
+            for name, declared_size, checksum, open_member in members:
+                member_count += 1
+                if member_count > ARCHIVE_MAX_MEMBERS:
+                    raise ArchiveLimitError(f"压缩包文件数超过限制 ({ARCHIVE_MAX_MEMBERS})")
+
+                path = _normalize_member_path(name)
+                if path is None:
+                    continue
+
+                if not is_allowed_file(path):
+                    skipped.append({"path": path, "reason": "不支持的文件类型"})
+                    continue
+
+                if declared_size > MAX_FILE_SIZE:
+                    skipped.append({"path": path, "reason": "文件大小超过限制"})
+                    continue
+
+                # 按剩余总配额限制单个成员读取量，防止压缩炸弹；重复的成员同样计入总量
+                remaining = ARCHIVE_MAX_TOTAL_SIZE - total_size
+                limit = min(MAX_FILE_SIZE, remaining)
+
+                # zip 成员与已接受的成员大小和CRC相同时，先只计算哈希，确认重复则不写入存储
+                if checksum is not None and (declared_size, checksum) in seen_checksums:
+                    try:
+                        with open_member() as member:
+                            file_hash, file_size = _hash_member(member, limit)
+                    except FileTooLargeError:
+                        if remaining < MAX_FILE_SIZE:
+                            raise total_limit_error
+                        skipped.append({"path": path, "reason": "文件大小超过限制"})
+                        continue
+                    total_size += file_size
+                    if file_hash in seen_hashes:
+                        skipped.append({"path": path, "reason": "内容与压缩包内其他文件重复"})
+                        continue
+                    remaining = ARCHIVE_MAX_TOTAL_SIZE - total_size
+                    limit = min(MAX_FILE_SIZE, remaining)
+
+                try:
+                    with open_member() as member:
+                        storage_path, file_size, file_hash, encoding = self.file_service.copy_to_storage(
+                            member, path, limit
+                        )
+                except FileTooLargeError:
+                    if remaining < MAX_FILE_SIZE:
+                        raise total_limit_error
+                    skipped.append({"path": path, "reason": "文件大小超过限制"})
+                    continue
+
+                total_size += file_size
+                if file_hash in seen_hashes:
+                    # tar 成员只能读取一次，写入后才能判断重复（内容寻址，不占用额外存储）
+                    skipped.append({"path": path, "reason": "内容与压缩包内其他文件重复"})
+                    continue
+
+                seen_hashes.add(file_hash)
+                if checksum is not None:
+                    seen_checksums.add((declared_size, checksum))
+                accepted.append({
+                    "path": path,
+                    "storage_path": str(storage_path),
+                    "file_size": file_size,
+                    "content_hash": file_hash,
+                    "encoding": encoding
+                })
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            self._discard(accepted)
+            raise ValueError(f"无法读取压缩包: {str(e)}")
+        except BaseException:
+            self._discard(accepted)
+            raise
+
+        accepted.sort(key=lambda entry: entry["path"])
+        return accepted, skipped
+
+    def _create_records(
+        self,
+        project_id: int,
+        user_id: int,
+        accepted: List[Dict[str, Any]],
+        skipped: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """单事务创建文件记录与项目关联；与用户已有文件内容相同时复用已有记录"""
+        if not accepted:
+            return []
+
+        hashes = [entry["content_hash"] for entry in accepted]
+        existing_files = {}
+        for file_id, file_hash in self.db.query(UploadedFile.id, UploadedFile.content_hash).filter(
+            UploadedFile.uploader_id == user_id,
+            UploadedFile.content_hash.in_(hashes)
+        ).order_by(UploadedFile.id):
+            existing_files.setdefault(file_hash, file_id)
+
+        in_project = {
+            file_id for (file_id,) in self.db.query(ProjectItem.file_id).filter(
+                ProjectItem.project_id == project_id
+            )
+        }
+
+        new_files = []
+        rows = []
+        for entry in accepted:
+            file_id = existing_files.get(entry["content_hash"])
+            if file_id is not None:
+                # 已有相同内容的文件，复用已有记录
+                entry["storage_path"] = None
+                if file_id in in_project:
+                    skipped.append({"path": entry["path"], "reason": "项目中已存在相同内容的文件"})
+                    continue
+                rows.append((entry, file_id, None))
+            else:
+                uploaded_file = UploadedFile(
+                    original_filename=posixpath.basename(entry["path"]),
+                    storage_path=entry["storage_path"],
+                    file_size=entry["file_size"],
+                    file_type=mimetypes.guess_type(entry["path"])[0] or "application/octet-stream",
+                    content_hash=entry["content_hash"],
+                    encoding=entry["encoding"],
+                    uploader_id=user_id
+                )
+                new_files.append(uploaded_file)
+                rows.append((entry, None, uploaded_file))
+
+        try:
+            self.db.add_all(new_files)
+            self.db.flush()
+
+            max_order = self.db.query(func.max(ProjectItem.order_index)).filter(
+                ProjectItem.project_id == project_id
+            ).scalar() or 0
+
+            imported = []
+            for offset, (entry, file_id, uploaded_file) in enumerate(rows, 1):
+                file_id = file_id if file_id is not None else uploaded_file.id
+                self.db.add(ProjectItem(
+                    project_id=project_id,
+                    file_id=file_id,
+                    display_name=entry["path"],
+                    order_index=max_order + offset * ORDER_INDEX_GAP
+                ))
+                imported.append({
+                    "path": entry["path"],
+                    "file_id": file_id,
+                    "file_size": entry["file_size"],
+                    "reused": uploaded_file is None
+                })
+
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        return imported
+
+    def _discard(self, accepted: List[Dict[str, Any]]):
+        """清理本次导入已写入但未被任何文件记录引用的存储对象（不等待回收宽限期）"""
+        for entry in accepted:
+            if entry.get("storage_path"):
+                self.file_service.release_storage(entry["storage_path"], force=True)
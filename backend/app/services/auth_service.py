@@ -1,41 +1,92 @@
 """
 认证服务
 """
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 import os
 
-from app.database import get_db
+from app.database import get_db, run_in_db_thread
 from app.models.user import User
 from app.schemas.user import UserCreate, UserLogin
-
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.services.password_hasher import password_hasher
 
 # JWT配置
 SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("TOKEN_EXPIRE_MINUTES", "1440"))  # 24小时
 
+# 已认证用户缓存配置
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))  # 秒
+USER_CACHE_MAX_ITEMS = int(os.getenv("USER_CACHE_MAX_ITEMS", "1024"))
+
 # HTTP Bearer认证
 security = HTTPBearer()
 
+class UserCache:
+    """已认证用户的进程内短时缓存（按用户ID）
+    
+    缓存的是已从会话中分离的 User 实例，只用于读取列属性。账户状态变更时需调用
+    invalidate；多进程部署时其他进程最多在 TTL 内沿用旧状态。
+    """
+    
+    def __init__(self, ttl: int = USER_CACHE_TTL, max_items: int = USER_CACHE_MAX_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._entries: "OrderedDict[int, Tuple[float, User]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id: int) -> Optional[User]:
+        """读取未过期的缓存用户"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+    
+    def set(self, user: User):
+        """缓存用户并按容量淘汰最久未使用的条目"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id: Optional[int] = None):
+        """使指定用户（为空时全部）的缓存失效"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+# 进程级共享实例
+user_cache = UserCache()
+
 class AuthService:
     def __init__(self, db: Session):
         self.db = db
     
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """验证密码"""
-        return pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """验证密码（在密码哈希线程池中执行）"""
+        return await password_hasher.verify(plain_password, hashed_password)
     
-    def get_password_hash(self, password: str) -> str:
-        """获取密码哈希"""
-        return pwd_context.hash(password)
+    async def get_password_hash(self, password: str) -> str:
+        """获取密码哈希（在密码哈希线程池中执行）"""
+        return await password_hasher.hash(password)
     
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None):
         """创建访问令牌"""
@@ -51,34 +102,20 @@ class AuthService:
     async def register_user(self, user_data: UserCreate) -> User:
         """注册用户"""
         # 检查用户名是否已存在
-        existing_user = self.db.query(User).filter(User.username == user_data.username).first()
+        existing_user = await run_in_db_thread(self._find_user, user_data.username)
         if existing_user:
             raise ValueError("用户名已存在")
         
         # 创建新用户
-        hashed_password = self.get_password_hash(user_data.password)
-        
-        # 检查是否是第一个用户（自动设为管理员）
-        user_count = self.db.query(User).count()
-        role = "admin" if user_count == 0 else "user"
+        hashed_password = await self.get_password_hash(user_data.password)
         
-        new_user = User(
-            username=user_data.username,
-            password_hash=hashed_password,
-            role=role
-        )
-        
-        self.db.add(new_user)
-        self.db.commit()
-        self.db.refresh(new_user)
-        
-        return new_user
+        return await run_in_db_thread(self._create_user, user_data.username, hashed_password)
     
     async def authenticate_user(self, user_data: UserLogin) -> dict:
         """用户认证"""
-        user = self.db.query(User).filter(User.username == user_data.username).first()
+        user = await run_in_db_thread(self._find_user, user_data.username)
         
-        if not user or not self.verify_password(user_data.password, user.password_hash):
+        if not user or not await self.verify_password(user_data.password, user.password_hash):
             raise ValueError("用户名或密码错误")
         
         if not user.is_active:
@@ -103,12 +140,36 @@ class AuthService:
                 "created_at": user.created_at
             }
         }
+    
+    def _find_user(self, username: str) -> Optional[User]:
+        """按用户名查询用户（同步）"""
+        return self.db.query(User).filter(User.username == username).first()
+    
+    def _create_user(self, username: str, password_hash: str) -> User:
+        """创建用户（同步），第一个用户自动设为管理员"""
+        user_count = self.db.query(User).count()
+        role = "admin" if user_count == 0 else "user"
+        
+        new_user = User(
+            username=username,
+            password_hash=password_hash,
+            role=role
+        )
+        
+        self.db.add(new_user)
+        self.db.commit()
+        self.db.refresh(new_user)
+        
+        return new_user
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
-    """获取当前用户"""
+    """获取当前用户
+    
+    令牌中携带 user_id，命中用户缓存时只需校验签名，不查询数据库。
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无效的认证凭据",
@@ -118,15 +179,35 @@ async def get_current_user(
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
+        user_id: Optional[int] = payload.get("user_id")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
+    if user_id is not None:
+        user = user_cache.get(user_id)
+        if user is not None and user.username == username:
+            return user
+    
+    user = await run_in_db_thread(_load_user, db, username)
     if user is None:
         raise credentials_exception
     
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="账户已被禁用"
+        )
+    
+    user_cache.set(user)
+    return user
+
+def _load_user(db: Session, username: str) -> Optional[User]:
+    """按用户名查询用户，并从会话中分离以便跨请求缓存"""
+    user = db.query(User).filter(User.username == username).first()
+    if user is not None:
+        db.expunge(user)
     return user
 
 async def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
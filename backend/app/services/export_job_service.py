@@ -0,0 +1,219 @@
+"""
+异步导出任务服务
+
+导出请求写入 ExportJob 后立即返回任务ID，渲染在独立的工作池中执行：
+配置了可用的 Redis 时使用 RQ 队列（需单独启动 `rq worker exports`），
+否则回退到进程内线程池。
+"""
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, offload_db
+from app.models.export_job import ExportJob
+from app.models.export_history import ExportHistory
+from app.models.project import Project
+
+# 队列配置
+REDIS_URL = os.getenv("REDIS_URL")
+EXPORT_QUEUE_NAME = os.getenv("EXPORT_QUEUE_NAME", "exports")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_JOB_TIMEOUT = int(os.getenv("EXPORT_JOB_TIMEOUT", "600"))  # 秒
+
+# 文件渲染阶段占总进度的比例，剩余部分留给PDF生成
+RENDER_PROGRESS_SHARE = 90
+
+_rq_queue = None
+_rq_checked = False
+_local_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_rq_queue():
+    """获取RQ队列，Redis不可用时返回None（只检测一次）"""
+    global _rq_queue, _rq_checked
+    if _rq_checked:
+        return _rq_queue
+
+    _rq_checked = True
+    if not REDIS_URL:
+        return None
+
+    try:
+        from redis import Redis
+        from rq import Queue
+
+        connection = Redis.from_url(REDIS_URL)
+        connection.ping()
+        _rq_queue = Queue(EXPORT_QUEUE_NAME, connection=connection)
+    except Exception as e:
+        print(f"Redis不可用，导出任务使用进程内队列: {str(e)}")
+        _rq_queue = None
+
+    return _rq_queue
+
+
+def _get_local_executor() -> ThreadPoolExecutor:
+    """获取进程内回退线程池"""
+    global _local_executor
+    if _local_executor is None:
+        _local_executor = ThreadPoolExecutor(
+            max_workers=EXPORT_WORKERS,
+            thread_name_prefix="export-worker"
+        )
+    return _local_executor
+
+
+def shutdown_export_workers():
+    """关闭进程内工作池（应用退出时调用）"""
+    global _local_executor
+    if _local_executor is not None:
+        _local_executor.shutdown(wait=False, cancel_futures=True)
+        _local_executor = None
+
+
+def run_pdf_export_job(job_id: str, user_id: int, options: Dict[str, Any] = None):
+    """执行PDF导出任务（在工作进程/线程中运行）"""
+    # 延迟导入，避免在Web进程加载时引入WeasyPrint
+    from app.services.pdf_service import PdfService
+
+    # 每渲染一批文件提交一次进度，提交后不使已加载的项目文件过期（否则逐个重新查询）
+    db = SessionLocal(expire_on_commit=False)
+    start_time = datetime.now()
+    try:
+        job = db.query(ExportJob).filter(ExportJob.job_id == job_id).first()
+        if not job:
+            return
+
+        job.status = "processing"
+        job.progress = 0
+        db.commit()
+
+        def update_progress(done: int, total: int):
+            progress = done * RENDER_PROGRESS_SHARE // total
+            if progress != job.progress:
+                job.progress = progress
+                db.commit()
+
+        pdf_service = PdfService(db)
+        pdf_bytes = asyncio.run(pdf_service.export_project_to_pdf(
+            project_id=job.project_id,
+            user_id=user_id,
+            options=options,
+            progress_callback=update_progress
+        ))
+
+        duration_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+
+        if not pdf_bytes:
+            job.status = "failed"
+            job.error_message = "项目不存在或无文件可导出"
+            db.add(ExportHistory(
+                project_id=job.project_id,
+                exporter="code",
+                status="failed",
+                duration_ms=duration_ms
+            ))
+            db.commit()
+            return
+
+        export_dir = Path("../exports")
+        export_dir.mkdir(exist_ok=True)
+        pdf_path = export_dir / f"project_{job.project_id}_{job_id[:8]}.pdf"
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_bytes)
+
+        job.status = "success"
+        job.progress = 100
+        job.result_file_path = str(pdf_path)
+        db.add(ExportHistory(
+            project_id=job.project_id,
+            exporter="code",
+            status="success",
+            duration_ms=duration_ms,
+            file_path=str(pdf_path)
+        ))
+        db.commit()
+
+    except Exception as e:
+        db.rollback()
+        job = db.query(ExportJob).filter(ExportJob.job_id == job_id).first()
+        if job:
+            job.status = "failed"
+            job.error_message = str(e)
+            db.commit()
+    finally:
+        db.close()
+
+
+class ExportJobService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    @offload_db
+    def enqueue_pdf_export(
+        self,
+        project_id: int,
+        user_id: int,
+        options: Dict[str, Any] = None
+    ) -> Optional[ExportJob]:
+        """创建PDF导出任务并加入队列"""
+        project = self.db.query(Project).filter(
+            Project.id == project_id,
+            Project.owner_id == user_id
+        ).first()
+        if not project:
+            return None
+
+        job = ExportJob(
+            project_id=project_id,
+            job_id=uuid.uuid4().hex,
+            status="queued",
+            progress=0
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+
+        queue = _get_rq_queue()
+        try:
+            if queue is not None:
+                queue.enqueue(
+                    run_pdf_export_job,
+                    job.job_id, user_id, options,
+                    job_id=job.job_id,
+                    job_timeout=EXPORT_JOB_TIMEOUT
+                )
+            else:
+                _get_local_executor().submit(run_pdf_export_job, job.job_id, user_id, options)
+        except Exception as e:
+            job.status = "failed"
+            job.error_message = f"任务入队失败: {str(e)}"
+            self.db.commit()
+
+        return job
+
+    @offload_db
+    def get_job(self, job_id: str, user_id: int) -> Optional[ExportJob]:
+        """获取用户的导出任务"""
+        return self.db.query(ExportJob).join(ExportJob.project).filter(
+            ExportJob.job_id == job_id,
+            Project.owner_id == user_id
+        ).first()
+
+    def job_to_dict(self, job: ExportJob) -> Dict[str, Any]:
+        """导出任务的响应数据"""
+        return {
+            "job_id": job.job_id,
+            "project_id": job.project_id,
+            "status": job.status,
+            "progress": job.progress,
+            "error_message": job.error_message,
+            "download_url": f"/api/v1/exports/jobs/{job.job_id}/download" if job.status == "success" else None,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at
+        }
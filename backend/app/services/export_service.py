@@ -1,16 +1,18 @@
 """
 导出服务
 """
+import asyncio
 import os
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, AsyncIterator
 from sqlalchemy.orm import Session
 # from weasyprint import HTML, CSS
 # from weasyprint.text.fonts import FontConfiguration
 
-from app.models.project import Project
+from app.database import run_in_db_thread
+from app.models.project import Project, ProjectItem
 from app.models.export_history import ExportHistory
 from app.services.project_service import ProjectService
 from app.services.highlight_service import HighlightService
@@ -22,6 +24,7 @@ class ExportService:
         self.highlight_service = HighlightService(db)
         self.export_dir = Path("../exports")
         self.export_dir.mkdir(exist_ok=True)
+        self.fragment_stats = {'reused': 0, 'rendered': 0}
     
     async def export_project_to_pdf(
         self, 
@@ -37,66 +40,126 @@ class ExportService:
             if not project:
                 return None
             
-            # 获取项目文件列表
-            files = await self.project_service.get_project_files(project_id, user_id)
-            if not files:
+            # 获取参与导出的项目文件（文件记录随同一条查询加载）
+            items = await self.project_service.get_export_items(project_id, user_id)
+            if not items:
                 return None
             
-            # 生成HTML内容
-            html_content = await self._generate_html_content(project, files, user_id)
-
-            # 生成HTML文件（暂时替代PDF）
+            # 生成HTML文件（暂时替代PDF），逐段写入
             html_filename = f"project_{project_id}_{uuid.uuid4().hex[:8]}.html"
             html_path = self.export_dir / html_filename
-
-            # 保存HTML文件
-            with open(html_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            await self._write_html_file(project, items, html_path)
             
             # 记录导出历史
             duration_ms = int((datetime.now() - start_time).total_seconds() * 1000)
             
-            export_history = ExportHistory(
+            export_id = await run_in_db_thread(
+                self._record_history,
                 project_id=project_id,
-                exporter="code",
                 status="success",
                 duration_ms=duration_ms,
                 file_path=str(html_path)
             )
             
-            self.db.add(export_history)
-            self.db.commit()
-            
             return {
-                "export_id": export_history.id,
+                "export_id": export_id,
                 "file_path": str(html_path),
                 "filename": html_filename,
-                "duration_ms": duration_ms
+                "duration_ms": duration_ms,
+                "reused_fragments": self.fragment_stats['reused'],
+                "rendered_fragments": self.fragment_stats['rendered']
             }
             
         except Exception as e:
             # 记录失败历史
             duration_ms = int((datetime.now() - start_time).total_seconds() * 1000)
             
-            export_history = ExportHistory(
+            await run_in_db_thread(
+                self._record_history,
                 project_id=project_id,
-                exporter="code",
                 status="failed",
                 duration_ms=duration_ms
             )
             
-            self.db.add(export_history)
-            self.db.commit()
-            
             return None
     
-    async def _generate_html_content(
+    async def stream_project_html(
         self, 
-        project: Project, 
-        files: list, 
+        project_id: int, 
         user_id: int
-    ) -> str:
-        """生成HTML内容"""
+    ) -> Optional[AsyncIterator[str]]:
+        """流式导出项目HTML（用于 StreamingResponse），项目不存在或没有可导出文件时返回None"""
+        project = await self.project_service.get_project_by_id(project_id, user_id)
+        if not project:
+            return None
+        
+        items = await self.project_service.get_export_items(project_id, user_id)
+        if not items:
+            return None
+        
+        return self._stream_with_history(project, items)
+    
+    async def _stream_with_history(
+        self, 
+        project: Project, 
+        items: List[ProjectItem]
+    ) -> AsyncIterator[str]:
+        """逐段输出HTML，全部输出后记录导出历史（客户端中途断开时不记录）"""
+        start_time = datetime.now()
+        try:
+            async for chunk in self._iter_html_chunks(project, items):
+                yield chunk
+        except Exception:
+            duration_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+            await run_in_db_thread(
+                self._record_history,
+                project_id=project.id,
+                status="failed",
+                duration_ms=duration_ms
+            )
+            raise
+        
+        duration_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+        await run_in_db_thread(
+            self._record_history,
+            project_id=project.id,
+            status="success",
+            duration_ms=duration_ms
+        )
+    
+    def _record_history(
+        self,
+        project_id: int,
+        status: str,
+        duration_ms: int,
+        file_path: Optional[str] = None
+    ) -> int:
+        """记录导出历史（同步），返回记录ID"""
+        export_history = ExportHistory(
+            project_id=project_id,
+            exporter="code",
+            status=status,
+            duration_ms=duration_ms,
+            file_path=file_path
+        )
+        
+        self.db.add(export_history)
+        self.db.flush()
+        export_id = export_history.id
+        self.db.commit()
+        
+        return export_id
+    
+    async def _iter_html_chunks(
+        self, 
+        project: Project, 
+        items: List[ProjectItem]
+    ) -> AsyncIterator[str]:
+        """逐段生成HTML内容：文档头与目录、每个文件一段、文档尾
+        
+        文件片段按顺序交出，内存中只保留渲染窗口内的高亮结果。
+        """
+        self.fragment_stats = {'reused': 0, 'rendered': 0}
         html_parts = [
             '<!DOCTYPE html>',
             '<html lang="zh-CN">',
@@ -114,7 +177,7 @@ class ExportService:
             '<div class="meta-info">',
             f'<p>项目类型：{project.project_type}</p>',
             f'<p>生成时间：{datetime.now().strftime("%Y年%m月%d日 %H:%M:%S")}</p>',
-            f'<p>文件总数：{len(files)}</p>',
+            f'<p>文件总数：{len(items)}</p>',
             '</div>',
             '<div class="toc">',
             '<h3>目录</h3>',
@@ -122,9 +185,9 @@ class ExportService:
         ]
         
         # 生成目录
-        for i, file_info in enumerate(files, 1):
+        for i, item in enumerate(items, 1):
             html_parts.append(
-                f'<li><a href="#file-{file_info["file_id"]}">{i}. {file_info["original_filename"]}</a></li>'
+                f'<li><a href="#file-{item.file_id}">{i}. {item.file.original_filename}</a></li>'
             )
         
         html_parts.extend([
@@ -132,22 +195,20 @@ class ExportService:
             '</div>',
             '<div class="content">'
         ])
+        yield '\n'.join(html_parts) + '\n'
         
-        # 生成文件内容
-        for i, file_info in enumerate(files, 1):
-            # 获取高亮后的代码
-            highlighted = await self.highlight_service.highlight_code(
-                file_info["file_id"], 
-                user_id, 
-                file_info.get("language_override")
-            )
+        # 生成文件内容：多个文件并行高亮（内容未变化时复用缓存片段），按原顺序输出
+        i = 0
+        async for item, highlighted, reused in self.highlight_service.iter_file_fragments(items):
+            i += 1
+            self.fragment_stats['reused' if reused else 'rendered'] += 1
             
             if highlighted:
-                html_parts.extend([
-                    f'<div class="file-section" id="file-{file_info["file_id"]}">',
-                    f'<h3 class="file-title">{i}. {file_info["original_filename"]}</h3>',
+                yield '\n'.join([
+                    f'<div class="file-section" id="file-{item.file_id}">',
+                    f'<h3 class="file-title">{i}. {item.file.original_filename}</h3>',
                     '<div class="file-meta">',
-                    f'<p>文件大小：{file_info["file_size"]} 字节</p>',
+                    f'<p>文件大小：{item.file.file_size} 字节</p>',
                     f'<p>编程语言：{highlighted["language"]}</p>',
                     f'<p>代码行数：{highlighted["line_count"]} 行</p>',
                     '</div>',
@@ -155,16 +216,30 @@ class ExportService:
                     highlighted["highlighted_html"],
                     '</div>',
                     '</div>'
-                ])
+                ]) + '\n'
         
-        html_parts.extend([
+        yield '\n'.join([
             '</div>',
             '</div>',
             '</body>',
             '</html>'
         ])
-        
-        return '\n'.join(html_parts)
+    
+    async def _write_html_file(
+        self, 
+        project: Project, 
+        items: List[ProjectItem], 
+        html_path: Path
+    ):
+        """边生成边写入HTML文件（先写临时文件，完成后改名）"""
+        part_path = html_path.with_name(html_path.name + ".part")
+        try:
+            with open(part_path, 'w', encoding='utf-8') as f:
+                async for chunk in self._iter_html_chunks(project, items):
+                    await asyncio.to_thread(f.write, chunk)
+            os.replace(part_path, html_path)
+        finally:
+            part_path.unlink(missing_ok=True)
     
     def _generate_css_content(self) -> str:
         """生成CSS样式"""
@@ -1,83 +1,348 @@
 """
 文件服务
 """
+import mmap
 import os
-import uuid
-import shutil
+import asyncio
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Tuple, BinaryIO
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from fastapi import UploadFile
 
+from app.database import offload_db, run_in_db_thread
 from app.models.file import UploadedFile
+from app.models.project import ProjectItem
+from app.services.project_service import ORDER_INDEX_GAP
+from app.services.language_detector import language_detector
+from app.utils.blob_store import BlobStore, BlobTooLargeError
+from app.utils.pagination import paginate, TOTAL_EXACT
+from app.utils.line_index import (
+    LineIndex, TextInspector, line_index_cache, remove_sidecar, ENCODING_BINARY
+)
+
+# 允许的文件扩展名
+ALLOWED_EXTENSIONS = {'.py', '.java', '.js', '.ts', '.md', '.txt', '.c', '.cpp', '.h', '.hpp', '.css', '.html', '.xml', '.json', '.yml', '.yaml', '.sql', '.sh', '.bat', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'}
+
+
+def is_allowed_file(filename: Optional[str]) -> bool:
+    """是否允许上传
+    
+    扩展名在白名单中，或是知名文件名（Dockerfile.dev 等）、没有扩展名的文件（manage 等，按内容检测语言）。
+    """
+    if not filename:
+        return False
+    if language_detector.by_filename(filename) is not None:
+        return True
+    path = Path(filename)
+    suffix = path.suffix.lower()
+    # 没有扩展名的隐藏文件（.gitignore 等）不导入
+    return suffix in ALLOWED_EXTENSIONS or (not suffix and not path.name.startswith('.'))
+
+# 最大文件大小 (默认10MB)
+MAX_FILE_SIZE = int(os.getenv("MAX_UPLOAD_SIZE_MB", "10")) * 1024 * 1024
+
+# 批量上传：单次最多文件数与并发写入数
+UPLOAD_BATCH_MAX_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "500"))
+UPLOAD_BATCH_CONCURRENCY = int(os.getenv("UPLOAD_BATCH_CONCURRENCY", "8"))
+
+# 上传文件超过大小限制
+FileTooLargeError = BlobTooLargeError
 
 class FileService:
     def __init__(self, db: Session):
         self.db = db
         self.upload_dir = Path("../upload")
         self.upload_dir.mkdir(exist_ok=True)
+        self.blob_store = BlobStore(self.upload_dir / "blobs")
     
-    async def save_uploaded_file(
-        self, 
-        file: UploadFile, 
-        user_id: int, 
-        file_content: bytes
+    async def save_upload_stream(
+        self,
+        file: UploadFile,
+        user_id: int,
+        max_size: int = MAX_FILE_SIZE
     ) -> UploadedFile:
-        """保存上传的文件"""
-        # 生成唯一文件名
-        file_ext = Path(file.filename).suffix
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        storage_path = self.upload_dir / unique_filename
+        """分块流式保存上传文件
         
-        # 保存文件到磁盘
-        with open(storage_path, "wb") as buffer:
-            buffer.write(file_content)
+        边读边写入磁盘并计算SHA-256，超过 max_size 时立即中止并清理，
+        不会在内存中保留完整文件内容。
+        """
+        storage_path, file_size, file_hash, encoding = await self._stream_to_disk(file, max_size)
         
-        # 保存文件信息到数据库
         uploaded_file = UploadedFile(
             original_filename=file.filename,
             storage_path=str(storage_path),
-            file_size=len(file_content),
+            file_size=file_size,
             file_type=file.content_type or "application/octet-stream",
+            content_hash=file_hash,
+            encoding=encoding,
             uploader_id=user_id
         )
         
+        return await run_in_db_thread(self._add_record, uploaded_file)
+    
+    def _add_record(self, uploaded_file: UploadedFile) -> UploadedFile:
+        """插入单个文件记录（同步）"""
         self.db.add(uploaded_file)
         self.db.commit()
         self.db.refresh(uploaded_file)
         
         return uploaded_file
     
-    async def get_user_files(self, user_id: int) -> List[UploadedFile]:
-        """获取用户的文件列表"""
-        return self.db.query(UploadedFile).filter(
-            UploadedFile.uploader_id == user_id
-        ).order_by(UploadedFile.created_at.desc()).all()
+    async def save_uploads_batch(
+        self,
+        files: List[UploadFile],
+        user_id: int,
+        project_id: Optional[int] = None,
+        max_size: int = MAX_FILE_SIZE
+    ) -> List[Dict[str, Any]]:
+        """批量保存上传文件
+        
+        文件并发写入磁盘，所有 UploadedFile（以及指定项目时的 ProjectItem）
+        在同一个事务中插入。返回与 files 顺序一致的逐文件结果。
+        """
+        results: List[Dict[str, Any]] = [
+            {"filename": file.filename, "status": "failed"} for file in files
+        ]
+        
+        # 过滤不支持的文件类型
+        pending = []
+        for index, file in enumerate(files):
+            if not is_allowed_file(file.filename):
+                file_ext = Path(file.filename or "").suffix.lower()
+                results[index]["message"] = f"不支持的文件类型: {file_ext}"
+            else:
+                pending.append(index)
+        
+        # 并发写入磁盘
+        semaphore = asyncio.Semaphore(UPLOAD_BATCH_CONCURRENCY)
+        
+        async def write(index: int):
+            async with semaphore:
+                return await self._stream_to_disk(files[index], max_size)
+        
+        written = await asyncio.gather(
+            *(write(index) for index in pending),
+            return_exceptions=True
+        )
+        
+        records = []
+        for index, outcome in zip(pending, written):
+            if isinstance(outcome, FileTooLargeError):
+                results[index]["message"] = "文件大小超过限制"
+                continue
+            if isinstance(outcome, BaseException):
+                results[index]["message"] = f"文件保存失败: {str(outcome)}"
+                continue
+            
+            storage_path, file_size, file_hash, encoding = outcome
+            records.append((index, UploadedFile(
+                original_filename=files[index].filename,
+                storage_path=str(storage_path),
+                file_size=file_size,
+                file_type=files[index].content_type or "application/octet-stream",
+                content_hash=file_hash,
+                encoding=encoding,
+                uploader_id=user_id
+            )))
+        
+        if not records:
+            return results
+        
+        inserted = await run_in_db_thread(
+            self._insert_batch, [record for _, record in records], project_id
+        )
+        
+        for (index, _), (file_id, file_size, file_hash) in zip(records, inserted):
+            results[index].update({
+                "status": "success",
+                "file_id": file_id,
+                "file_size": file_size,
+                "content_hash": file_hash
+            })
+        
+        return results
+    
+    def _insert_batch(
+        self,
+        records: List[UploadedFile],
+        project_id: Optional[int]
+    ) -> List[Tuple[int, int, str]]:
+        """单事务插入文件记录和项目关联（同步），返回 (文件ID, 大小, 哈希) 列表
+        
+        失败时回滚并回收已写入的存储。
+        """
+        try:
+            self.db.add_all(records)
+            self.db.flush()
+            # 提交后属性会过期，提前取出返回值，避免逐条重新查询
+            inserted = [(record.id, record.file_size, record.content_hash) for record in records]
+            
+            if project_id is not None:
+                max_order = self.db.query(func.max(ProjectItem.order_index)).filter(
+                    ProjectItem.project_id == project_id
+                ).scalar() or 0
+                
+                self.db.add_all([
+                    ProjectItem(
+                        project_id=project_id,
+                        file_id=record.id,
+                        order_index=max_order + offset * ORDER_INDEX_GAP
+                    )
+                    for offset, record in enumerate(records, 1)
+                ])
+            
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            # 本批写入的对象没有其他记录引用时立即删除，不等待回收宽限期
+            for record in records:
+                self.release_storage(record.storage_path, force=True)
+            raise
+        
+        return inserted
+    
+    async def _stream_to_disk(
+        self,
+        file: UploadFile,
+        max_size: int
+    ) -> Tuple[Path, int, str, str]:
+        """将上传文件分块写入上传目录，返回 (存储路径, 大小, SHA-256, 编码)"""
+        # 已知大小时直接拒绝
+        if file.size is not None and file.size > max_size:
+            raise FileTooLargeError("文件大小超过限制")
+        
+        await file.seek(0)
+        return await asyncio.to_thread(
+            self.copy_to_storage, file.file, file.filename, max_size
+        )
+    
+    def copy_to_storage(
+        self,
+        source: BinaryIO,
+        filename: str,
+        max_size: int = MAX_FILE_SIZE
+    ) -> Tuple[Path, int, str, str]:
+        """从文件对象分块写入内容寻址存储，返回 (存储路径, 大小, SHA-256, 编码)
+        
+        相同内容只保存一份；超过 max_size 时抛出 FileTooLargeError。
+        写入的同一遍扫描中检测编码并生成行偏移索引，索引保存为 sidecar 文件。
+        """
+        inspector = TextInspector()
+        storage_path, file_size, file_hash = self.blob_store.write(source, max_size, inspector.feed)
+        line_index = inspector.finish(str(storage_path))
+        line_index_cache.store(file_hash, str(storage_path), line_index)
+        return storage_path, file_size, file_hash, line_index.encoding
+    
+    def count_references(self, storage_path: str) -> int:
+        """统计引用该存储路径的文件记录数"""
+        return self.db.query(func.count(UploadedFile.id)).filter(
+            UploadedFile.storage_path == storage_path
+        ).scalar()
+    
+    def release_storage(self, storage_path: str, force: bool = False) -> bool:
+        """在没有文件记录引用时删除存储文件
+        
+        刚写入的对象处于回收宽限期内时暂不删除（可能正被并发上传复用），
+        由 collect_garbage 稍后清理；force 用于回收本次请求写入后失败的对象。
+        """
+        if not storage_path or self.count_references(storage_path) > 0:
+            return False
+        
+        if self.blob_store.is_blob(storage_path):
+            removed = self.blob_store.remove(storage_path, force=force)
+            if removed:
+                remove_sidecar(storage_path)
+            return removed
+        
+        # 旧版按uuid命名的文件，没有共享的可能
+        try:
+            if os.path.exists(storage_path):
+                os.remove(storage_path)
+                remove_sidecar(storage_path)
+                return True
+        except OSError:
+            pass
+        return False
+    
+    def collect_garbage(self) -> Dict[str, int]:
+        """清理没有任何文件记录引用的存储对象，以及中断的上传遗留的临时文件"""
+        referenced = {
+            os.path.normpath(path)
+            for (path,) in self.db.query(UploadedFile.storage_path).distinct()
+        }
+        
+        removed = 0
+        freed = 0
+        for path in self.blob_store.iter_blobs():
+            if os.path.normpath(str(path)) in referenced:
+                continue
+            size = path.stat().st_size
+            if self.blob_store.remove(str(path)):
+                remove_sidecar(str(path))
+                removed += 1
+                freed += size
+        
+        tmp_removed, tmp_freed = self.blob_store.remove_stale_tmp()
+        
+        return {"removed": removed, "tmp_removed": tmp_removed, "freed_bytes": freed + tmp_freed}
     
-    async def get_file_by_id(self, file_id: int, user_id: int) -> Optional[UploadedFile]:
+    @offload_db
+    def get_user_files(
+        self,
+        user_id: int,
+        page: int = 1,
+        page_size: int = 20,
+        cursor: Optional[str] = None,
+        total_mode: str = TOTAL_EXACT
+    ) -> Dict[str, Any]:
+        """获取用户的文件列表（按上传时间倒序，支持游标分页）"""
+        query = self.db.query(UploadedFile).filter(UploadedFile.uploader_id == user_id)
+        
+        result = paginate(query, UploadedFile, page_size, cursor, page, total_mode)
+        result["files"] = [
+            {
+                "id": f.id,
+                "original_filename": f.original_filename,
+                "file_size": f.file_size,
+                "file_type": f.file_type,
+                "created_at": f.created_at
+            }
+            for f in result.pop("items")
+        ]
+        return result
+    
+    @offload_db
+    def get_file_by_id(self, file_id: int, user_id: int) -> Optional[UploadedFile]:
         """根据ID获取文件"""
+        return self._get_owned_file(file_id, user_id)
+    
+    def _get_owned_file(self, file_id: int, user_id: int) -> Optional[UploadedFile]:
+        """查询属于用户的文件（同步）"""
         return self.db.query(UploadedFile).filter(
             UploadedFile.id == file_id,
             UploadedFile.uploader_id == user_id
         ).first()
     
-    async def delete_file(self, file_id: int, user_id: int) -> bool:
+    @offload_db
+    def delete_file(self, file_id: int, user_id: int) -> bool:
         """删除文件"""
-        file_record = await self.get_file_by_id(file_id, user_id)
+        file_record = self._get_owned_file(file_id, user_id)
         if not file_record:
             return False
         
-        # 删除磁盘文件
-        try:
-            if os.path.exists(file_record.storage_path):
-                os.remove(file_record.storage_path)
-        except Exception:
-            pass  # 忽略文件删除错误
+        storage_path = file_record.storage_path
         
         # 删除数据库记录
         self.db.delete(file_record)
         self.db.commit()
         
+        # 没有其他记录引用时回收存储
+        try:
+            self.release_storage(storage_path)
+        except Exception:
+            pass  # 忽略文件删除错误
+        
         return True
     
     async def read_file_content(self, file_id: int, user_id: int) -> Optional[str]:
@@ -86,15 +351,80 @@ class FileService:
         if not file_record:
             return None
         
+        return await self.read_record_content(file_record)
+    
+    async def read_record_prefix(self, file_record: UploadedFile, size: int) -> Optional[str]:
+        """读取文件开头最多 size 字节并解码（用于语言检测，磁盘读取在线程中执行）"""
+        return await asyncio.to_thread(self._read_storage_prefix, file_record.storage_path, size)
+    
+    def _read_storage_prefix(self, storage_path: str, size: int) -> Optional[str]:
+        """读取存储文件前缀（同步）
+        
+        检测只依赖ASCII特征，截断处不完整的多字节字符及非UTF-8字节直接忽略。
+        """
         try:
-            with open(file_record.storage_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except UnicodeDecodeError:
-            # 尝试其他编码
-            try:
-                with open(file_record.storage_path, 'r', encoding='gbk') as f:
-                    return f.read()
-            except:
+            with open(storage_path, 'rb') as f:
+                return f.read(size).decode('utf-8', errors='ignore')
+        except OSError:
+            return None
+    
+    async def get_line_index(self, file_record: UploadedFile) -> Optional[LineIndex]:
+        """获取文件的行偏移索引（按内容哈希缓存，首次扫描在线程中执行）"""
+        try:
+            return await asyncio.to_thread(
+                line_index_cache.get, file_record.content_hash, file_record.storage_path
+            )
+        except OSError:
+            return None
+    
+    def read_record_lines(
+        self,
+        file_record: UploadedFile,
+        line_index: LineIndex,
+        start_line: int,
+        end_line: int
+    ) -> str:
+        """按行偏移索引读取第 start_line 到 end_line 行（含）并解码（同步）"""
+        start, end = line_index.byte_range(start_line, end_line)
+        encoding = file_record.encoding or line_index.encoding
+        return self._read_storage(file_record.storage_path, encoding, start, end)
+    
+    async def read_record_content(self, file_record: UploadedFile) -> Optional[str]:
+        """读取已加载文件记录的内容（不再查询数据库，磁盘读取在线程中执行）"""
+        return await asyncio.to_thread(self._read_record, file_record)
+    
+    def _record_encoding(self, file_record: UploadedFile) -> str:
+        """文件的文本编码：上传时记录的编码；旧记录取自行偏移索引（sidecar，必要时扫描生成）"""
+        if file_record.encoding:
+            return file_record.encoding
+        return line_index_cache.get(file_record.content_hash, file_record.storage_path).encoding
+    
+    def _read_record(self, file_record: UploadedFile) -> Optional[str]:
+        """按已知编码读取整个文件（同步），二进制文件或无法读取时返回None"""
+        try:
+            encoding = self._record_encoding(file_record)
+            if encoding == ENCODING_BINARY:
                 return None
-        except Exception:
+            return self._read_storage(file_record.storage_path, encoding)
+        except (OSError, LookupError):
             return None
+    
+    def _read_storage(
+        self,
+        storage_path: str,
+        encoding: str,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> str:
+        """通过内存映射读取字节范围 [start, end) 并解码（同步）
+        
+        直接从映射区解码，不先复制成 bytes；编码已在上传时校验，个别无法解码的字节替换为占位符。
+        """
+        with open(storage_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            end = size if end is None else min(end, size)
+            if start >= end:
+                return ''
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped)[start:end] as view:
+                    return str(view, encoding, 'replace')
@@ -0,0 +1,238 @@
+"""
+代码高亮进程池
+
+Pygments 词法分析是纯Python的CPU密集操作，受GIL限制，放到线程中也只能用满一个核。
+这里将单个文件的高亮放到 ProcessPoolExecutor 中执行，导出时多个文件并行渲染，
+由调用方按原顺序收集结果。工作进程只做词法分析和HTML生成，缓存读写仍在Web进程中完成。
+HIGHLIGHT_WORKERS 为 0 时不启动进程，在线程中渲染。
+
+每个进程内的词法分析器、格式化器实例和样式CSS由 highlighter_registry 复用，
+进程启动时预加载常用语言。
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, Tuple, List
+
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexer import Lexer
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+# 高亮进程池配置
+HIGHLIGHT_WORKERS = int(os.getenv("HIGHLIGHT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 导出时同时渲染的文件数上限（按顺序输出前最多缓存这么多片段）
+HIGHLIGHT_EXPORT_WINDOW = int(os.getenv("HIGHLIGHT_EXPORT_WINDOW", str(max(1, HIGHLIGHT_WORKERS) * 2)))
+
+# 进程启动时预加载的常用语言
+HIGHLIGHT_WARM_LANGUAGES = [
+    language.strip()
+    for language in os.getenv("HIGHLIGHT_WARM_LANGUAGES", "python,java,javascript,typescript,c,cpp").split(",")
+    if language.strip()
+]
+
+
+class HighlighterRegistry:
+    """进程级词法分析器与格式化器注册表
+    
+    get_lexer_by_name 每次都要按别名查找（首次还要导入词法分析器模块），HtmlFormatter
+    构造时要为样式中的全部 token 生成CSS类映射。两者渲染时不修改自身状态，可以在线程间共享：
+    词法分析器按语言缓存，格式化器按格式化选项缓存，样式CSS及其ETag按 (样式, CSS类名) 缓存。
+    不支持的语言不缓存，避免任意的语言覆盖值使注册表无限增长。
+    """
+    
+    def __init__(self):
+        self._lexers: Dict[str, Lexer] = {}
+        self._formatters: Dict[Tuple, HtmlFormatter] = {}
+        self._css: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+    
+    def get_lexer(self, language: str) -> Lexer:
+        """获取语言对应的词法分析器，语言不支持时抛出 ClassNotFound"""
+        lexer = self._lexers.get(language)
+        if lexer is None:
+            lexer = get_lexer_by_name(language)
+            with self._lock:
+                lexer = self._lexers.setdefault(language, lexer)
+        return lexer
+    
+    def get_formatter(self, formatter_options: Dict[str, Any]) -> HtmlFormatter:
+        """获取格式化选项对应的HTML格式化器"""
+        key = tuple(sorted(formatter_options.items()))
+        formatter = self._formatters.get(key)
+        if formatter is None:
+            formatter = HtmlFormatter(**formatter_options)
+            with self._lock:
+                formatter = self._formatters.setdefault(key, formatter)
+        return formatter
+    
+    def get_style_css(self, style: str, cssclass: str) -> Tuple[str, str]:
+        """获取样式CSS及其强ETag（内容的SHA-256）"""
+        key = (style, cssclass)
+        entry = self._css.get(key)
+        if entry is None:
+            css = HtmlFormatter(style=style).get_style_defs('.' + cssclass)
+            etag = '"' + hashlib.sha256(css.encode('utf-8')).hexdigest()[:32] + '"'
+            with self._lock:
+                entry = self._css.setdefault(key, (css, etag))
+        return entry
+    
+    def warm(self, languages: List[str], formatter_options: Optional[Dict[str, Any]] = None):
+        """预加载常用语言的词法分析器（以及格式化器）"""
+        for language in languages:
+            try:
+                self.get_lexer(language)
+            except ClassNotFound:
+                pass
+        if formatter_options:
+            self.get_formatter(formatter_options)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取注册表统计"""
+        with self._lock:
+            return {
+                "lexers": sorted(self._lexers),
+                "formatters": len(self._formatters),
+                "styles": len(self._css)
+            }
+
+
+# 进程级共享实例（工作进程内各有一份）
+highlighter_registry = HighlighterRegistry()
+
+
+def render_highlight(content: str, language: str, formatter_options: Dict[str, Any]) -> Tuple[str, str]:
+    """高亮代码，返回实际使用的语言和HTML（语言不支持时回退为text）"""
+    try:
+        if language == 'text':
+            # 纯文本，不进行高亮
+            return 'text', f'<pre><code>{content}</code></pre>'
+        lexer = highlighter_registry.get_lexer(language)
+        formatter = highlighter_registry.get_formatter(formatter_options)
+        return language, highlight(content, lexer, formatter)
+    except ClassNotFound:
+        # 语言不支持，使用纯文本
+        return 'text', f'<pre><code>{content}</code></pre>'
+
+
+# ---- 工作进程内 ----
+
+def _init_worker(warm_languages: List[str], formatter_options: Dict[str, Any]):
+    """工作进程初始化：预加载常用语言的词法分析器和格式化器"""
+    highlighter_registry.warm(warm_languages, formatter_options)
+
+
+def _ping_worker() -> int:
+    """预热任务：确保工作进程已启动"""
+    return os.getpid()
+
+
+# ---- Web进程内的调度 ----
+
+class HighlightPool:
+    """代码高亮进程池"""
+
+    def __init__(self, workers: int = HIGHLIGHT_WORKERS):
+        self.workers = workers
+        self.warm_languages: List[str] = list(HIGHLIGHT_WARM_LANGUAGES)
+        self.formatter_options: Dict[str, Any] = {}
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        self.pending = 0
+        self.completed = 0
+        self.fallbacks = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 使用spawn，避免在多线程的Web进程中fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(list(self.warm_languages), dict(self.formatter_options))
+                )
+            return self._executor
+
+    def start(self, formatter_options: Optional[Dict[str, Any]] = None):
+        """启动工作进程并预热（不使用进程池时预热本进程的注册表）"""
+        if formatter_options:
+            self.formatter_options = dict(formatter_options)
+            # 样式CSS由Web进程提供
+            highlighter_registry.get_style_css(
+                formatter_options.get('style', 'default'),
+                formatter_options.get('cssclass', 'highlight')
+            )
+        if self.workers <= 0:
+            highlighter_registry.warm(self.warm_languages, self.formatter_options)
+            return
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_ping_worker)
+
+    def shutdown(self):
+        """关闭进程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        """丢弃已损坏的进程池（其他任务已重建的新进程池及其排队任务不受影响）"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    async def render(
+        self,
+        content: str,
+        language: str,
+        formatter_options: Dict[str, Any]
+    ) -> Tuple[str, str]:
+        """渲染高亮HTML，返回实际使用的语言和HTML"""
+        if self.workers <= 0 or language == 'text':
+            return await asyncio.to_thread(render_highlight, content, language, formatter_options)
+
+        with self._lock:
+            self.pending += 1
+        executor = self._get_executor()
+        try:
+            future = executor.submit(render_highlight, content, language, formatter_options)
+            result = await asyncio.wrap_future(future)
+            with self._lock:
+                self.completed += 1
+            return result
+        except BrokenProcessPool:
+            # 工作进程异常退出，丢弃进程池（下次调用时重建），本次在线程中渲染
+            self._discard(executor)
+            with self._lock:
+                self.fallbacks += 1
+            return await asyncio.to_thread(render_highlight, content, language, formatter_options)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取高亮进程池统计"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "export_window": HIGHLIGHT_EXPORT_WINDOW,
+                "started": self._executor is not None,
+                "queue_depth": self.pending,
+                "completed": self.completed,
+                "fallbacks": self.fallbacks,
+                "registry": highlighter_registry.get_stats()
+            }
+
+
+# 进程级共享实例
+highlight_pool = HighlightPool()
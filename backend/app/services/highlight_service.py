@@ -1,79 +1,245 @@
 """
 代码高亮服务
 """
-from typing import Optional, Dict, Any
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Tuple, List, AsyncIterator, Deque
 from sqlalchemy.orm import Session
-from pygments import highlight
-from pygments.lexers import get_lexer_by_name, guess_lexer_for_filename
-from pygments.formatters import HtmlFormatter
-from pygments.util import ClassNotFound
 
+from app.database import offload_db, run_in_db_thread
 from app.models.highlight_mapping import HighlightMapping
+from app.models.file import UploadedFile
+from app.models.project import ProjectItem
 from app.services.file_service import FileService
+from app.services.highlight_renderer import highlight_pool, highlighter_registry, HIGHLIGHT_EXPORT_WINDOW
+from app.services.language_detector import language_detector
+from app.services.window_highlighter import (
+    window_highlighter, PreviewRangeError, PREVIEW_DEFAULT_LINES, PREVIEW_MAX_LINES
+)
+from app.utils.highlight_cache import highlight_cache, fragment_cache, content_hash, make_cache_key
+
+# 代码高亮格式化选项（同时参与缓存键计算）
+HIGHLIGHT_FORMATTER_OPTIONS = {
+    'style': 'default',
+    'linenos': True,
+    'linenostart': 1,
+    'cssclass': 'highlight'
+}
+
+# 默认的文件扩展名到语言的映射
+DEFAULT_HIGHLIGHT_MAPPINGS = [
+    ('.py', 'python'),
+    ('.java', 'java'),
+    ('.js', 'javascript'),
+    ('.ts', 'typescript'),
+    ('.c', 'c'),
+    ('.cpp', 'cpp'),
+    ('.h', 'c'),
+    ('.hpp', 'cpp'),
+    ('.css', 'css'),
+    ('.html', 'html'),
+    ('.xml', 'xml'),
+    ('.json', 'json'),
+    ('.yml', 'yaml'),
+    ('.yaml', 'yaml'),
+    ('.sql', 'sql'),
+    ('.sh', 'bash'),
+    ('.bat', 'batch'),
+    ('.md', 'markdown'),
+    ('.txt', 'text'),
+]
+
+# 语言索引最长有效期（秒），用于多进程部署下其他进程的修改最终生效
+LANGUAGE_INDEX_TTL = int(os.getenv("LANGUAGE_INDEX_TTL", "300"))
+
+
+class LanguageIndex:
+    """进程级后缀-语言索引
+    
+    首次使用时从 highlight_mappings 表一次性加载启用的映射，之后查询不再访问数据库；
+    管理员修改映射后调用 invalidate() 使其在下次查询时重新加载。
+    get() 可能查询数据库，只在数据库线程中调用；协程中使用 refresh()。
+    """
+    
+    def __init__(self, ttl: int = LANGUAGE_INDEX_TTL):
+        self.ttl = ttl
+        self._index: Optional[Dict[str, str]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+    
+    def get(self, db: Session) -> Dict[str, str]:
+        """获取索引，必要时从数据库加载"""
+        index = self._index
+        if index is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return index
+        
+        with self._lock:
+            if self._index is None or time.monotonic() - self._loaded_at >= self.ttl:
+                rows = db.query(HighlightMapping.suffix, HighlightMapping.language).filter(
+                    HighlightMapping.enabled == True
+                ).order_by(HighlightMapping.id).all()
+                
+                index = {}
+                for suffix, language in rows:
+                    # 与原逐条查询保持一致：同一后缀以最早的记录为准
+                    index.setdefault(suffix.lower(), language)
+                
+                self._index = index
+                self._loaded_at = time.monotonic()
+            return self._index
+    
+    async def refresh(self, db: Session) -> Dict[str, str]:
+        """获取索引（协程中使用），需要加载时在数据库线程池中查询"""
+        index = self._index
+        if index is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return index
+        return await run_in_db_thread(self.get, db)
+    
+    def invalidate(self):
+        """使索引失效"""
+        with self._lock:
+            self._index = None
+
+
+# 进程级共享实例
+language_index = LanguageIndex()
+
+
+def seed_default_mappings(db: Session):
+    """写入缺失的默认映射（应用启动时调用一次）"""
+    existing = {
+        suffix for (suffix,) in db.query(HighlightMapping.suffix).all()
+    }
+    
+    for suffix, language in DEFAULT_HIGHLIGHT_MAPPINGS:
+        if suffix not in existing:
+            db.add(HighlightMapping(
+                suffix=suffix,
+                language=language,
+                enabled=True
+            ))
+    
+    db.commit()
+    language_index.invalidate()
+
 
 class HighlightService:
     def __init__(self, db: Session):
         self.db = db
         self.file_service = FileService(db)
-        self._init_default_mappings()
-    
-    def _init_default_mappings(self):
-        """初始化默认的文件扩展名到语言的映射"""
-        default_mappings = [
-            ('.py', 'python'),
-            ('.java', 'java'),
-            ('.js', 'javascript'),
-            ('.ts', 'typescript'),
-            ('.c', 'c'),
-            ('.cpp', 'cpp'),
-            ('.h', 'c'),
-            ('.hpp', 'cpp'),
-            ('.css', 'css'),
-            ('.html', 'html'),
-            ('.xml', 'xml'),
-            ('.json', 'json'),
-            ('.yml', 'yaml'),
-            ('.yaml', 'yaml'),
-            ('.sql', 'sql'),
-            ('.sh', 'bash'),
-            ('.bat', 'batch'),
-            ('.md', 'markdown'),
-            ('.txt', 'text'),
-        ]
-        
-        for suffix, language in default_mappings:
-            existing = self.db.query(HighlightMapping).filter(
-                HighlightMapping.suffix == suffix
-            ).first()
-            
-            if not existing:
-                mapping = HighlightMapping(
-                    suffix=suffix,
-                    language=language,
-                    enabled=True
-                )
-                self.db.add(mapping)
-        
-        self.db.commit()
     
     def get_language_for_file(self, filename: str, language_override: Optional[str] = None) -> str:
-        """获取文件对应的语言标识"""
+        """获取文件对应的语言标识（按文件名，不读取内容；同步，在数据库线程中调用）"""
         if language_override:
             return language_override
         
+        # 默认返回text
+        return self._language_from_name(filename, language_index.get(self.db)) or 'text'
+    
+    def _language_from_name(self, filename: str, index: Dict[str, str]) -> Optional[str]:
+        """按知名文件名或扩展名映射确定语言，无法确定时返回None"""
+        language = language_detector.by_filename(filename)
+        if language:
+            return language
+        
         # 从文件扩展名获取语言
         file_ext = '.' + filename.split('.')[-1].lower() if '.' in filename else ''
+        return index.get(file_ext)
+    
+    async def resolve_language(
+        self,
+        file_record: UploadedFile,
+        language_override: Optional[str] = None,
+        content: Optional[str] = None
+    ) -> str:
+        """确定文件的高亮语言
+        
+        文件名能确定语言时直接返回；没有映射或后缀有歧义（如 .h）时按内容前缀检测，
+        结果按内容哈希缓存。content 为已读取的内容，缺省时只读取检测所需的前缀。
+        """
+        if language_override:
+            return language_override
+        
+        filename = file_record.original_filename
+        language = self._language_from_name(filename, await language_index.refresh(self.db))
+        if language is not None and not language_detector.is_ambiguous(filename):
+            return language
+        
+        fallback = language or 'text'
+        memo_key = None
+        if file_record.content_hash:
+            memo_key = language_detector.memo_key(file_record.content_hash, filename, fallback)
+            detected = language_detector.lookup(memo_key)
+            if detected:
+                return detected
+        
+        if content is None:
+            content = await self.file_service.read_record_prefix(
+                file_record, language_detector.sample_bytes
+            )
+            if content is None:
+                return fallback
+        
+        return language_detector.detect(filename, content, fallback, memo_key)
+    
+    @offload_db
+    def get_mappings(self) -> List[Dict[str, Any]]:
+        """获取全部后缀-语言映射"""
+        mappings = self.db.query(HighlightMapping).order_by(HighlightMapping.suffix).all()
+        
+        return [
+            {
+                "id": m.id,
+                "suffix": m.suffix,
+                "language": m.language,
+                "enabled": m.enabled,
+                "updated_at": m.updated_at
+            }
+            for m in mappings
+        ]
+    
+    @offload_db
+    def save_mapping(self, suffix: str, language: str, enabled: bool = True) -> HighlightMapping:
+        """新增或更新后缀-语言映射"""
+        suffix = suffix.strip().lower()
+        if not suffix.startswith('.'):
+            suffix = '.' + suffix
         
         mapping = self.db.query(HighlightMapping).filter(
-            HighlightMapping.suffix == file_ext,
-            HighlightMapping.enabled == True
+            HighlightMapping.suffix == suffix
         ).first()
         
         if mapping:
-            return mapping.language
+            mapping.language = language
+            mapping.enabled = enabled
+        else:
+            mapping = HighlightMapping(suffix=suffix, language=language, enabled=enabled)
+            self.db.add(mapping)
         
-        # 默认返回text
-        return 'text'
+        self.db.commit()
+        self.db.refresh(mapping)
+        language_index.invalidate()
+        
+        return mapping
+    
+    @offload_db
+    def delete_mapping(self, mapping_id: int) -> bool:
+        """删除后缀-语言映射"""
+        mapping = self.db.query(HighlightMapping).filter(
+            HighlightMapping.id == mapping_id
+        ).first()
+        if not mapping:
+            return False
+        
+        self.db.delete(mapping)
+        self.db.commit()
+        language_index.invalidate()
+        
+        return True
     
     async def highlight_code(
         self, 
@@ -87,34 +253,30 @@ class HighlightService:
         if not file_record:
             return None
         
+        return await self.highlight_file(file_record, language_override)
+    
+    async def highlight_file(
+        self,
+        file_record: UploadedFile,
+        language_override: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """高亮已加载的文件记录（调用方负责权限校验）"""
         # 读取文件内容
-        content = await self.file_service.read_file_content(file_id, user_id)
+        content = await self.file_service.read_record_content(file_record)
         if content is None:
             return None
         
-        # 获取语言标识
-        language = self.get_language_for_file(
-            file_record.original_filename, 
-            language_override
-        )
+        # 获取语言标识（必要时按内容检测）
+        language = await self.resolve_language(file_record, language_override, content)
         
         try:
-            # 使用Pygments进行高亮
-            if language == 'text':
-                # 纯文本，不进行高亮
-                highlighted_html = f'<pre><code>{content}</code></pre>'
-            else:
-                lexer = get_lexer_by_name(language)
-                formatter = HtmlFormatter(
-                    style='default',
-                    linenos=True,
-                    linenostart=1,
-                    cssclass='highlight'
-                )
-                highlighted_html = highlight(content, lexer, formatter)
+            # 词法分析与HTML生成是CPU密集操作，在高亮进程池中执行
+            language, highlighted_html = await self._render_highlighted_html(
+                content, language, file_record.content_hash
+            )
             
             return {
-                'file_id': file_id,
+                'file_id': file_record.id,
                 'filename': file_record.original_filename,
                 'language': language,
                 'content': content,
@@ -122,21 +284,199 @@ class HighlightService:
                 'line_count': len(content.splitlines())
             }
             
-        except ClassNotFound:
-            # 语言不支持，使用纯文本
-            highlighted_html = f'<pre><code>{content}</code></pre>'
-            return {
-                'file_id': file_id,
-                'filename': file_record.original_filename,
-                'language': 'text',
-                'content': content,
-                'highlighted_html': highlighted_html,
-                'line_count': len(content.splitlines())
-            }
         except Exception:
             return None
     
+    async def highlight_window(
+        self,
+        file_id: int,
+        user_id: int,
+        start_line: int = 1,
+        end_line: Optional[int] = None,
+        language_override: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """高亮文件的一个行区间（分页预览）
+        
+        只读取并高亮 start_line 到 end_line 行（含），单次最多 PREVIEW_MAX_LINES 行，
+        end_line 缺省时取 PREVIEW_DEFAULT_LINES 行。total_lines 为文件总行数。
+        起始行超出文件范围时抛出 PreviewRangeError。
+        """
+        file_record = await self.file_service.get_file_by_id(file_id, user_id)
+        if not file_record:
+            return None
+        
+        line_index = await self.file_service.get_line_index(file_record)
+        if line_index is None or line_index.is_binary:
+            return None
+        
+        total_lines = line_index.line_count
+        if start_line < 1 or start_line > max(total_lines, 1):
+            raise PreviewRangeError(f"起始行超出文件范围（共 {total_lines} 行）")
+        if end_line is None:
+            end_line = start_line + PREVIEW_DEFAULT_LINES - 1
+        if end_line < start_line:
+            raise PreviewRangeError("结束行不能小于起始行")
+        end_line = min(end_line, start_line + PREVIEW_MAX_LINES - 1, total_lines)
+        
+        language = await self.resolve_language(file_record, language_override)
+        result = {
+            'file_id': file_record.id,
+            'filename': file_record.original_filename,
+            'language': language,
+            'start_line': start_line,
+            'end_line': end_line,
+            'total_lines': total_lines,
+            'has_more': end_line < total_lines,
+            'content': '',
+            'highlighted_html': '',
+            'exact': True
+        }
+        if total_lines == 0:
+            return result
+        
+        def read_lines(first: int, last: int) -> str:
+            return self.file_service.read_record_lines(file_record, line_index, first, last)
+        
+        try:
+            window = await asyncio.to_thread(
+                window_highlighter.render,
+                f"{file_record.content_hash or file_record.storage_path}:{language}",
+                language,
+                line_index,
+                read_lines,
+                start_line,
+                end_line,
+                HIGHLIGHT_FORMATTER_OPTIONS
+            )
+        except OSError:
+            return None
+        
+        result.update(window)
+        return result
+    
+    async def render_file_fragment(
+        self,
+        file_record: UploadedFile,
+        language_override: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """渲染导出用的单文件片段，返回 (片段, 是否复用缓存)
+        
+        片段包含 language、line_count、highlighted_html。高亮HTML直接复用高亮结果缓存的条目，
+        片段缓存只按上传时记录的内容哈希和解析后的语言记录实际语言与行数；两者都命中时无需读取和解码源文件
+        （需要按内容检测语言时，检测结果同样按内容哈希缓存）。
+        file_record 由调用方随项目文件一次性加载，这里不再逐个查询数据库。
+        """
+        language = await self.resolve_language(file_record, language_override)
+        
+        fragment_key = None
+        if file_record.content_hash:
+            fragment_key = make_cache_key(
+                file_record.content_hash,
+                language,
+                {'fragment': 'meta'}
+            )
+            highlight_key = make_cache_key(file_record.content_hash, language, HIGHLIGHT_FORMATTER_OPTIONS)
+            cached = await asyncio.to_thread(self._lookup_fragment, fragment_key, highlight_key)
+            if cached is not None:
+                return cached, True
+        
+        result = await self.highlight_file(file_record, language_override)
+        if not result:
+            return None, False
+        
+        fragment = {
+            'language': result['language'],
+            'line_count': result['line_count'],
+            'highlighted_html': result['highlighted_html']
+        }
+        if fragment_key:
+            await asyncio.to_thread(fragment_cache.set, fragment_key, json.dumps({
+                'language': fragment['language'],
+                'line_count': fragment['line_count']
+            }))
+        
+        return fragment, False
+    
+    @staticmethod
+    def _lookup_fragment(fragment_key: str, highlight_key: str) -> Optional[Dict[str, Any]]:
+        """从片段元数据与高亮结果缓存组装片段，任一未命中返回None"""
+        meta = fragment_cache.get(fragment_key)
+        if meta is None:
+            return None
+        cached = highlight_cache.get(highlight_key)
+        if cached is None:
+            return None
+        # 高亮缓存条目首行为实际语言
+        _, _, highlighted_html = cached.partition('\n')
+        return {**json.loads(meta), 'highlighted_html': highlighted_html}
+    
+    async def iter_file_fragments(
+        self,
+        project_items: List[ProjectItem],
+        window: int = HIGHLIGHT_EXPORT_WINDOW
+    ) -> AsyncIterator[Tuple[ProjectItem, Optional[Dict[str, Any]], bool]]:
+        """按原顺序产出项目文件的导出片段 (项目文件, 片段, 是否复用缓存)
+        
+        最多 window 个文件同时渲染（词法分析分发到高亮进程池并行执行），
+        结果按顺序交出，内存中最多保留 window 个尚未交出的片段。
+        """
+        pending: Deque[Tuple[ProjectItem, asyncio.Future]] = deque()
+        try:
+            for item in project_items:
+                pending.append((item, asyncio.ensure_future(
+                    self.render_file_fragment(item.file, item.language_override)
+                )))
+                if len(pending) >= window:
+                    head, task = pending.popleft()
+                    fragment, reused = await task
+                    yield head, fragment, reused
+            
+            while pending:
+                head, task = pending.popleft()
+                fragment, reused = await task
+                yield head, fragment, reused
+        finally:
+            # 调用方提前结束（如客户端断开）时取消尚未完成的渲染
+            for _, task in pending:
+                task.cancel()
+    
+    async def _render_highlighted_html(
+        self,
+        content: str,
+        language: str,
+        file_hash: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """生成高亮HTML（优先读取缓存），返回实际使用的语言和HTML
+        
+        file_hash 为上传时记录的内容哈希，缺省时按内容计算。
+        缓存读写在线程中执行，词法分析在高亮进程池中执行。
+        """
+        cache_key = make_cache_key(
+            file_hash or content_hash(content.encode('utf-8')),
+            language,
+            HIGHLIGHT_FORMATTER_OPTIONS
+        )
+        cached = await asyncio.to_thread(highlight_cache.get, cache_key)
+        if cached is not None:
+            # 缓存条目首行记录实际语言（语言不支持时回退为text）
+            cached_language, _, highlighted_html = cached.partition('\n')
+            return cached_language, highlighted_html
+        
+        language, highlighted_html = await highlight_pool.render(
+            content, language, HIGHLIGHT_FORMATTER_OPTIONS
+        )
+        
+        await asyncio.to_thread(highlight_cache.set, cache_key, f'{language}\n{highlighted_html}')
+        return language, highlighted_html
+    
     def get_highlight_css(self) -> str:
-        """获取高亮样式CSS"""
-        formatter = HtmlFormatter(style='default')
-        return formatter.get_style_defs('.highlight')
+        """获取高亮样式CSS（每种样式只生成一次）"""
+        css, _ = self.get_highlight_css_entry()
+        return css
+    
+    def get_highlight_css_entry(self) -> Tuple[str, str]:
+        """获取高亮样式CSS及其ETag"""
+        return highlighter_registry.get_style_css(
+            HIGHLIGHT_FORMATTER_OPTIONS['style'],
+            HIGHLIGHT_FORMATTER_OPTIONS['cssclass']
+        )
@@ -0,0 +1,307 @@
+"""
+语言检测
+
+后缀映射无法确定语言（没有后缀、后缀未映射）或后缀有歧义（如 .h 可能是C或C++）时，
+按以下顺序检测，每一步的开销都与文件大小无关：
+1. 知名文件名（Makefile、Dockerfile 等），只看文件名；
+2. 首行 shebang（#!/usr/bin/env python3）；
+3. 开头几行的 vim/emacs modeline（vim: ft=python、-*- mode: ruby -*-）；
+4. 有歧义的后缀先按特征关键字区分候选语言；
+5. 只对内容前缀样本、在有限的候选词法分析器中调用 analyse_text 打分。
+
+pygments 的 guess_lexer 会导入并遍历全部词法分析器、分析完整内容，这里不使用。
+检测结果按 (内容哈希, 文件名特征) 缓存，同一内容再次预览或导出时无需读取文件。
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import PurePosixPath
+from typing import Optional, Dict, Any, List, Tuple, Type
+
+from pygments.lexer import Lexer
+from pygments.lexers import find_lexer_class_by_name
+from pygments.util import ClassNotFound
+
+# 检测时读取的内容前缀大小
+LANGUAGE_DETECT_SAMPLE_BYTES = int(os.getenv("LANGUAGE_DETECT_SAMPLE_BYTES", "8192"))
+# 检测结果缓存条数
+LANGUAGE_DETECT_MEMO_ITEMS = int(os.getenv("LANGUAGE_DETECT_MEMO_ITEMS", "4096"))
+# 前缀分析的最低得分（低于该值视为无法判断）
+LANGUAGE_DETECT_MIN_SCORE = float(os.getenv("LANGUAGE_DETECT_MIN_SCORE", "0.3"))
+
+# 检查 modeline 的开头行数
+MODELINE_LINES = 5
+
+# 知名文件名 -> 语言（按小写文件名匹配）
+KNOWN_FILENAMES = {
+    'makefile': 'makefile',
+    'gnumakefile': 'makefile',
+    'dockerfile': 'docker',
+    'containerfile': 'docker',
+    'cmakelists.txt': 'cmake',
+    'jenkinsfile': 'groovy',
+    'gemfile': 'ruby',
+    'rakefile': 'ruby',
+    'vagrantfile': 'ruby',
+    'podfile': 'ruby',
+    'sconstruct': 'python',
+    'sconscript': 'python',
+    '.bashrc': 'bash',
+    '.bash_profile': 'bash',
+    '.profile': 'bash',
+    '.zshrc': 'bash',
+    'pkgbuild': 'bash',
+    'nginx.conf': 'nginx',
+    '.editorconfig': 'ini',
+    '.gitconfig': 'ini',
+}
+
+# 知名文件名前缀（Dockerfile.dev、Makefile.am 等）
+KNOWN_FILENAME_PREFIXES = {
+    'dockerfile.': 'docker',
+    'makefile.': 'makefile',
+}
+
+# shebang 解释器 -> 语言（去掉版本号后匹配，未列出的按 pygments 别名查找）
+INTERPRETERS = {
+    'python': 'python',
+    'pypy': 'python',
+    'sh': 'bash',
+    'bash': 'bash',
+    'dash': 'bash',
+    'ksh': 'bash',
+    'zsh': 'bash',
+    'node': 'javascript',
+    'nodejs': 'javascript',
+    'deno': 'typescript',
+    'ts-node': 'typescript',
+    'perl': 'perl',
+    'ruby': 'ruby',
+    'php': 'php',
+    'lua': 'lua',
+    'rscript': 'r',
+    'tclsh': 'tcl',
+    'wish': 'tcl',
+    'awk': 'awk',
+    'gawk': 'awk',
+    'make': 'makefile',
+}
+
+# modeline 中的文件类型 -> 语言（未列出的按 pygments 别名查找）
+FILETYPE_ALIASES = {
+    'sh': 'bash',
+    'shell-script': 'bash',
+    'make': 'makefile',
+    'js': 'javascript',
+    'ts': 'typescript',
+    'py': 'python',
+    'rb': 'ruby',
+    'yml': 'yaml',
+    'c++': 'cpp',
+    'dockerfile': 'docker',
+}
+
+# 有歧义的后缀 -> [(候选语言, 特征正则)]，特征正则为 None 的候选只参与 analyse_text 打分
+AMBIGUOUS_SUFFIXES: Dict[str, List[Tuple[str, Optional[str]]]] = {
+    '.h': [
+        ('objective-c', r'^\s*@(interface|implementation|protocol|end)\b|#import\s'),
+        ('cpp', r'^\s*(class|namespace|template\s*<|using\s+namespace)\b|\bstd::|^\s*(public|private|protected)\s*:'),
+        ('c', None),
+    ],
+    '.m': [
+        ('objective-c', r'^\s*@(interface|implementation|protocol|end)\b|#import\s'),
+        ('matlab', r'^\s*function\s.*=|^\s*%'),
+    ],
+    '.pl': [
+        ('perl', r'^\s*(use|my|sub|package)\s'),
+        ('prolog', r':-'),
+    ],
+}
+
+# 没有后缀映射时参与前缀分析的候选语言
+ANALYSIS_CANDIDATES = [
+    'python', 'bash', 'perl', 'ruby', 'php', 'c', 'cpp', 'objective-c',
+    'html', 'xml', 'makefile', 'docker', 'ini', 'sql',
+]
+
+_SHEBANG = re.compile(r'^#!\s*(\S+)(.*)$')
+_VIM_MODELINE = re.compile(r'(?:^|\s)(?:vi|vim|ex):.*?\b(?:ft|filetype|syntax)=([\w+\-]+)')
+_EMACS_MODELINE = re.compile(r'-\*-\s*(?:.*?\bmode:\s*([\w+\-]+)|([\w+\-]+))\s*(?:;.*?)?-\*-', re.IGNORECASE)
+
+
+def _lexer_class(language: str) -> Optional[Type[Lexer]]:
+    """按别名查找词法分析器类（不实例化）"""
+    try:
+        return find_lexer_class_by_name(language)
+    except ClassNotFound:
+        return None
+
+
+def _normalize_language(name: str, aliases: Dict[str, str]) -> Optional[str]:
+    """把解释器名或文件类型名转换为支持的语言标识"""
+    name = name.lower()
+    language = aliases.get(name)
+    if language is None:
+        # 去掉版本号（python3.11、perl5）后再查
+        language = aliases.get(re.sub(r'[\d.]+$', '', name))
+    if language is None and _lexer_class(name) is not None:
+        language = name
+    return language
+
+
+class LanguageDetector:
+    """有界开销的语言检测器（带检测结果缓存）"""
+
+    def __init__(
+        self,
+        sample_bytes: int = LANGUAGE_DETECT_SAMPLE_BYTES,
+        memo_items: int = LANGUAGE_DETECT_MEMO_ITEMS,
+        min_score: float = LANGUAGE_DETECT_MIN_SCORE
+    ):
+        self.sample_bytes = sample_bytes
+        self.memo_items = memo_items
+        self.min_score = min_score
+
+        self._memo: "OrderedDict[str, str]" = OrderedDict()
+        self._patterns = {
+            suffix: [(language, re.compile(pattern, re.MULTILINE) if pattern else None)
+                     for language, pattern in candidates]
+            for suffix, candidates in AMBIGUOUS_SUFFIXES.items()
+        }
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.detections: Dict[str, int] = {}
+
+    def by_filename(self, filename: str) -> Optional[str]:
+        """按知名文件名确定语言"""
+        name = PurePosixPath(filename.replace('\\', '/')).name.lower()
+        language = KNOWN_FILENAMES.get(name)
+        if language is None:
+            for prefix, candidate in KNOWN_FILENAME_PREFIXES.items():
+                if name.startswith(prefix):
+                    return candidate
+        return language
+
+    def is_ambiguous(self, filename: str) -> bool:
+        """后缀是否有歧义（需要按内容区分）"""
+        return PurePosixPath(filename).suffix.lower() in AMBIGUOUS_SUFFIXES
+
+    def memo_key(self, file_hash: str, filename: str, fallback: str) -> str:
+        """检测结果缓存键：内容哈希 + 后缀 + 后缀映射的语言（决定候选集和回退值）"""
+        return f"{file_hash}:{PurePosixPath(filename).suffix.lower()}:{fallback}"
+
+    def lookup(self, memo_key: Optional[str]) -> Optional[str]:
+        """读取缓存的检测结果"""
+        if memo_key is None:
+            return None
+        with self._lock:
+            language = self._memo.get(memo_key)
+            if language is None:
+                self.misses += 1
+                return None
+            self._memo.move_to_end(memo_key)
+            self.hits += 1
+            return language
+
+    def _remember(self, memo_key: str, language: str):
+        with self._lock:
+            self._memo[memo_key] = language
+            self._memo.move_to_end(memo_key)
+            while len(self._memo) > self.memo_items:
+                self._memo.popitem(last=False)
+
+    def detect(
+        self,
+        filename: str,
+        content: str,
+        fallback: str = 'text',
+        memo_key: Optional[str] = None
+    ) -> str:
+        """按内容前缀检测语言，无法判断时返回 fallback
+
+        content 可以是完整内容或已截取的前缀，这里只使用前 sample_bytes 个字符。
+        """
+        sample = content[:self.sample_bytes]
+        language, method = self._detect_sample(filename, sample)
+        if language is None:
+            language, method = fallback, 'fallback'
+
+        with self._lock:
+            self.detections[method] = self.detections.get(method, 0) + 1
+        if memo_key is not None:
+            self._remember(memo_key, language)
+        return language
+
+    def _detect_sample(self, filename: str, sample: str) -> Tuple[Optional[str], str]:
+        """依次按 shebang、modeline、歧义后缀特征和前缀分析检测，返回 (语言, 检测方式)"""
+        head = sample.splitlines()[:MODELINE_LINES]
+        if head:
+            match = _SHEBANG.match(head[0])
+            if match:
+                language = self._from_shebang(match.group(1), match.group(2))
+                if language:
+                    return language, 'shebang'
+
+        for line in head:
+            language = self._from_modeline(line)
+            if language:
+                return language, 'modeline'
+
+        suffix = PurePosixPath(filename).suffix.lower()
+        candidates = self._patterns.get(suffix)
+        if candidates:
+            for language, pattern in candidates:
+                if pattern is not None and pattern.search(sample):
+                    return language, 'keyword'
+            return self._analyse(sample, [language for language, _ in candidates]), 'analysis'
+
+        return self._analyse(sample, ANALYSIS_CANDIDATES), 'analysis'
+
+    def _from_shebang(self, interpreter: str, arguments: str) -> Optional[str]:
+        """解析 shebang 中的解释器（支持 /usr/bin/env [-S] 形式）"""
+        name = PurePosixPath(interpreter).name
+        if name == 'env':
+            words = [word for word in arguments.split() if not word.startswith('-') and '=' not in word]
+            if not words:
+                return None
+            name = PurePosixPath(words[0]).name
+        return _normalize_language(name, INTERPRETERS)
+
+    def _from_modeline(self, line: str) -> Optional[str]:
+        """解析 vim/emacs modeline 中的文件类型"""
+        match = _VIM_MODELINE.search(line)
+        if match:
+            return _normalize_language(match.group(1), FILETYPE_ALIASES)
+        match = _EMACS_MODELINE.search(line)
+        if match:
+            return _normalize_language(match.group(1) or match.group(2), FILETYPE_ALIASES)
+        return None
+
+    def _analyse(self, sample: str, languages: List[str]) -> Optional[str]:
+        """在候选语言中按 analyse_text 得分选择，得分不足时返回 None"""
+        best, best_score = None, 0.0
+        for language in languages:
+            lexer_class = _lexer_class(language)
+            if lexer_class is None:
+                continue
+            score = lexer_class.analyse_text(sample)
+            if score > best_score:
+                best, best_score = language, score
+        return best if best_score >= self.min_score else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取检测统计"""
+        with self._lock:
+            return {
+                "memo_items": len(self._memo),
+                "memo_hits": self.hits,
+                "memo_misses": self.misses,
+                "detections": dict(self.detections)
+            }
+
+
+# 进程级共享实例
+language_detector = LanguageDetector()
@@ -0,0 +1,89 @@
+"""
+密码哈希线程池
+
+bcrypt 计算在默认代价下每次需要数百毫秒CPU，直接在 async 路由中执行会阻塞事件循环，
+放到数据库线程池中又会占用查询线程。这里使用独立的有界线程池（bcrypt 计算期间释放GIL）：
+同时计算的数量等于线程数，处理中+排队中的任务数受上限约束（AsyncSlots，在事件循环上等待，不占用线程），
+等待超时则拒绝（PasswordHashBusyError）。
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, TypeVar
+
+from passlib.context import CryptContext
+
+from app.utils.async_slots import AsyncSlots
+
+# 哈希池配置
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 16)))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "10"))  # 秒
+
+# 密码加密上下文
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+T = TypeVar("T")
+
+
+class PasswordHashBusyError(Exception):
+    """密码哈希队列已满"""
+
+
+class PasswordHasher:
+    """有界密码哈希线程池"""
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+        queue_timeout: float = PASSWORD_HASH_QUEUE_TIMEOUT
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = AsyncSlots(max_pending, queue_timeout)
+        self._lock = threading.Lock()
+
+        self.completed = 0
+        self.rejected = 0
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        """在哈希线程池中执行；队列已满时最多等待 queue_timeout 秒"""
+        if not await self._slots.acquire():
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHashBusyError("登录请求过多，请稍后重试")
+
+        # 槽位在计算结束时释放（请求取消后仍在计算的任务继续计入上限）
+        future = self._slots.submit(self._executor, func, *args)
+        result = await asyncio.wrap_future(future)
+        with self._lock:
+            self.completed += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        """计算密码哈希"""
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """校验密码"""
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取哈希队列统计"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self._slots.in_use,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected
+            }
+
+
+# 进程级共享实例
+password_hasher = PasswordHasher()
@@ -0,0 +1,195 @@
+"""
+PDF渲染进程池
+
+WeasyPrint 渲染是CPU密集的同步操作，直接在 async 路由中调用会阻塞整个事件循环。
+这里将渲染放到有界的 ProcessPoolExecutor 中执行：工作进程启动时预加载
+WeasyPrint、字体配置和默认样式表；同时处理中+排队中的任务数受上限约束，
+超出时在事件循环上等待空位（AsyncSlots），等待超时则拒绝（PdfRenderBusyError）。
+槽位在工作进程渲染结束时释放，请求取消后仍在渲染的任务继续计入上限。
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, List
+
+from app.utils.async_slots import AsyncSlots
+
+# 渲染池配置
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+PDF_RENDER_MAX_PENDING = int(os.getenv("PDF_RENDER_MAX_PENDING", str(PDF_RENDER_WORKERS * 4)))
+PDF_RENDER_QUEUE_TIMEOUT = float(os.getenv("PDF_RENDER_QUEUE_TIMEOUT", "30"))  # 秒
+
+
+class PdfRenderBusyError(Exception):
+    """渲染队列已满"""
+
+
+# ---- 工作进程内状态 ----
+
+_worker_font_config = None
+_worker_stylesheets: Dict[str, Any] = {}
+
+
+def _get_worker_stylesheet(css_text: str):
+    """获取（并缓存）工作进程内已解析的样式表"""
+    from weasyprint import CSS
+
+    stylesheet = _worker_stylesheets.get(css_text)
+    if stylesheet is None:
+        stylesheet = CSS(string=css_text, font_config=_worker_font_config)
+        _worker_stylesheets[css_text] = stylesheet
+    return stylesheet
+
+
+def _init_worker(warm_css: List[str]):
+    """工作进程初始化：预加载WeasyPrint、字体和样式表"""
+    global _worker_font_config
+    try:
+        from weasyprint import HTML
+        from weasyprint.text.fonts import FontConfiguration
+
+        _worker_font_config = FontConfiguration()
+        for css_text in warm_css:
+            stylesheet = _get_worker_stylesheet(css_text)
+            # 渲染一个空白文档，提前完成字体查找
+            HTML(string="<p>CodeWright</p>").write_pdf(
+                stylesheets=[stylesheet],
+                font_config=_worker_font_config
+            )
+    except Exception as e:
+        # 初始化失败不应使整个进程池不可用，实际渲染时再报告错误
+        print(f"PDF渲染进程预热失败: {str(e)}")
+
+
+def _render_in_worker(html_content: str, css_text: str) -> bytes:
+    """在工作进程中渲染PDF"""
+    from weasyprint import HTML
+
+    stylesheet = _get_worker_stylesheet(css_text)
+    return HTML(string=html_content).write_pdf(
+        stylesheets=[stylesheet],
+        font_config=_worker_font_config
+    )
+
+
+def _ping_worker() -> int:
+    """预热任务：确保工作进程已启动"""
+    return os.getpid()
+
+
+# ---- Web进程内的调度 ----
+
+class PdfRenderPool:
+    """有界PDF渲染进程池"""
+
+    def __init__(
+        self,
+        workers: int = PDF_RENDER_WORKERS,
+        max_pending: int = PDF_RENDER_MAX_PENDING,
+        queue_timeout: float = PDF_RENDER_QUEUE_TIMEOUT
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.warm_css: List[str] = []
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = AsyncSlots(max_pending, queue_timeout)
+        self._lock = threading.Lock()
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 使用spawn，避免在多线程的Web进程中fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(list(self.warm_css),)
+                )
+            return self._executor
+
+    def start(self, warm_css: Optional[List[str]] = None):
+        """启动工作进程并预热"""
+        if warm_css:
+            self.warm_css = list(warm_css)
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_ping_worker)
+
+    def shutdown(self):
+        """关闭进程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        """丢弃已损坏的进程池（其他任务已重建的新进程池不受影响）"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    async def render(self, html_content: str, css_text: str) -> bytes:
+        """渲染PDF；队列已满时最多等待 queue_timeout 秒"""
+        if not await self._slots.acquire():
+            with self._lock:
+                self.rejected += 1
+            raise PdfRenderBusyError("PDF渲染队列已满，请稍后重试")
+
+        try:
+            executor = self._get_executor()
+        except BaseException:
+            # 进程池创建失败时任务未提交，直接归还槽位
+            self._slots.release()
+            with self._lock:
+                self.failed += 1
+            raise
+
+        try:
+            # 槽位在渲染任务结束时释放（提交失败时立即释放）
+            future = self._slots.submit(executor, _render_in_worker, html_content, css_text)
+            pdf_bytes = await asyncio.wrap_future(future)
+            with self._lock:
+                self.completed += 1
+            return pdf_bytes
+        except BrokenProcessPool:
+            # 工作进程异常退出，丢弃进程池，下次调用时重建
+            self._discard(executor)
+            with self._lock:
+                self.failed += 1
+            raise
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取渲染队列统计"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "started": self._executor is not None,
+                "queue_depth": self._slots.in_use,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected
+            }
+
+
+# 进程级共享实例
+pdf_render_pool = PdfRenderPool()
+
+
+async def render_pdf(html_content: str, css_text: str) -> bytes:
+    """使用共享进程池渲染PDF"""
+    return await pdf_render_pool.render(html_content, css_text)
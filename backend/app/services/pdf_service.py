@@ -3,15 +3,181 @@ PDF导出服务
 """
 import os
 import tempfile
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from datetime import datetime
-from sqlalchemy.orm import Session
-import weasyprint
-from weasyprint import HTML, CSS
+from sqlalchemy.orm import Session, contains_eager
 
+from app.database import run_in_db_thread
 from app.models.project import Project, ProjectItem
-from app.models.uploaded_file import UploadedFile
+from app.models.file import UploadedFile
 from app.services.highlight_service import HighlightService
+from app.services.pdf_renderer import render_pdf, PdfRenderBusyError
+
+# 默认CSS样式
+DEFAULT_CSS = """
+@page {
+    size: A4;
+    margin: 2cm;
+    @bottom-center {
+        content: counter(page);
+        font-size: 10px;
+        color: #666;
+    }
+}
+
+body {
+    font-family: "SimSun", "Microsoft YaHei", "PingFang SC", "Hiragino Sans GB", sans-serif;
+    font-size: 12px;
+    line-height: 1.6;
+    color: #333;
+    margin: 0;
+    padding: 0;
+}
+
+.document-header {
+    text-align: center;
+    margin-bottom: 30px;
+    padding-bottom: 20px;
+    border-bottom: 2px solid #5c7cfa;
+}
+
+.document-title {
+    font-size: 24px;
+    font-weight: bold;
+    color: #5c7cfa;
+    margin: 0 0 10px 0;
+}
+
+.document-meta {
+    font-size: 10px;
+    color: #666;
+    margin: 5px 0;
+}
+
+.toc {
+    background-color: #f8f9fa;
+    padding: 15px;
+    border-radius: 5px;
+    margin-bottom: 25px;
+    page-break-inside: avoid;
+}
+
+.toc-title {
+    font-size: 16px;
+    font-weight: bold;
+    color: #5c7cfa;
+    margin: 0 0 10px 0;
+}
+
+.toc-list {
+    list-style: none;
+    padding: 0;
+    margin: 0;
+}
+
+.toc-item {
+    margin: 5px 0;
+    padding: 2px 0;
+}
+
+.toc-link {
+    color: #5c7cfa;
+    text-decoration: none;
+    font-size: 11px;
+}
+
+.file-section {
+    margin-bottom: 25px;
+    page-break-inside: avoid;
+    break-inside: avoid;
+}
+
+.file-header {
+    background-color: #5c7cfa;
+    color: white;
+    padding: 8px 12px;
+    font-weight: bold;
+    font-size: 14px;
+    margin: 0;
+    border-radius: 3px 3px 0 0;
+}
+
+.file-content {
+    border: 1px solid #e4e7ed;
+    border-top: none;
+    border-radius: 0 0 3px 3px;
+    overflow: hidden;
+}
+
+.file-content pre {
+    margin: 0;
+    padding: 10px;
+    font-family: "Consolas", "Monaco", "Courier New", monospace;
+    font-size: 9px;
+    line-height: 1.4;
+    background-color: #f8f9fa;
+    overflow-x: auto;
+    white-space: pre-wrap;
+    word-wrap: break-word;
+}
+
+.highlight {
+    background-color: transparent;
+}
+
+.linenos {
+    color: #666;
+    background-color: #f0f0f0;
+    padding-right: 5px;
+    border-right: 1px solid #ddd;
+    user-select: none;
+    display: inline-block;
+    width: 30px;
+    text-align: right;
+}
+
+.stats-section {
+    margin-top: 30px;
+    padding: 15px;
+    background-color: #f8f9fa;
+    border-radius: 5px;
+    page-break-inside: avoid;
+}
+
+.stats-title {
+    font-size: 14px;
+    font-weight: bold;
+    color: #5c7cfa;
+    margin: 0 0 10px 0;
+}
+
+.stats-table {
+    width: 100%;
+    border-collapse: collapse;
+    font-size: 10px;
+}
+
+.stats-table th,
+.stats-table td {
+    border: 1px solid #ddd;
+    padding: 5px 8px;
+    text-align: left;
+}
+
+.stats-table th {
+    background-color: #f0f0f0;
+    font-weight: bold;
+}
+
+.watermark {
+    position: fixed;
+    bottom: 10px;
+    right: 10px;
+    font-size: 8px;
+    color: #ccc;
+    z-index: 1000;
+}
+"""
 
 class PdfService:
     """PDF导出服务"""
@@ -19,216 +185,73 @@ class PdfService:
     def __init__(self, db: Session):
         self.db = db
         self.highlight_service = HighlightService(db)
-        
-        # 默认CSS样式
-        self.default_css = """
-        @page {
-            size: A4;
-            margin: 2cm;
-            @bottom-center {
-                content: counter(page);
-                font-size: 10px;
-                color: #666;
-            }
-        }
-        
-        body {
-            font-family: "SimSun", "Microsoft YaHei", "PingFang SC", "Hiragino Sans GB", sans-serif;
-            font-size: 12px;
-            line-height: 1.6;
-            color: #333;
-            margin: 0;
-            padding: 0;
-        }
-        
-        .document-header {
-            text-align: center;
-            margin-bottom: 30px;
-            padding-bottom: 20px;
-            border-bottom: 2px solid #5c7cfa;
-        }
-        
-        .document-title {
-            font-size: 24px;
-            font-weight: bold;
-            color: #5c7cfa;
-            margin: 0 0 10px 0;
-        }
-        
-        .document-meta {
-            font-size: 10px;
-            color: #666;
-            margin: 5px 0;
-        }
-        
-        .toc {
-            background-color: #f8f9fa;
-            padding: 15px;
-            border-radius: 5px;
-            margin-bottom: 25px;
-            page-break-inside: avoid;
-        }
-        
-        .toc-title {
-            font-size: 16px;
-            font-weight: bold;
-            color: #5c7cfa;
-            margin: 0 0 10px 0;
-        }
-        
-        .toc-list {
-            list-style: none;
-            padding: 0;
-            margin: 0;
-        }
-        
-        .toc-item {
-            margin: 5px 0;
-            padding: 2px 0;
-        }
-        
-        .toc-link {
-            color: #5c7cfa;
-            text-decoration: none;
-            font-size: 11px;
-        }
-        
-        .file-section {
-            margin-bottom: 25px;
-            page-break-inside: avoid;
-            break-inside: avoid;
-        }
-        
-        .file-header {
-            background-color: #5c7cfa;
-            color: white;
-            padding: 8px 12px;
-            font-weight: bold;
-            font-size: 14px;
-            margin: 0;
-            border-radius: 3px 3px 0 0;
-        }
-        
-        .file-content {
-            border: 1px solid #e4e7ed;
-            border-top: none;
-            border-radius: 0 0 3px 3px;
-            overflow: hidden;
-        }
-        
-        .file-content pre {
-            margin: 0;
-            padding: 10px;
-            font-family: "Consolas", "Monaco", "Courier New", monospace;
-            font-size: 9px;
-            line-height: 1.4;
-            background-color: #f8f9fa;
-            overflow-x: auto;
-            white-space: pre-wrap;
-            word-wrap: break-word;
-        }
-        
-        .highlight {
-            background-color: transparent;
-        }
-        
-        .linenos {
-            color: #666;
-            background-color: #f0f0f0;
-            padding-right: 5px;
-            border-right: 1px solid #ddd;
-            user-select: none;
-            display: inline-block;
-            width: 30px;
-            text-align: right;
-        }
-        
-        .stats-section {
-            margin-top: 30px;
-            padding: 15px;
-            background-color: #f8f9fa;
-            border-radius: 5px;
-            page-break-inside: avoid;
-        }
-        
-        .stats-title {
-            font-size: 14px;
-            font-weight: bold;
-            color: #5c7cfa;
-            margin: 0 0 10px 0;
-        }
-        
-        .stats-table {
-            width: 100%;
-            border-collapse: collapse;
-            font-size: 10px;
-        }
-        
-        .stats-table th,
-        .stats-table td {
-            border: 1px solid #ddd;
-            padding: 5px 8px;
-            text-align: left;
-        }
-        
-        .stats-table th {
-            background-color: #f0f0f0;
-            font-weight: bold;
-        }
-        
-        .watermark {
-            position: fixed;
-            bottom: 10px;
-            right: 10px;
-            font-size: 8px;
-            color: #ccc;
-            z-index: 1000;
-        }
-        """
+        self.default_css = DEFAULT_CSS
+        self.fragment_stats = {'reused': 0, 'rendered': 0}
     
     async def export_project_to_pdf(
         self,
         project_id: int,
         user_id: int,
-        options: Dict[str, Any] = None
+        options: Dict[str, Any] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
     ) -> Optional[bytes]:
-        """导出项目为PDF"""
+        """导出项目为PDF
+        
+        progress_callback 在每个文件渲染完成后以 (已完成数, 总数) 调用，供异步任务汇报进度。
+        """
         try:
-            # 获取项目信息
-            project = self.db.query(Project).filter(
-                Project.id == project_id,
-                Project.owner_id == user_id
-            ).first()
-            
-            if not project:
-                return None
-            
-            # 获取项目文件
-            project_items = self.db.query(ProjectItem).join(UploadedFile).filter(
-                ProjectItem.project_id == project_id,
-                ProjectItem.include_in_export == True
-            ).order_by(ProjectItem.order_index).all()
+            # 获取项目信息和项目文件
+            project, project_items = await run_in_db_thread(
+                self._load_export_items, project_id, user_id
+            )
             
-            if not project_items:
+            if not project or not project_items:
                 return None
             
             # 生成HTML内容
-            html_content = await self._generate_html_content(project, project_items, options)
+            html_content = await self._generate_html_content(
+                project, project_items, options, progress_callback
+            )
             
             # 生成PDF
-            pdf_bytes = self._html_to_pdf(html_content, options)
+            pdf_bytes = await self._html_to_pdf(html_content, options)
             
             return pdf_bytes
             
+        except PdfRenderBusyError:
+            raise
         except Exception as e:
             print(f"PDF导出失败: {str(e)}")
             return None
     
+    def _load_export_items(
+        self,
+        project_id: int,
+        user_id: int
+    ) -> Tuple[Optional[Project], List[ProjectItem]]:
+        """加载项目及参与导出的文件（同步，文件记录随同一条查询加载）"""
+        project = self.db.query(Project).filter(
+            Project.id == project_id,
+            Project.owner_id == user_id
+        ).first()
+        if not project:
+            return None, []
+        
+        project_items = self.db.query(ProjectItem).join(ProjectItem.file).options(
+            contains_eager(ProjectItem.file)
+        ).filter(
+            ProjectItem.project_id == project_id,
+            ProjectItem.include_in_export == True
+        ).order_by(ProjectItem.order_index, ProjectItem.id).all()
+        
+        return project, project_items
+    
     async def _generate_html_content(
         self,
         project: Project,
         project_items: List[ProjectItem],
-        options: Dict[str, Any] = None
+        options: Dict[str, Any] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
     ) -> str:
         """生成HTML内容"""
         if not options:
@@ -254,65 +277,45 @@ class PdfService:
         <div class="document-meta">文件数量：{len(project_items)} 个</div>
     </div>""")
         
+        # 逐个文件渲染一次，目录、正文与统计信息共用渲染记录
+        records = await self._render_project_items(project, project_items, progress_callback)
+        
         # 目录（如果启用）
-        if options.get('include_toc', True) and len(project_items) > 1:
+        if options.get('include_toc', True) and len(records) > 1:
             html_parts.append("""
     <div class="toc">
         <h2 class="toc-title">目录</h2>
         <ul class="toc-list">""")
             
-            for i, item in enumerate(project_items):
-                file_name = item.display_name or item.file.original_filename
-                html_parts.append(f'            <li class="toc-item"><a href="#file-{i}" class="toc-link">{file_name}</a></li>')
+            for record in records:
+                html_parts.append(f'            <li class="toc-item"><a href="#{record["anchor"]}" class="toc-link">{record["file_name"]}</a></li>')
             
             html_parts.append("""        </ul>
     </div>""")
         
         # 文件内容
-        for i, item in enumerate(project_items):
-            file_name = item.display_name or item.file.original_filename
-            
-            # 获取文件高亮内容
-            highlight_result = await self.highlight_service.highlight_code(
-                file_id=item.file_id,
-                user_id=project.owner_id,
-                language_override=item.language_override
-            )
-            
+        for record in records:
             html_parts.append(f"""
-    <div class="file-section" id="file-{i}">
-        <h3 class="file-header">{file_name}</h3>
+    <div class="file-section" id="{record['anchor']}">
+        <h3 class="file-header">{record['file_name']}</h3>
         <div class="file-content">""")
-            
-            if highlight_result and highlight_result.get('highlighted_html'):
-                html_parts.append(highlight_result['highlighted_html'])
-            elif highlight_result and highlight_result.get('content'):
-                html_parts.append(f'<pre><code>{highlight_result["content"]}</code></pre>')
-            else:
-                html_parts.append('<pre><code>无法加载文件内容</code></pre>')
-            
+            html_parts.append(record['highlighted_html'])
             html_parts.append("""        </div>
     </div>""")
         
         # 统计信息（如果启用）
         if options.get('include_summary', True):
-            total_lines = sum(
-                item.get('line_count', 0) for item in [
-                    await self.highlight_service.highlight_code(
-                        file_id=pi.file_id,
-                        user_id=project.owner_id,
-                        language_override=pi.language_override
-                    ) for pi in project_items
-                ] if item
-            )
+            total_lines = sum(record['line_count'] for record in records)
+            total_bytes = sum(record['byte_size'] for record in records)
             
             html_parts.append(f"""
     <div class="stats-section">
         <h2 class="stats-title">统计信息</h2>
         <table class="stats-table">
             <tr><th>项目名称</th><td>{project.project_name}</td></tr>
-            <tr><th>文件数量</th><td>{len(project_items)} 个</td></tr>
+            <tr><th>文件数量</th><td>{len(records)} 个</td></tr>
             <tr><th>总行数</th><td>{total_lines} 行</td></tr>
+            <tr><th>总大小</th><td>{total_bytes} 字节</td></tr>
             <tr><th>生成时间</th><td>{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</td></tr>
         </table>
     </div>""")
@@ -331,21 +334,47 @@ class PdfService:
         
         return ''.join(html_parts)
     
-    def _html_to_pdf(self, html_content: str, options: Dict[str, Any] = None) -> bytes:
-        """将HTML转换为PDF"""
-        if not options:
-            options = {}
+    async def _render_project_items(
+        self,
+        project: Project,
+        project_items: List[ProjectItem],
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """渲染项目文件，每个文件只高亮一次
         
-        # 创建HTML对象
-        html_doc = HTML(string=html_content)
+        返回的渲染记录包含锚点、显示名、语言、行数、字节数和高亮HTML，
+        供目录、正文和统计信息复用。内容与选项未变化的文件直接复用缓存片段，
+        复用/重新渲染的数量记录在 self.fragment_stats 中。
+        """
+        records = []
+        self.fragment_stats = {'reused': 0, 'rendered': 0}
         
-        # 创建CSS对象
-        css_doc = CSS(string=self.default_css)
+        # 多个文件并行高亮，按原顺序收集
+        i = 0
+        async for item, fragment, reused in self.highlight_service.iter_file_fragments(project_items):
+            self.fragment_stats['reused' if reused else 'rendered'] += 1
+            
+            records.append({
+                'anchor': f'file-{i}',
+                'file_name': item.display_name or item.file.original_filename,
+                'language': fragment['language'] if fragment else 'text',
+                'line_count': fragment['line_count'] if fragment else 0,
+                'byte_size': item.file.file_size,
+                'highlighted_html': fragment['highlighted_html'] if fragment else '<pre><code>无法加载文件内容</code></pre>'
+            })
+            
+            i += 1
+            if progress_callback:
+                progress_callback(i, len(project_items))
         
-        # 生成PDF
-        pdf_bytes = html_doc.write_pdf(stylesheets=[css_doc])
+        return records
+    
+    async def _html_to_pdf(self, html_content: str, options: Dict[str, Any] = None) -> bytes:
+        """将HTML转换为PDF（在渲染进程池中执行，不阻塞事件循环）"""
+        if not options:
+            options = {}
         
-        return pdf_bytes
+        return await render_pdf(html_content, self.default_css)
     
     def get_export_options(self) -> Dict[str, Any]:
         """获取导出选项说明"""
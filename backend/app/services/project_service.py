@@ -3,18 +3,24 @@
 """
 import json
 from typing import Optional, List, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy import and_, case, func, or_, update
 
+from app.database import offload_db
 from app.models.project import Project, ProjectItem
 from app.models.file import UploadedFile
 from app.schemas.project import ProjectCreate, ProjectUpdate
+from app.utils.pagination import paginate, TOTAL_EXACT
+
+# 项目文件顺序值的间隔，拖动排序时可在相邻两项之间插入而无需重新编号
+ORDER_INDEX_GAP = 1024
 
 class ProjectService:
     def __init__(self, db: Session):
         self.db = db
     
-    async def create_project(self, project_data: ProjectCreate, owner_id: int) -> Project:
+    @offload_db
+    def create_project(self, project_data: ProjectCreate, owner_id: int) -> Project:
         """创建项目"""
         import json
 
@@ -38,58 +44,56 @@ class ProjectService:
         
         return new_project
     
-    async def get_user_projects(
+    @offload_db
+    def get_user_projects(
         self, 
         user_id: int, 
         project_type: Optional[str] = None,
         page: int = 1,
-        page_size: int = 10
+        page_size: int = 10,
+        cursor: Optional[str] = None,
+        total_mode: str = TOTAL_EXACT
     ) -> Dict[str, Any]:
-        """获取用户项目列表"""
+        """获取用户项目列表（按创建时间倒序，支持游标分页）"""
         query = self.db.query(Project).filter(Project.owner_id == user_id)
         
         if project_type:
             query = query.filter(Project.project_type == project_type)
         
-        # 计算总数
-        total = query.count()
-        
-        # 分页查询
-        offset = (page - 1) * page_size
-        projects = query.offset(offset).limit(page_size).all()
-        
-        return {
-            "projects": [
-                {
-                    "id": p.id,
-                    "project_name": p.project_name,
-                    "project_type": p.project_type,
-                    "config_json": p.config_json,
-                    "created_at": p.created_at,
-                    "updated_at": p.updated_at
-                }
-                for p in projects
-            ],
-            "total": total,
-            "page": page,
-            "page_size": page_size,
-            "total_pages": (total + page_size - 1) // page_size
-        }
+        result = paginate(query, Project, page_size, cursor, page, total_mode)
+        result["projects"] = [
+            {
+                "id": p.id,
+                "project_name": p.project_name,
+                "project_type": p.project_type,
+                "config_json": p.config_json,
+                "created_at": p.created_at,
+                "updated_at": p.updated_at
+            }
+            for p in result.pop("items")
+        ]
+        return result
     
-    async def get_project_by_id(self, project_id: int, user_id: int) -> Optional[Project]:
+    @offload_db
+    def get_project_by_id(self, project_id: int, user_id: int) -> Optional[Project]:
         """根据ID获取项目"""
+        return self._get_owned_project(project_id, user_id)
+    
+    def _get_owned_project(self, project_id: int, user_id: int) -> Optional[Project]:
+        """查询属于用户的项目（同步）"""
         return self.db.query(Project).filter(
             and_(Project.id == project_id, Project.owner_id == user_id)
         ).first()
     
-    async def update_project(
+    @offload_db
+    def update_project(
         self,
         project_id: int,
         user_id: int,
         project_data: ProjectUpdate
     ) -> Optional[Project]:
         """更新项目"""
-        project = await self.get_project_by_id(project_id, user_id)
+        project = self._get_owned_project(project_id, user_id)
         if not project:
             return None
 
@@ -104,9 +108,10 @@ class ProjectService:
 
         return project
 
-    async def delete_project(self, project_id: int, user_id: int) -> bool:
+    @offload_db
+    def delete_project(self, project_id: int, user_id: int) -> bool:
         """删除项目"""
-        project = await self.get_project_by_id(project_id, user_id)
+        project = self._get_owned_project(project_id, user_id)
         if not project:
             return False
 
@@ -115,7 +120,8 @@ class ProjectService:
 
         return True
 
-    async def add_file_to_project(
+    @offload_db
+    def add_file_to_project(
         self,
         project_id: int,
         file_id: int,
@@ -123,7 +129,7 @@ class ProjectService:
     ) -> bool:
         """将文件添加到项目"""
         # 检查项目是否存在且属于用户
-        project = await self.get_project_by_id(project_id, user_id)
+        project = self._get_owned_project(project_id, user_id)
         if not project:
             return False
 
@@ -144,15 +150,15 @@ class ProjectService:
             return True  # 已存在，返回成功
 
         # 获取当前项目中文件的最大顺序
-        max_order = self.db.query(ProjectItem).filter(
+        max_order = self.db.query(func.max(ProjectItem.order_index)).filter(
             ProjectItem.project_id == project_id
-        ).count()
+        ).scalar() or 0
 
         # 创建项目文件关联
         project_item = ProjectItem(
             project_id=project_id,
             file_id=file_id,
-            order_index=max_order + 1
+            order_index=max_order + ORDER_INDEX_GAP
         )
 
         self.db.add(project_item)
@@ -160,39 +166,72 @@ class ProjectService:
 
         return True
 
-    async def get_project_files(
+    @offload_db
+    def get_project_files(
         self,
         project_id: int,
         user_id: int
     ) -> Optional[List[Dict[str, Any]]]:
         """获取项目文件列表"""
         # 检查项目是否存在且属于用户
-        project = await self.get_project_by_id(project_id, user_id)
+        project = self._get_owned_project(project_id, user_id)
         if not project:
             return None
 
-        # 获取项目文件列表
-        project_items = self.db.query(ProjectItem).join(UploadedFile).filter(
+        # 获取项目文件列表（只查询需要的列，一次JOIN完成，避免逐个加载文件记录）
+        rows = self.db.query(
+            ProjectItem.id,
+            ProjectItem.file_id,
+            ProjectItem.display_name,
+            ProjectItem.language_override,
+            ProjectItem.include_in_export,
+            ProjectItem.order_index,
+            ProjectItem.created_at,
+            UploadedFile.original_filename,
+            UploadedFile.file_size,
+            UploadedFile.file_type,
+            UploadedFile.content_hash
+        ).join(UploadedFile, ProjectItem.file_id == UploadedFile.id).filter(
             ProjectItem.project_id == project_id
-        ).order_by(ProjectItem.order_index).all()
+        ).order_by(ProjectItem.order_index, ProjectItem.id).all()
 
         return [
             {
-                "id": item.id,
-                "file_id": item.file_id,
-                "display_name": item.display_name or item.file.original_filename,
-                "original_filename": item.file.original_filename,
-                "file_size": item.file.file_size,
-                "file_type": item.file.file_type,
-                "language_override": item.language_override,
-                "include_in_export": item.include_in_export,
-                "order_index": item.order_index,
-                "created_at": item.created_at
+                "id": row.id,
+                "file_id": row.file_id,
+                "display_name": row.display_name or row.original_filename,
+                "original_filename": row.original_filename,
+                "file_size": row.file_size,
+                "file_type": row.file_type,
+                "content_hash": row.content_hash,
+                "language_override": row.language_override,
+                "include_in_export": row.include_in_export,
+                "order_index": row.order_index,
+                "created_at": row.created_at
             }
-            for item in project_items
+            for row in rows
         ]
 
-    async def remove_file_from_project(
+    @offload_db
+    def get_export_items(
+        self,
+        project_id: int,
+        user_id: int
+    ) -> Optional[List[ProjectItem]]:
+        """获取参与导出的项目文件，文件记录随同一条查询加载"""
+        project = self._get_owned_project(project_id, user_id)
+        if not project:
+            return None
+
+        return self.db.query(ProjectItem).join(ProjectItem.file).options(
+            contains_eager(ProjectItem.file)
+        ).filter(
+            ProjectItem.project_id == project_id,
+            ProjectItem.include_in_export == True
+        ).order_by(ProjectItem.order_index, ProjectItem.id).all()
+
+    @offload_db
+    def remove_file_from_project(
         self,
         project_id: int,
         file_id: int,
@@ -200,7 +239,7 @@ class ProjectService:
     ) -> bool:
         """从项目中移除文件"""
         # 检查项目是否存在且属于用户
-        project = await self.get_project_by_id(project_id, user_id)
+        project = self._get_owned_project(project_id, user_id)
         if not project:
             return False
 
@@ -219,7 +258,8 @@ class ProjectService:
 
         return True
 
-    async def update_project_file(
+    @offload_db
+    def update_project_file(
         self,
         project_id: int,
         file_id: int,
@@ -228,7 +268,7 @@ class ProjectService:
     ) -> bool:
         """更新项目文件信息"""
         # 检查项目是否存在且属于用户
-        project = await self.get_project_by_id(project_id, user_id)
+        project = self._get_owned_project(project_id, user_id)
         if not project:
             return False
 
@@ -254,39 +294,143 @@ class ProjectService:
         self.db.commit()
         return True
 
-    async def reorder_project_files(
+    @offload_db
+    def reorder_project_files(
         self,
         project_id: int,
         file_orders: list,
         user_id: int
     ) -> bool:
-        """重新排序项目文件"""
+        """重新排序项目文件（单条 UPDATE ... CASE 语句完成）"""
         # 检查项目是否存在且属于用户
-        project = await self.get_project_by_id(project_id, user_id)
+        project = self._get_owned_project(project_id, user_id)
         if not project:
             return False
 
-        try:
-            # 批量更新文件顺序
-            for order_data in file_orders:
-                file_id = order_data.get('file_id')
-                order_index = order_data.get('order_index')
-
-                if file_id is None or order_index is None:
-                    continue
+        orders = {}
+        for order_data in file_orders:
+            file_id = order_data.get('file_id')
+            order_index = order_data.get('order_index')
 
-                # 查找项目文件关联
-                project_item = self.db.query(ProjectItem).filter(
-                    ProjectItem.project_id == project_id,
-                    ProjectItem.file_id == file_id
-                ).first()
+            if file_id is None or order_index is None:
+                continue
+            orders[file_id] = order_index
 
-                if project_item:
-                    project_item.order_index = order_index
+        if not orders:
+            return True
 
+        try:
+            self._bulk_set_order(project_id, orders)
             self.db.commit()
             return True
 
         except Exception as e:
             self.db.rollback()
             return False
+
+    @offload_db
+    def move_project_file(
+        self,
+        project_id: int,
+        file_id: int,
+        user_id: int,
+        before_file_id: Optional[int] = None
+    ) -> Optional[int]:
+        """将文件移动到 before_file_id 之前（为空时移动到末尾），返回新的顺序值
+
+        顺序值之间保留间隔，移动时取相邻两项的中间值，只更新被移动的一行；
+        间隔用尽时才按 ORDER_INDEX_GAP 重新编号整个项目。
+        """
+        project = self._get_owned_project(project_id, user_id)
+        if not project:
+            return None
+
+        project_item = self.db.query(ProjectItem).filter(
+            ProjectItem.project_id == project_id,
+            ProjectItem.file_id == file_id
+        ).first()
+        if not project_item:
+            return None
+
+        if before_file_id == file_id:
+            return project_item.order_index
+
+        if before_file_id is not None and not self.db.query(ProjectItem.id).filter(
+            ProjectItem.project_id == project_id,
+            ProjectItem.file_id == before_file_id
+        ).first():
+            return None
+
+        try:
+            order_index = self._order_between(project_id, file_id, before_file_id)
+            if order_index is None:
+                self._renumber(project_id)
+                order_index = self._order_between(project_id, file_id, before_file_id)
+
+            project_item.order_index = order_index
+            self.db.commit()
+            return order_index
+
+        except Exception as e:
+            self.db.rollback()
+            return None
+
+    def _order_between(
+        self,
+        project_id: int,
+        file_id: int,
+        before_file_id: Optional[int]
+    ) -> Optional[int]:
+        """计算插入位置的顺序值；相邻两项之间没有空位时返回None
+
+        项目文件按 (order_index, id) 排序，顺序值相同的相邻项之间没有空位。
+        调用方需保证 before_file_id 对应的文件在项目中。
+        """
+        others = self.db.query(ProjectItem.order_index).filter(
+            ProjectItem.project_id == project_id,
+            ProjectItem.file_id != file_id
+        )
+
+        if before_file_id is None:
+            max_order = others.order_by(ProjectItem.order_index.desc()).limit(1).scalar()
+            return (max_order or 0) + ORDER_INDEX_GAP
+
+        next_order, next_id = others.add_columns(ProjectItem.id).filter(
+            ProjectItem.file_id == before_file_id
+        ).one()
+        prev_order = others.filter(
+            or_(
+                ProjectItem.order_index < next_order,
+                and_(ProjectItem.order_index == next_order, ProjectItem.id < next_id)
+            )
+        ).order_by(ProjectItem.order_index.desc(), ProjectItem.id.desc()).limit(1).scalar()
+        if prev_order is None:
+            prev_order = next_order - 2 * ORDER_INDEX_GAP
+
+        if next_order - prev_order < 2:
+            return None
+        return (prev_order + next_order) // 2
+
+    def _renumber(self, project_id: int):
+        """按当前顺序以 ORDER_INDEX_GAP 为间隔重新编号"""
+        file_ids = [
+            file_id for (file_id,) in self.db.query(ProjectItem.file_id).filter(
+                ProjectItem.project_id == project_id
+            ).order_by(ProjectItem.order_index, ProjectItem.id)
+        ]
+        self._bulk_set_order(project_id, {
+            file_id: position * ORDER_INDEX_GAP
+            for position, file_id in enumerate(file_ids, 1)
+        })
+
+    def _bulk_set_order(self, project_id: int, orders: Dict[int, int]):
+        """以单条 UPDATE ... CASE 语句批量设置顺序值（不提交）"""
+        self.db.execute(
+            update(ProjectItem).where(
+                ProjectItem.project_id == project_id,
+                ProjectItem.file_id.in_(list(orders))
+            ).values(
+                order_index=case(orders, value=ProjectItem.file_id)
+            ).execution_options(synchronize_session=False)
+        )
+        self.db.expire_all()
@@ -9,24 +9,21 @@ from typing import List, Optional
 from sqlalchemy.orm import Session
 from fastapi import UploadFile
 
+from app.database import offload_db
 from app.models.template import Template
 
-class TemplateService:
-    def __init__(self, db: Session):
-        self.db = db
-        self.template_dir = Path("../templates")
-        self.template_dir.mkdir(exist_ok=True)
-        self._init_default_template()
+TEMPLATE_DIR = Path("../templates")
+
+
+def seed_default_template(db: Session):
+    """写入缺失的默认模板（应用启动时调用一次）"""
+    existing = db.query(Template).filter(
+        Template.name == "基础代码模板"
+    ).first()
     
-    def _init_default_template(self):
-        """初始化默认模板"""
-        existing = self.db.query(Template).filter(
-            Template.name == "基础代码模板"
-        ).first()
-        
-        if not existing:
-            # 创建基础模板文件
-            template_content = """<!DOCTYPE html>
+    if not existing:
+        # 创建基础模板文件
+        template_content = """<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
@@ -60,25 +57,33 @@ class TemplateService:
     </div>
 </body>
 </html>"""
-            
-            template_filename = f"basic_template_{uuid.uuid4().hex[:8]}.html"
-            template_path = self.template_dir / template_filename
-            
-            with open(template_path, 'w', encoding='utf-8') as f:
-                f.write(template_content)
-            
-            template = Template(
-                name="基础代码模板",
-                version="1.0.0",
-                description="默认的代码文档模板，适用于大多数软件著作权申请",
-                storage_path=str(template_path),
-                status="published"
-            )
-            
-            self.db.add(template)
-            self.db.commit()
+        
+        template_filename = f"basic_template_{uuid.uuid4().hex[:8]}.html"
+        template_path = TEMPLATE_DIR / template_filename
+        
+        with open(template_path, 'w', encoding='utf-8') as f:
+            f.write(template_content)
+        
+        template = Template(
+            name="基础代码模板",
+            version="1.0.0",
+            description="默认的代码文档模板，适用于大多数软件著作权申请",
+            storage_path=str(template_path),
+            status="published"
+        )
+        
+        db.add(template)
+        db.commit()
+
+
+class TemplateService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.template_dir = TEMPLATE_DIR
+        self.template_dir.mkdir(exist_ok=True)
     
-    async def get_templates(self) -> List[dict]:
+    @offload_db
+    def get_templates(self) -> List[dict]:
         """获取模板列表"""
         templates = self.db.query(Template).order_by(Template.created_at.desc()).all()
         
@@ -95,7 +100,8 @@ class TemplateService:
             for t in templates
         ]
     
-    async def create_template(
+    @offload_db
+    def create_template(
         self, 
         name: str, 
         version: str, 
@@ -129,7 +135,8 @@ class TemplateService:
         
         return template
     
-    async def update_template_status(self, template_id: int, status: str) -> bool:
+    @offload_db
+    def update_template_status(self, template_id: int, status: str) -> bool:
         """更新模板状态"""
         if status not in ["draft", "published"]:
             raise ValueError("状态必须是 draft 或 published")
@@ -143,11 +150,13 @@ class TemplateService:
         
         return True
     
-    async def get_template_by_id(self, template_id: int) -> Optional[Template]:
+    @offload_db
+    def get_template_by_id(self, template_id: int) -> Optional[Template]:
         """根据ID获取模板"""
         return self.db.query(Template).filter(Template.id == template_id).first()
     
-    async def get_published_templates(self) -> List[Template]:
+    @offload_db
+    def get_published_templates(self) -> List[Template]:
         """获取已发布的模板"""
         return self.db.query(Template).filter(
             Template.status == "published"
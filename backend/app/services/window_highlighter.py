@@ -0,0 +1,404 @@
+"""
+按行区间高亮（分页预览）
+
+预览大文件时只高亮请求的行区间：借助行偏移索引只读取需要的字节范围，
+词法分析从区间之前最近的“词法状态检查点”开始，而不是从文件开头开始。
+
+检查点记录某一行行首处 RegexLexer 的状态栈（例如处于多行字符串、块注释中），
+只在某个 token 恰好结束于行首时记录，从该行以该状态栈继续分析，结果与从头分析一致。
+检查点通过只做正则匹配和状态转换、不生成 token 的遍历获得（与 pygments 的
+RegexLexer.get_tokens_unprocessed 主循环一致），按 (内容哈希, 语言) 缓存，随翻页逐步向后推进。
+
+距离最近检查点超过 PREVIEW_RESYNC_MAX_LINES 行时（首次直接跳到大文件深处），
+本次从区间起始行以初始状态分析（exact 为 false，跨行结构的着色可能不准确），
+同时在后台线程池中把检查点推进到该位置，之后的请求即为精确结果。后台推进共用
+PREVIEW_CHECKPOINT_WORKERS 个线程，排队中+推进中的文件数超过 PREVIEW_CHECKPOINT_MAX_PENDING 时不再安排，
+避免大量请求（如不同的语言参数）在Web进程中同时进行长时间的词法遍历。
+不支持按状态栈续接的词法分析器同样从区间起始行以初始状态分析。
+
+单个正则匹配的跨行 token（如 /* ... */ 块注释）在文本被截断时无法匹配，词法分析会走向
+其他规则，因此区间之后要多读一段文本：区间之后有检查点时读到该检查点（检查点处没有跨行 token，
+截断不影响之前的结果），否则最多读 PREVIEW_LOOKAHEAD_LINES 行，生成的 token 越过区间末尾后即停止。
+长度不超过 PREVIEW_LOOKAHEAD_LINES 行的跨行 token 结果与整文件分析一致；
+区间末尾的 token 一直延续到截断处时（可能是更长的 token 被截断）exact 为 false。
+推进检查点时每段同样只多读 PREVIEW_LOOKAHEAD_LINES 行。
+"""
+import copy
+import inspect
+import io
+import os
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Tuple, List, Callable, Optional
+
+from pygments.formatters import HtmlFormatter
+from pygments.lexer import Lexer, RegexLexer, ExtendedRegexLexer
+from pygments.token import Token
+from pygments.util import ClassNotFound
+
+from app.services.highlight_renderer import highlighter_registry
+from app.utils.line_index import LineIndex
+
+# 单次预览的默认行数与最大行数
+PREVIEW_DEFAULT_LINES = int(os.getenv("PREVIEW_DEFAULT_LINES", "500"))
+PREVIEW_MAX_LINES = int(os.getenv("PREVIEW_MAX_LINES", "2000"))
+# 检查点间隔（行）
+PREVIEW_CHECKPOINT_INTERVAL = int(os.getenv("PREVIEW_CHECKPOINT_INTERVAL", "500"))
+# 请求内最多向后推进检查点的行数，超过时先返回近似结果并在后台推进
+PREVIEW_RESYNC_MAX_LINES = int(os.getenv("PREVIEW_RESYNC_MAX_LINES", "20000"))
+# 缓存检查点的文件数
+PREVIEW_CHECKPOINT_FILES = int(os.getenv("PREVIEW_CHECKPOINT_FILES", "256"))
+# 后台推进检查点的线程数，以及排队中+推进中的文件数上限
+PREVIEW_CHECKPOINT_WORKERS = int(os.getenv("PREVIEW_CHECKPOINT_WORKERS", "1"))
+PREVIEW_CHECKPOINT_MAX_PENDING = int(os.getenv("PREVIEW_CHECKPOINT_MAX_PENDING", "8"))
+# 区间（或推进的分段）之后最多额外读取并参与词法分析的行数，应大于最长的跨行 token
+PREVIEW_LOOKAHEAD_LINES = int(os.getenv("PREVIEW_LOOKAHEAD_LINES", "2000"))
+
+# 不能按状态栈续接的词法分析器（可能一次分析完整输入）在区间之后额外分析的行数
+LOOKAHEAD_LINES = 20
+
+INITIAL_STACK = ('root',)
+
+# 读取行区间的回调：(起始行, 结束行) -> 解码后的文本
+LineReader = Callable[[int, int], str]
+
+
+class PreviewRangeError(ValueError):
+    """预览行区间无效"""
+
+
+def _walk_states(
+    lexer: RegexLexer,
+    text: str,
+    stack: Tuple[str, ...],
+    first_line: int,
+    next_checkpoint: int,
+    interval: int,
+    last_line: int
+) -> List[Tuple[int, Tuple[str, ...]]]:
+    """遍历文本中的状态转换，返回不晚于 last_line 的行首检查点 [(行号, 状态栈)]
+
+    text 从第 first_line 行行首开始、初始状态栈为 stack，应在 last_line 之后留有足够的文本（见模块说明），
+    遍历越过 last_line 后停止。只执行正则匹配和状态转换，
+    不调用回调、不生成 token；状态转换规则与 RegexLexer.get_tokens_unprocessed 相同。
+    """
+    tokendefs = lexer._tokens
+    statestack = list(stack)
+    statetokens = tokendefs[statestack[-1]]
+    checkpoints = []
+    line = first_line
+    pos = 0
+    length = len(text)
+
+    while pos < length:
+        for rexmatch, action, new_state in statetokens:
+            m = rexmatch(text, pos)
+            if m:
+                end = m.end()
+                if new_state is not None:
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == '#pop':
+                                if len(statestack) > 1:
+                                    statestack.pop()
+                            elif state == '#push':
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack):
+                            del statestack[1:]
+                        else:
+                            del statestack[new_state:]
+                    elif new_state == '#push':
+                        statestack.append(statestack[-1])
+                    statetokens = tokendefs[statestack[-1]]
+                break
+        else:
+            # 没有规则匹配：行尾重置为 root，其他字符作为错误跳过
+            if text[pos] == '\n':
+                statestack = ['root']
+                statetokens = tokendefs['root']
+            end = pos + 1
+
+        newlines = text.count('\n', pos, end)
+        pos = end
+        if newlines:
+            line += newlines
+            if line > last_line:
+                break
+            if line >= next_checkpoint and text[pos - 1] == '\n':
+                checkpoints.append((line, tuple(statestack)))
+                next_checkpoint = line + interval
+
+    return checkpoints
+
+
+class LexerCheckpoints:
+    """单个文件（按语言）的词法状态检查点"""
+
+    def __init__(self):
+        self.lines: List[int] = [1]
+        self.stacks: List[Tuple[str, ...]] = [INITIAL_STACK]
+        self.walking = False
+        self.lock = threading.Lock()
+
+    def nearest(self, line: int) -> Tuple[int, Tuple[str, ...]]:
+        """不晚于 line 的最近检查点"""
+        with self.lock:
+            position = bisect_right(self.lines, line) - 1
+            return self.lines[position], self.stacks[position]
+
+    def following(self, line: int) -> Optional[int]:
+        """晚于 line 的第一个检查点行号，没有时返回None"""
+        with self.lock:
+            position = bisect_right(self.lines, line)
+            return self.lines[position] if position < len(self.lines) else None
+
+    def add(self, checkpoints: List[Tuple[int, Tuple[str, ...]]]):
+        """合并新检查点（保持按行号有序）"""
+        with self.lock:
+            for line, stack in checkpoints:
+                position = bisect_right(self.lines, line)
+                if self.lines[position - 1] != line:
+                    self.lines.insert(position, line)
+                    self.stacks.insert(position, stack)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+
+class WindowHighlighter:
+    """按行区间高亮，维护各文件的词法状态检查点"""
+
+    def __init__(
+        self,
+        interval: int = PREVIEW_CHECKPOINT_INTERVAL,
+        resync_max_lines: int = PREVIEW_RESYNC_MAX_LINES,
+        max_files: int = PREVIEW_CHECKPOINT_FILES,
+        workers: int = PREVIEW_CHECKPOINT_WORKERS,
+        max_pending: int = PREVIEW_CHECKPOINT_MAX_PENDING,
+        lookahead_lines: int = PREVIEW_LOOKAHEAD_LINES
+    ):
+        self.interval = interval
+        self.resync_max_lines = resync_max_lines
+        self.lookahead_lines = lookahead_lines
+        self.max_files = max_files
+        self.max_pending = max_pending
+
+        self._tables: "OrderedDict[str, LexerCheckpoints]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview-checkpoints")
+        self._lock = threading.Lock()
+
+        self.windows = 0
+        self.approximate = 0
+        self.truncated = 0
+        self.walked_lines = 0
+        self.background_pending = 0
+        self.background_skipped = 0
+
+    def _table(self, key: str) -> LexerCheckpoints:
+        with self._lock:
+            table = self._tables.get(key)
+            if table is None:
+                table = self._tables[key] = LexerCheckpoints()
+                while len(self._tables) > self.max_files:
+                    self._tables.popitem(last=False)
+            else:
+                self._tables.move_to_end(key)
+            return table
+
+    @staticmethod
+    def is_resumable(lexer: Lexer) -> bool:
+        """词法分析器能否从指定状态栈继续分析"""
+        if not isinstance(lexer, RegexLexer) or isinstance(lexer, ExtendedRegexLexer):
+            return False
+        return 'stack' in inspect.signature(lexer.get_tokens_unprocessed).parameters
+
+    def advance(
+        self,
+        key: str,
+        lexer: RegexLexer,
+        read_lines: LineReader,
+        target_line: int,
+        line_count: int
+    ):
+        """把检查点推进到 target_line 附近（每段最多 resync_max_lines 行）
+
+        每段的输入在段尾之后多读 lookahead_lines 行，段尾的跨行 token 不会被截断，只记录段内的检查点。
+        """
+        table = self._table(key)
+        while True:
+            line, stack = table.nearest(target_line)
+            if target_line - line <= self.interval:
+                return
+            segment_end = min(target_line, line + self.resync_max_lines)
+            text = read_lines(line, min(segment_end + self.lookahead_lines, line_count))
+            checkpoints = _walk_states(
+                lexer, text, stack, line, line + self.interval, self.interval, segment_end
+            )
+            with self._lock:
+                self.walked_lines += segment_end - line
+            # 整段都在同一个跨行 token 内（如超长的块注释）时无法推进
+            if not checkpoints:
+                return
+            table.add(checkpoints)
+
+    def _advance_in_background(
+        self,
+        key: str,
+        lexer: RegexLexer,
+        read_lines: LineReader,
+        target_line: int,
+        line_count: int
+    ):
+        """在后台线程池中推进检查点（同一文件同时只有一个，总数受 max_pending 约束）"""
+        table = self._table(key)
+        with table.lock:
+            if table.walking:
+                return
+            with self._lock:
+                if self.background_pending >= self.max_pending:
+                    self.background_skipped += 1
+                    return
+                self.background_pending += 1
+            table.walking = True
+
+        def run():
+            try:
+                self.advance(key, lexer, read_lines, target_line, line_count)
+            except Exception:
+                pass
+            finally:
+                table.walking = False
+                with self._lock:
+                    self.background_pending -= 1
+
+        try:
+            self._executor.submit(run)
+        except RuntimeError:
+            # 线程池已关闭（应用退出中）
+            table.walking = False
+            with self._lock:
+                self.background_pending -= 1
+
+    def shutdown(self):
+        """关闭后台线程池（丢弃排队中的推进任务）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def render(
+        self,
+        key: str,
+        language: str,
+        line_index: LineIndex,
+        read_lines: LineReader,
+        start_line: int,
+        end_line: int,
+        formatter_options: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """高亮第 start_line 到 end_line 行（含），返回 language、content、highlighted_html、exact
+
+        在线程中调用；read_lines 按行号读取并解码文件内容。
+        """
+        try:
+            lexer = highlighter_registry.get_lexer(language)
+        except ClassNotFound:
+            # 语言不支持，使用纯文本
+            language = 'text'
+            lexer = highlighter_registry.get_lexer(language)
+
+        exact = True
+        resumable = language != 'text' and self.is_resumable(lexer)
+        first_line, stack = start_line, INITIAL_STACK
+        if language != 'text':
+            if resumable:
+                table = self._table(key)
+                first_line, stack = table.nearest(start_line)
+                if start_line - first_line > self.resync_max_lines:
+                    self._advance_in_background(key, lexer, read_lines, start_line, line_index.line_count)
+                    first_line, stack, exact = start_line, INITIAL_STACK, False
+                elif start_line - first_line > self.interval:
+                    self.advance(key, lexer, read_lines, start_line, line_index.line_count)
+                    first_line, stack = table.nearest(start_line)
+            else:
+                exact = False
+
+        # 可续接的 RegexLexer 读到区间之后的检查点，或最多多读 lookahead_lines 行；
+        # 其他词法分析器只多读 LOOKAHEAD_LINES 行
+        if resumable:
+            lookahead_end = min(end_line + self.lookahead_lines, line_index.line_count)
+            following = self._table(key).following(end_line)
+            if following is not None and following - 1 <= lookahead_end:
+                # 截断在检查点处，不影响之前的 token
+                lookahead_end = following - 1
+                may_truncate = False
+            else:
+                may_truncate = lookahead_end < line_index.line_count
+        else:
+            lookahead_end = min(end_line + LOOKAHEAD_LINES, line_index.line_count)
+            may_truncate = False
+        before = read_lines(first_line, start_line - 1) if first_line < start_line else ''
+        content = read_lines(start_line, end_line)
+        after = read_lines(end_line + 1, lookahead_end) if end_line < lookahead_end else ''
+
+        window_start = len(before)
+        window_end = window_start + len(content)
+        tokens = []
+        if language == 'text':
+            tokens.append((Token.Text, content))
+        else:
+            text = before + content + after
+            if resumable:
+                stream = lexer.get_tokens_unprocessed(text, stack=stack)
+            else:
+                stream = lexer.get_tokens_unprocessed(text)
+            for index, token_type, value in stream:
+                token_end = index + len(value)
+                if token_end <= window_start:
+                    continue
+                if index >= window_end:
+                    break
+                if may_truncate and token_end >= len(text) and exact:
+                    # 区间内的 token 延续到截断处，可能是被截断的更长 token
+                    exact = False
+                    with self._lock:
+                        self.truncated += 1
+                tokens.append((token_type, value[max(index, window_start) - index:min(token_end, window_end) - index]))
+
+        # 格式化器实例共享，复制一份后设置起始行号
+        formatter: HtmlFormatter = copy.copy(highlighter_registry.get_formatter(formatter_options))
+        formatter.linenostart = start_line
+        output = io.StringIO()
+        formatter.format(tokens, output)
+
+        with self._lock:
+            self.windows += 1
+            if not exact:
+                self.approximate += 1
+
+        return {
+            'language': language,
+            'content': content,
+            'highlighted_html': output.getvalue(),
+            'exact': exact
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取分页预览统计"""
+        with self._lock:
+            return {
+                "files": len(self._tables),
+                "checkpoints": sum(len(table) for table in self._tables.values()),
+                "windows": self.windows,
+                "approximate": self.approximate,
+                "truncated": self.truncated,
+                "walked_lines": self.walked_lines,
+                "background_pending": self.background_pending,
+                "background_skipped": self.background_skipped
+            }
+
+
+# 进程级共享实例
+window_highlighter = WindowHighlighter()
@@ -0,0 +1,85 @@
+"""
+有界任务槽位
+
+限制某类后台任务（密码哈希、PDF渲染）处理中+排队中的总数：
+槽位计数由线程锁保护，Web请求的事件循环和导出工作线程中各自的事件循环（asyncio.run）共用同一上限。
+槽位已满时在调用方的事件循环上等待（不占用线程），最多等待 queue_timeout 秒；
+释放槽位时直接交给最早的等待者。等待期间请求被取消时不会占用槽位。
+槽位在后台任务（线程池/进程池的 Future）真正结束时释放，
+而不是在等待它的协程结束时释放，请求取消后仍在执行的任务继续计入上限。
+"""
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Callable, Deque, Tuple
+
+
+class AsyncSlots:
+    """跨事件循环、线程安全的有界槽位"""
+
+    def __init__(self, max_pending: int, queue_timeout: float):
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.in_use = 0
+
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> bool:
+        """获取一个槽位，等待超时返回 False"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_use < self.max_pending and not self._waiters:
+                self.in_use += 1
+                return True
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return True
+        except BaseException as e:
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, waiter))
+                    granted = False
+                except ValueError:
+                    granted = True
+            # 超时或取消与交付槽位同时发生：已交付的槽位归还（等待者已取消时由 _grant 归还）
+            if granted and waiter.done() and not waiter.cancelled():
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                return False
+            raise
+
+    def _grant(self, waiter: asyncio.Future):
+        """在等待者的事件循环中交付槽位"""
+        if waiter.done():
+            # 等待者已超时或被取消
+            self.release()
+        else:
+            waiter.set_result(True)
+
+    def release(self):
+        """释放槽位（可在任意线程中调用），有等待者时直接交给最早的等待者"""
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._grant, waiter)
+                    return
+                except RuntimeError:
+                    # 等待者的事件循环已关闭
+                    continue
+            self.in_use -= 1
+
+    def submit(self, executor: Executor, func: Callable, *args) -> Future:
+        """在已获取的槽位上提交后台任务，任务结束时释放槽位"""
+        try:
+            future = executor.submit(func, *args)
+        except BaseException:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+        return future
@@ -0,0 +1,127 @@
+"""
+内容寻址的文件存储
+
+上传内容按 SHA-256 存放在 blobs/<前2位>/<3-4位>/<哈希> 下，相同内容只保存一份。
+引用计数由 UploadedFile 记录决定（见 FileService），本模块只负责文件系统操作。
+"""
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Iterator, Tuple, Optional, Callable
+
+# 最近写入的对象在宽限期内不回收，避免与并发上传相互竞争
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "60"))
+# 临时文件（上传中的 .part、写入中的 sidecar）超过该时间未修改视为中断遗留；
+# 上传期间每写入一块都会更新修改时间，取值需大于客户端两次发送之间可能的最长间隔
+BLOB_TMP_GC_GRACE_SECONDS = int(os.getenv("BLOB_TMP_GC_GRACE_SECONDS", "3600"))
+
+# 分块读写大小
+BLOB_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE_KB", "1024")) * 1024
+
+
+class BlobTooLargeError(ValueError):
+    """写入内容超过大小限制"""
+
+
+class BlobStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+
+    def path_for(self, content_hash: str) -> Path:
+        """内容哈希对应的存储路径"""
+        return self.root / content_hash[:2] / content_hash[2:4] / content_hash
+
+    def is_blob(self, path: str) -> bool:
+        """判断路径是否位于对象存储中"""
+        try:
+            Path(path).resolve().relative_to(self.root.resolve())
+            return True
+        except ValueError:
+            return False
+
+    def write(
+        self,
+        source: BinaryIO,
+        max_size: int,
+        on_chunk: Optional[Callable[[bytes], None]] = None
+    ) -> Tuple[Path, int, str]:
+        """分块写入内容，返回 (存储路径, 大小, SHA-256)
+
+        先写入临时文件并计算哈希，完成后移动到内容地址；
+        超过 max_size 时抛出 BlobTooLargeError 并清理临时文件。
+        on_chunk 在同一遍扫描中接收每一块内容（如检测编码、记录行偏移）。
+        """
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        partial_path = self.tmp_dir / f"{uuid.uuid4().hex}.part"
+
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(partial_path, "wb") as buffer:
+                while True:
+                    chunk = source.read(BLOB_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise BlobTooLargeError("文件大小超过限制")
+                    hasher.update(chunk)
+                    if on_chunk is not None:
+                        on_chunk(chunk)
+                    buffer.write(chunk)
+
+            content_hash = hasher.hexdigest()
+            blob_path = self.path_for(content_hash)
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            # 已存在时同样替换：内容相同，同时刷新修改时间以进入回收宽限期
+            os.replace(partial_path, blob_path)
+        except BaseException:
+            if partial_path.exists():
+                partial_path.unlink()
+            raise
+
+        return blob_path, size, content_hash
+
+    def remove(self, path: str, force: bool = False) -> bool:
+        """删除对象（宽限期内的对象除非 force 否则保留）"""
+        try:
+            if not force and time.time() - os.path.getmtime(path) < BLOB_GC_GRACE_SECONDS:
+                return False
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def remove_stale_tmp(self) -> Tuple[int, int]:
+        """删除中断的上传或进程退出遗留的临时文件，返回 (删除数量, 释放字节数)
+
+        包括 tmp/ 下的 .part 文件和对象旁写入 sidecar 时的 .tmp 文件，
+        只删除超过 BLOB_TMP_GC_GRACE_SECONDS 未修改的文件（正在写入的文件不受影响）。
+        """
+        if not self.root.exists():
+            return 0, 0
+        removed = 0
+        freed = 0
+        now = time.time()
+        for path in [*self.tmp_dir.glob("*.part"), *self.root.glob("??/??/*.tmp")]:
+            try:
+                stat = path.stat()
+                if now - stat.st_mtime < BLOB_TMP_GC_GRACE_SECONDS:
+                    continue
+                path.unlink()
+            except OSError:
+                continue
+            removed += 1
+            freed += stat.st_size
+        return removed, freed
+
+    def iter_blobs(self) -> Iterator[Path]:
+        """遍历全部对象（对象名为哈希，跳过带后缀的 sidecar 文件）"""
+        if not self.root.exists():
+            return
+        for path in self.root.glob("??/??/*"):
+            if path.is_file() and "." not in path.name:
+                yield path
@@ -0,0 +1,203 @@
+"""
+代码高亮结果缓存
+
+按内容哈希寻址：键由文件内容 SHA-256、解析后的语言以及格式化选项共同决定，
+内容不变时预览与导出可直接复用高亮 HTML，无需重新词法分析。
+缓存分为两级：进程内 LRU 与磁盘目录（按总大小淘汰最久未访问的条目）。
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+# 缓存配置
+HIGHLIGHT_CACHE_DIR = os.getenv("HIGHLIGHT_CACHE_DIR", "../cache/highlight")
+HIGHLIGHT_CACHE_MEMORY_ITEMS = int(os.getenv("HIGHLIGHT_CACHE_MEMORY_ITEMS", "256"))
+HIGHLIGHT_CACHE_DISK_MB = int(os.getenv("HIGHLIGHT_CACHE_DISK_MB", "200"))
+
+# 导出片段元数据缓存配置（按数据库中记录的内容哈希寻址，只记录实际语言与行数，
+# 高亮HTML复用上面的高亮结果缓存；两者都命中时无需读取源文件）
+FRAGMENT_CACHE_DIR = os.getenv("FRAGMENT_CACHE_DIR", "../cache/fragments")
+FRAGMENT_CACHE_MEMORY_ITEMS = int(os.getenv("FRAGMENT_CACHE_MEMORY_ITEMS", "4096"))
+FRAGMENT_CACHE_DISK_MB = int(os.getenv("FRAGMENT_CACHE_DISK_MB", "20"))
+
+
+def content_hash(content: bytes) -> str:
+    """计算内容的SHA-256"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def make_cache_key(file_hash: str, language: str, options: Dict[str, Any]) -> str:
+    """由内容哈希、语言和格式化选项生成缓存键"""
+    raw = json.dumps(
+        {"hash": file_hash, "language": language, "options": options},
+        sort_keys=True
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class HighlightCache:
+    """两级高亮缓存（内存LRU + 磁盘）"""
+
+    def __init__(
+        self,
+        cache_dir: str = HIGHLIGHT_CACHE_DIR,
+        memory_items: int = HIGHLIGHT_CACHE_MEMORY_ITEMS,
+        disk_max_bytes: int = HIGHLIGHT_CACHE_DISK_MB * 1024 * 1024
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_size: Optional[int] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+    def _disk_path(self, key: str) -> Path:
+        """磁盘条目路径（按键前两位分目录）"""
+        return self.cache_dir / key[:2] / f"{key}.html"
+
+    def _scan_disk_size(self) -> int:
+        """统计磁盘缓存当前占用（首次使用时执行）"""
+        if self._disk_size is None:
+            total = 0
+            if self.cache_dir.exists():
+                for path in self.cache_dir.glob("*/*.html"):
+                    try:
+                        total += path.stat().st_size
+                    except OSError:
+                        pass
+            self._disk_size = total
+        return self._disk_size
+
+    def _remember(self, key: str, value: str):
+        """写入内存LRU并按容量淘汰"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+            self.memory_evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中返回None"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+
+        path = self._disk_path(key)
+        try:
+            value = path.read_text(encoding="utf-8")
+            # 更新访问时间，供磁盘淘汰使用
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: str):
+        """写入缓存"""
+        with self._lock:
+            self._remember(key, value)
+
+        path = self._disk_path(key)
+        data = value.encode("utf-8")
+        with self._lock:
+            # 首次写入前统计现有占用，之后按增量维护
+            self._scan_disk_size()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            # 覆盖已有条目时扣除旧文件的大小
+            try:
+                replaced_size = path.stat().st_size
+            except OSError:
+                replaced_size = 0
+            os.replace(tmp_path, path)
+        except OSError:
+            return  # 磁盘层写入失败不影响内存层
+
+        with self._lock:
+            self._disk_size += len(data) - replaced_size
+            if self._disk_size > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """按最近访问时间淘汰磁盘条目，直到降到上限的90%"""
+        entries = []
+        for path in self.cache_dir.glob("*/*.html"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.disk_max_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.disk_evictions += 1
+        self._disk_size = total
+
+    def clear(self):
+        """清空缓存（内存与磁盘）"""
+        with self._lock:
+            self._memory.clear()
+            for path in self.cache_dir.glob("*/*.html"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._disk_size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (hits / lookups * 100) if lookups > 0 else 0,
+                "memory_evictions": self.memory_evictions,
+                "disk_evictions": self.disk_evictions,
+                "memory_items": len(self._memory),
+                "memory_capacity": self.memory_items,
+                "disk_size": self._scan_disk_size(),
+                "disk_capacity": self.disk_max_bytes
+            }
+
+
+# 进程级共享实例
+highlight_cache = HighlightCache()
+fragment_cache = HighlightCache(
+    FRAGMENT_CACHE_DIR,
+    FRAGMENT_CACHE_MEMORY_ITEMS,
+    FRAGMENT_CACHE_DISK_MB * 1024 * 1024
+)
@@ -0,0 +1,262 @@
+"""
+行偏移索引与文本编码
+
+记录文件每一行起始位置的字节偏移，按行号区间读取时只需定位并读取对应的字节范围，
+无需读取和解码整个文件。行号从 1 开始；以换行结尾的文件，末尾不计空行（与 splitlines 一致）。
+
+上传时由 TextInspector 在写入存储的同一遍扫描中生成索引并检测编码：
+开头样本中含 NUL 字节视为二进制文件；否则增量校验UTF-8，不是UTF-8时再整体校验一次GBK。
+索引连同编码保存为存储文件旁的 sidecar 文件（<存储路径>.lines），进程内再按内容哈希缓存（LRU）；
+没有 sidecar 的旧文件在首次使用时扫描生成。
+"""
+import codecs
+import os
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Optional, Tuple, Dict, Any
+
+# 行偏移索引缓存条数
+LINE_INDEX_MEMORY_ITEMS = int(os.getenv("LINE_INDEX_MEMORY_ITEMS", "64"))
+
+# 判断二进制文件时检查的开头字节数
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+# 扫描文件时每次读取的字节数
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+# sidecar 文件后缀与文件头（魔数、文件大小、编码、偏移数组类型）
+LINE_INDEX_SUFFIX = ".lines"
+SIDECAR_MAGIC = b"CWLIDX1\0"
+SIDECAR_HEADER = struct.Struct("<8sQ16s1s")
+
+# 二进制文件（不能按文本读取）
+ENCODING_BINARY = "binary"
+
+
+class LineIndex:
+    """单个文件的行偏移索引"""
+
+    def __init__(self, offsets: array, size: int, encoding: str = "utf-8"):
+        # offsets[i] 为第 i+1 行的起始字节偏移
+        self.offsets = offsets
+        self.size = size
+        self.encoding = encoding
+
+    @classmethod
+    def build(cls, path: str) -> "LineIndex":
+        """分块扫描文件生成索引并检测编码"""
+        inspector = TextInspector()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(SCAN_CHUNK_SIZE)
+                if not chunk:
+                    break
+                inspector.feed(chunk)
+        return inspector.finish(path)
+
+    @property
+    def line_count(self) -> int:
+        """总行数"""
+        return len(self.offsets)
+
+    @property
+    def is_binary(self) -> bool:
+        return self.encoding == ENCODING_BINARY
+
+    def byte_range(self, start_line: int, end_line: int) -> Tuple[int, int]:
+        """第 start_line 行到第 end_line 行（含）的字节范围 [起始, 结束)"""
+        start = self.offsets[start_line - 1]
+        end = self.offsets[end_line] if end_line < len(self.offsets) else self.size
+        return start, end
+
+    @staticmethod
+    def sidecar_path(path: str) -> str:
+        """sidecar 文件路径"""
+        return path + LINE_INDEX_SUFFIX
+
+    def save(self, path: str):
+        """写入 sidecar 文件（先写临时文件再替换，并发写入同一内容时互不影响）"""
+        offsets = self.offsets
+        if self.size < 2 ** 32:
+            offsets = array('I', offsets)
+        header = SIDECAR_HEADER.pack(
+            SIDECAR_MAGIC, self.size, self.encoding.encode('ascii'), offsets.typecode.encode('ascii')
+        )
+        sidecar = self.sidecar_path(path)
+        tmp_path = f"{sidecar}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(header)
+                offsets.tofile(f)
+            os.replace(tmp_path, sidecar)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LineIndex"]:
+        """读取 sidecar 文件，不存在、格式不符或与文件大小不一致时返回 None"""
+        try:
+            size = os.path.getsize(path)
+            with open(cls.sidecar_path(path), 'rb') as f:
+                magic, indexed_size, encoding, typecode = SIDECAR_HEADER.unpack(f.read(SIDECAR_HEADER.size))
+                if magic != SIDECAR_MAGIC or indexed_size != size:
+                    return None
+                offsets = array(typecode.decode('ascii'))
+                offsets.frombytes(f.read())
+        except (OSError, struct.error, ValueError):
+            return None
+        return cls(offsets, size, encoding.rstrip(b'\0').decode('ascii'))
+
+
+class TextInspector:
+    """流式检查文件内容：检测编码并记录行偏移
+
+    逐块调用 feed()，最后调用 finish() 得到索引。二进制文件不记录行偏移。
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.offsets = array('Q', [0])
+        self.binary = False
+        self.has_bom = False
+        self.utf8_valid = True
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def feed(self, chunk: bytes):
+        """处理一块内容"""
+        if self.size < ENCODING_SAMPLE_BYTES:
+            sample = chunk[:ENCODING_SAMPLE_BYTES - self.size]
+            if self.size == 0:
+                self.has_bom = sample.startswith(codecs.BOM_UTF8)
+            if b'\0' in sample:
+                self.binary = True
+
+        if not self.binary:
+            if self.utf8_valid:
+                try:
+                    self._utf8.decode(chunk)
+                except UnicodeDecodeError:
+                    self.utf8_valid = False
+
+            offsets = self.offsets
+            position = chunk.find(b'\n')
+            while position != -1:
+                offsets.append(self.size + position + 1)
+                position = chunk.find(b'\n', position + 1)
+
+        self.size += len(chunk)
+
+    def finish(self, path: str) -> LineIndex:
+        """结束检查，返回索引（path 用于不是UTF-8时再校验一次GBK）"""
+        if not self.binary and self.utf8_valid:
+            try:
+                self._utf8.decode(b'', final=True)
+            except UnicodeDecodeError:
+                self.utf8_valid = False
+
+        if self.binary:
+            return LineIndex(array('Q'), self.size, ENCODING_BINARY)
+
+        if self.utf8_valid:
+            encoding = 'utf-8-sig' if self.has_bom else 'utf-8'
+        else:
+            encoding = 'gbk' if self._is_valid(path, 'gbk') else ENCODING_BINARY
+
+        offsets = self.offsets
+        # 最后一个换行之后没有内容时，不算作新的一行
+        if offsets[-1] == self.size:
+            offsets.pop()
+        return LineIndex(offsets, self.size, encoding)
+
+    @staticmethod
+    def _is_valid(path: str, encoding: str) -> bool:
+        """按指定编码增量校验整个文件"""
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(SCAN_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    decoder.decode(chunk)
+            decoder.decode(b'', final=True)
+            return True
+        except (OSError, UnicodeDecodeError):
+            return False
+
+
+def remove_sidecar(path: str):
+    """删除存储文件的 sidecar（存储文件被回收时调用）"""
+    try:
+        os.remove(LineIndex.sidecar_path(path))
+    except OSError:
+        pass
+
+
+class LineIndexCache:
+    """行偏移索引缓存：进程内LRU（按内容哈希） + sidecar 文件"""
+
+    def __init__(self, memory_items: int = LINE_INDEX_MEMORY_ITEMS):
+        self.memory_items = memory_items
+        self._items: "OrderedDict[str, LineIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.sidecar_loads = 0
+        self.builds = 0
+
+    def _remember(self, file_hash: Optional[str], index: LineIndex):
+        if not file_hash or self.memory_items <= 0:
+            return
+        with self._lock:
+            self._items[file_hash] = index
+            self._items.move_to_end(file_hash)
+            while len(self._items) > self.memory_items:
+                self._items.popitem(last=False)
+
+    def get(self, file_hash: Optional[str], path: str) -> LineIndex:
+        """获取文件的行偏移索引：内存 -> sidecar -> 扫描文件生成并写入 sidecar"""
+        if file_hash:
+            with self._lock:
+                index = self._items.get(file_hash)
+                if index is not None:
+                    self._items.move_to_end(file_hash)
+                    self.hits += 1
+                    return index
+
+        index = LineIndex.load(path)
+        if index is not None:
+            with self._lock:
+                self.sidecar_loads += 1
+        else:
+            index = LineIndex.build(path)
+            index.save(path)
+            with self._lock:
+                self.builds += 1
+
+        self._remember(file_hash, index)
+        return index
+
+    def store(self, file_hash: Optional[str], path: str, index: LineIndex):
+        """保存上传时生成的索引（写入 sidecar 并放入内存缓存）"""
+        index.save(path)
+        self._remember(file_hash, index)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            return {
+                "items": len(self._items),
+                "hits": self.hits,
+                "sidecar_loads": self.sidecar_loads,
+                "builds": self.builds
+            }
+
+
+# 进程级共享实例
+line_index_cache = LineIndexCache()
@@ -0,0 +1,131 @@
+"""
+列表分页
+
+按 (created_at, id) 倒序排列，支持两种方式：
+- 游标（键集）分页：传入上一页返回的 next_cursor，查询从该位置向后取，耗时与翻页深度无关；
+- 页码分页：兼容旧接口的 OFFSET/LIMIT，页码越大越慢。
+
+总数可选：exact 精确统计；approx 最多统计 PAGINATION_COUNT_CAP 条，超过时 total_exact 为 false；
+none 不统计（游标分页只需 has_more）。
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import String, func, literal_column, select, tuple_, type_coerce
+from sqlalchemy.orm import Query
+
+# 近似总数的统计上限
+PAGINATION_COUNT_CAP = int(os.getenv("PAGINATION_COUNT_CAP", "10000"))
+
+TOTAL_EXACT = "exact"
+TOTAL_APPROX = "approx"
+TOTAL_NONE = "none"
+
+
+class InvalidCursorError(ValueError):
+    """分页游标无效"""
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """把排序键编码为不透明的游标字符串"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """解析游标，返回 (排序值, 记录ID)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(sort_value, str) or not isinstance(row_id, int):
+            raise ValueError(cursor)
+    except (ValueError, TypeError, UnicodeError, binascii.Error) as e:
+        raise InvalidCursorError("分页游标无效") from e
+    return sort_value, row_id
+
+
+def _sort_column(query: Query, model):
+    """排序键列
+
+    SQLite 以文本保存时间，服务端默认值（CURRENT_TIMESTAMP）与ORM写入的格式不同（是否带微秒），
+    转换为 datetime 后再比较会错位；因此在 SQLite 上直接读取并比较原始文本（不生成CAST，仍走索引）。
+    """
+    if query.session.get_bind().dialect.name == "sqlite":
+        return type_coerce(model.created_at, String)
+    return model.created_at
+
+
+def _count(query: Query, total_mode: str) -> Tuple[int, bool]:
+    """统计总数，返回 (总数, 是否精确)"""
+    count_query = query.order_by(None)
+    if total_mode == TOTAL_APPROX:
+        capped = count_query.with_entities(literal_column("1")).limit(PAGINATION_COUNT_CAP + 1).subquery()
+        total = query.session.execute(select(func.count()).select_from(capped)).scalar()
+        if total > PAGINATION_COUNT_CAP:
+            return PAGINATION_COUNT_CAP, False
+        return total, True
+    return count_query.count(), True
+
+
+def paginate(
+    query: Query,
+    model,
+    page_size: int,
+    cursor: Optional[str] = None,
+    page: int = 1,
+    total_mode: str = TOTAL_EXACT,
+    known_total: Optional[int] = None
+) -> Dict[str, Any]:
+    """按 (created_at, id) 倒序分页
+
+    传入 cursor 时使用键集分页（忽略 page），否则按页码分页。
+    known_total 为已知的精确总数（如计数器），提供时不再统计。
+    返回 items（模型实例列表）、next_cursor、has_more，以及按 total_mode 附带的总数信息。
+    """
+    sort_column = _sort_column(query, model)
+    page_query = query.add_columns(sort_column).order_by(sort_column.desc(), model.id.desc())
+
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if not isinstance(sort_column.type, String):
+            try:
+                sort_value = datetime.fromisoformat(sort_value)
+            except ValueError as e:
+                raise InvalidCursorError("分页游标无效") from e
+        page_query = page_query.filter(tuple_(sort_column, model.id) < tuple_(sort_value, row_id))
+    elif page > 1:
+        page_query = page_query.offset((page - 1) * page_size)
+
+    # 多取一条判断是否还有下一页
+    rows = page_query.limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    result: Dict[str, Any] = {
+        "items": [item for item, _ in rows],
+        "page_size": page_size,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(rows[-1][1], rows[-1][0].id) if has_more else None
+    }
+    if not cursor:
+        result["page"] = page
+
+    if known_total is not None:
+        total, exact = known_total, True
+    elif total_mode != TOTAL_NONE:
+        total, exact = _count(query, total_mode)
+    else:
+        return result
+
+    result.update({
+        "total": total,
+        "total_exact": exact,
+        "total_pages": (total + page_size - 1) // page_size
+    })
+    return result
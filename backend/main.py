@@ -8,8 +8,17 @@ from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 
-from app.database import engine, Base
+from app.database import engine, SessionLocal, report_database_settings
+from app.migrations import run_migrations
 from app.routers import auth, users, projects, files, exports, admin, settings
+from app.services.export_job_service import shutdown_export_workers
+from app.services.pdf_renderer import pdf_render_pool
+from app.services.highlight_renderer import highlight_pool
+from app.services.window_highlighter import window_highlighter
+from app.services.pdf_service import DEFAULT_CSS
+from app.services.highlight_service import seed_default_mappings, language_index, HIGHLIGHT_FORMATTER_OPTIONS
+from app.services.file_service import FileService
+from app.services.template_service import seed_default_template
 
 # 加载环境变量
 load_dotenv()
@@ -17,18 +26,42 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时创建数据库表
-    Base.metadata.create_all(bind=engine)
+    # 启动时执行数据库迁移
+    executed = run_migrations(engine)
+    if executed:
+        print("已执行数据库迁移: " + ", ".join(executed))
+    report_database_settings()
     
     # 创建必要的目录
     os.makedirs("../upload", exist_ok=True)
     os.makedirs("../templates", exist_ok=True)
     os.makedirs("../exports", exist_ok=True)
     
+    db = SessionLocal()
+    try:
+        # 写入默认的后缀-语言映射
+        seed_default_mappings(db)
+        # 预先加载后缀-语言索引，首个预览请求不再等待加载
+        language_index.get(db)
+        # 写入默认模板
+        seed_default_template(db)
+        # 回收未被引用的上传存储
+        FileService(db).collect_garbage()
+    finally:
+        db.close()
+    
+    # 预热PDF渲染进程池
+    pdf_render_pool.start(warm_css=[DEFAULT_CSS])
+    # 预热代码高亮进程池（常用语言的词法分析器、格式化器与样式CSS）
+    highlight_pool.start(formatter_options=HIGHLIGHT_FORMATTER_OPTIONS)
+    
     yield
     
     # 关闭时的清理工作
-    pass
+    shutdown_export_workers()
+    pdf_render_pool.shutdown()
+    highlight_pool.shutdown()
+    window_highlighter.shutdown()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -48,7 +81,7 @@ app.add_middleware(
 )
 
 # 静态文件服务
-app.mount("/uploads", StaticFiles(directory="../upload"), name="uploads")
+# 上传文件按内容哈希存放（upload/blobs），不能以静态文件公开，只能经过权限校验的接口读取
 app.mount("/exports", StaticFiles(directory="../exports"), name="exports")
 
 # 注册路由
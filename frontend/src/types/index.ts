@@ -61,9 +61,12 @@ export interface ProjectCreateRequest {
 export interface ProjectListResponse {
   projects: Project[]
   total: number
+  total_exact: boolean
   page: number
   page_size: number
   total_pages: number
+  has_more: boolean
+  next_cursor: string | null
 }
 
 // 文件相关类型
@@ -98,6 +101,20 @@ export interface ProjectFileListResponse {
   files: ProjectFile[]
 }
 
+// 分页预览的一个行区间
+export interface FilePreviewWindow {
+  file_id: number
+  filename: string
+  language: string
+  start_line: number
+  end_line: number
+  total_lines: number
+  has_more: boolean
+  content: string
+  highlighted_html: string
+  exact: boolean
+}
+
 // 导出相关类型
 export interface ExportJob {
   id: number
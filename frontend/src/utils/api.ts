@@ -66,6 +66,8 @@ export const projectApi = {
     project_type?: string
     page?: number
     page_size?: number
+    cursor?: string
+    total?: 'exact' | 'approx' | 'none'
   }): Promise<ApiResponse<ProjectListResponse>> => 
     api.get('/projects', { params }),
   
@@ -96,18 +98,27 @@ export const fileApi = {
     })
   },
 
-  // 获取用户文件列表
-  getUserFiles: (): Promise<ApiResponse> =>
-    api.get('/files'),
+  // 获取用户文件列表（分页）
+  getUserFiles: (params?: {
+    page?: number
+    page_size?: number
+    cursor?: string
+    total?: 'exact' | 'approx' | 'none'
+  }): Promise<ApiResponse> =>
+    api.get('/files', { params }),
 
   // 删除文件
   deleteFile: (fileId: number): Promise<ApiResponse> =>
     api.delete(`/files/${fileId}`),
 
-  // 预览文件
-  previewFile: (fileId: number, language?: string): Promise<ApiResponse> =>
+  // 预览文件（指定行区间时只返回该区间）
+  previewFile: (
+    fileId: number,
+    language?: string,
+    range?: { start_line: number; end_line?: number }
+  ): Promise<ApiResponse> =>
     api.get(`/files/${fileId}/preview`, {
-      params: language ? { language } : {}
+      params: { ...(language ? { language } : {}), ...(range || {}) }
     }),
 
   // 将文件添加到项目